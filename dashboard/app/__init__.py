@@ -1,6 +1,4 @@
 import logging
-import queue
-import threading
 import sys
 
 import click
@@ -17,12 +15,22 @@ from flask_jwt_extended import (
 )
 from werkzeug.exceptions import HTTPException
 
-from app.extensions import db, jwt, sio
-from app.telemetry.session_html import create_cache
+from app.extensions import (
+    compress,
+    db,
+    jwt,
+    sio,
+    telemetry_cache,
+    track_cache
+)
+from app.telemetry.balance import MAX_POINTS
+from app.utils.cache_generator import CacheGenerator
 from app.utils.first_init import first_init
+from app.utils.json import NumpyJSONProvider
+from app.utils.recompress import recompress_command
 
 
-id_queue = queue.Queue()
+cache_generator = CacheGenerator()
 
 
 def _sqlite_pragmas(app: Flask):
@@ -37,6 +45,7 @@ def _sqlite_pragmas(app: Flask):
 
 def create_app():
     app = Flask(__name__)
+    app.json = NumpyJSONProvider(app)
     app.config['JWT_TOKEN_LOCATION'] = ['cookies', 'headers']
     app.config['JWT_ALGORITHM'] = 'RS256'
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=20)
@@ -45,6 +54,7 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['GOSST_HTTP_API'] = 'http://localhost:8080'
     app.config.from_prefixed_env()
+    app.config.setdefault('BALANCE_MAX_POINTS', MAX_POINTS)
 
     app.logger.addHandler(logging.StreamHandler(sys.stdout))
     app.logger.setLevel(logging.INFO)
@@ -60,6 +70,8 @@ def create_app():
     def init_command():
         first_init()
 
+    app.cli.add_command(recompress_command)
+
     @app.after_request
     def refresh_expiring_jwts(response):
         try:
@@ -81,6 +93,10 @@ def create_app():
     # Initialize Flask extensions here
     jwt.init_app(app)
     sio.init_app(app)
+    telemetry_cache.init_app(app)
+    track_cache.init_app(app)
+    cache_generator.init_app(app)
+    compress.init_app(app)
 
     db.init_app(app)
     _sqlite_pragmas(app)
@@ -95,23 +111,8 @@ def create_app():
     from app.api import bp as api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
 
-    def html_generator():
-        with app.app_context():
-            app.logger.info("Bokeh HTML generator thread started")
-            while True:
-                try:
-                    id = id_queue.get()
-                    app.logger.info(f"generating cache for session {id}")
-                    create_cache(id, 5, 200)
-                    sio.emit("session_ready")
-                    app.logger.info(f"cache ready for session {id}")
-                except BaseException as e:
-                    app.logger.error(f"cache failed for session {id}: {e}")
-
     @app.before_first_request
     def before_first_request():
-        gt = threading.Thread(target=html_generator)
-        gt.daemon = True
-        gt.start()
+        cache_generator.start()
 
     return app
@@ -1,47 +1,48 @@
+import base64
+import hashlib
 import json
-import msgpack
 import requests
 
 from io import BytesIO
 from http import HTTPStatus as status
 
-from flask import current_app, jsonify, request, send_file, Markup
+from flask import current_app, jsonify, request, send_file
 from flask_jwt_extended import (
     jwt_required,
     verify_jwt_in_request,
     unset_jwt_cookies
 )
 
-from app import id_queue
+from app import cache_generator
 from app.api.session import bp
-from app.extensions import db
-from app.models.session import Session
-from app.models.session_html import SessionHtml
+from app.extensions import db, telemetry_cache, track_cache
+from app.models import codec
+from app.models.cache_job import CacheJob
+from app.models.session import Session, session_telemetry
+from app.models.session_figure import SessionFigure
+from app.models.session_hash import SessionHash
+from app.models.session_summary import SessionSummary
 from app.models.track import Track
 from app.telemetry.balance import update_balance
 from app.telemetry.fft import update_fft
+from app.telemetry.index import StrokeSelection, suspension_index
+from app.telemetry.lod import LOD_INITIAL_WIDTH, sample_pyramid
 from app.telemetry.map import gpx_to_dict, track_data
 from app.telemetry.psst import (
     Suspension,
-    Strokes,
     Telemetry,
-    dataclass_from_dict
+    dataclass_from_dict,
+    header_from_psst
 )
+from app.telemetry.summary import session_summary
 from app.telemetry.travel import update_travel_histogram
 from app.telemetry.velocity import (
+    HIGH_SPEED_THRESHOLD,
     update_velocity_band_stats,
     update_velocity_histogram
 )
-
-
-def _filter_strokes(strokes: Strokes, start: int, end: int) -> Strokes:
-    if start is None or end is None:
-        return strokes
-    return Strokes(
-        Compressions=[c for c in strokes.Compressions if
-                      c.Start > start and c.End < end],
-        Rebounds=[r for r in strokes.Rebounds if
-                  r.Start > start and r.End < end])
+from app.utils.pagination import keyset_args, keyset_page
+from app.utils.responses import data_response
 
 
 def _extract_range(sample_rate: int) -> (int, int):
@@ -63,20 +64,47 @@ def _validate_range(start: int, end: int, count: int) -> bool:
             start >= 0 and end < count)
 
 
-def _update_stroke_based(strokes: Strokes, suspension: Suspension):
+def _extract_hst() -> int:
+    hst = request.args.get('hst', HIGH_SPEED_THRESHOLD, type=int)
+    return hst if hst > 0 else None
+
+
+# Content types of PSST data uploaded as is (not base64 encoded in JSON).
+RAW_PSST_MIMETYPES = ('application/msgpack', 'application/x-msgpack',
+                      'multipart/form-data')
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def _upload_chunks():
+    # The request body, or the "data" file of a multipart form.
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('data')
+        if upload is None:
+            return None
+        stream = upload.stream
+    else:
+        stream = request.stream
+    return iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b'')
+
+
+def _content_hash(data: str) -> str:
+    # Hash of base64 encoded file contents, see SessionHash.
+    return hashlib.sha256(base64.b64decode(data)).hexdigest()
+
+
+def _update_stroke_based(strokes: StrokeSelection, suspension: Suspension,
+                         hst: int):
     thist = update_travel_histogram(strokes, suspension.TravelBins)
     vhist = update_velocity_histogram(
         strokes,
-        suspension.Velocity,
         suspension.TravelBins,
         suspension.VelocityBins,
         suspension.FineVelocityBins,
-        200
+        hst
     )
     vbands = update_velocity_band_stats(
         strokes,
-        suspension.Velocity,
-        200
+        hst
     )
     return dict(
         thist=thist,
@@ -88,18 +116,82 @@ def _update_stroke_based(strokes: Strokes, suspension: Suspension):
 
 @bp.route('', methods=['GET'])
 def get_all():
-    entities = db.session.execute(db.select(Session).order_by(
-        Session.timestamp.desc())).scalars()
+    # Sessions with the same timestamp are told apart by before_id.
+    before = keyset_args('before', 'before_id')
+    entities = db.session.execute(keyset_page(
+        db.select(Session), (Session.timestamp, Session.id),
+        before)).scalars()
     return jsonify(list(entities)), status.OK
 
 
+@bp.route('/search', methods=['GET'])
+def search():
+    # Filters are <column>_min and <column>_max bounds (inclusive) on the
+    # summary columns, and setup=<id>. Results are paged like get_all.
+    stmt = db.select(Session, SessionSummary).join(
+        SessionSummary, SessionSummary.session_id == Session.id)
+    columns = SessionSummary.__table__.columns
+    for arg in request.args:
+        if arg in ('before', 'before_id', 'limit'):
+            continue
+        if arg == 'setup':
+            setup = request.args.get(arg, type=int)
+            if setup is None:
+                return jsonify(msg="Invalid filter!"), status.BAD_REQUEST
+            stmt = stmt.where(Session.setup == setup)
+            continue
+        name, _, bound = arg.rpartition('_')
+        value = request.args.get(arg, type=float)
+        if (name not in columns or name == 'session_id' or
+                bound not in ('min', 'max') or value is None):
+            return jsonify(msg="Invalid filter!"), status.BAD_REQUEST
+        column = columns[name]
+        stmt = stmt.where(column >= value if bound == 'min' else
+                          column <= value)
+
+    before = keyset_args('before', 'before_id')
+    rows = db.session.execute(keyset_page(
+        stmt, (Session.timestamp, Session.id), before)).all()
+    return jsonify([dict(session=s, summary=summary)
+                    for s, summary in rows]), status.OK
+
+
+@bp.route('/hashes', methods=['POST'])
+@jwt_required()
+def known_hashes():
+    # Takes {"hashes": [...]} (SHA-256 of files to import), returns the ones
+    # that were already imported, with the id of their session. A POST, so
+    # that a whole card of files fits in one request.
+    hashes = (request.json or {}).get('hashes')
+    if not isinstance(hashes, list):
+        return jsonify(msg="Invalid hash list!"), status.BAD_REQUEST
+    known = {}
+    for i in range(0, len(hashes), 500):  # SQLite variable limit
+        known.update(db.session.execute(
+            db.select(SessionHash.hash, SessionHash.session_id)
+            .where(SessionHash.hash.in_(hashes[i:i+500]))).all())
+    return jsonify(known), status.OK
+
+
+@bp.route('/jobs', methods=['GET'])
+@jwt_required()
+def jobs():
+    return jsonify(cache_generator.status()), status.OK
+
+
+@bp.route('/cache', methods=['GET'])
+@jwt_required()
+def cache_stats():
+    return jsonify(telemetry_cache.stats()), status.OK
+
+
 @bp.route('/<int:id>/psst', methods=['GET'])
 def get_psst(id: int):
     entity = db.session.execute(
         db.select(Session).filter_by(id=id)).scalar_one_or_none()
     if not entity:
         return jsonify(msg="Session does not exist!"), status.NOT_FOUND
-    data = BytesIO(entity.data)
+    data = BytesIO(entity.psst)
     return send_file(
         data,
         as_attachment=True,
@@ -126,58 +218,89 @@ def get(id: int):
     return jsonify(entity), status.OK
 
 
-@bp.route('/<int:id>/filter', methods=['GET'])
-def filter(id: int):
-    entity = db.session.execute(
-        db.select(Session).filter_by(id=id)).scalar_one_or_none()
-    if not entity:
-        return jsonify(msg="Session does not exist!"), status.NOT_FOUND
-    d = msgpack.unpackb(entity.data)
-    t = dataclass_from_dict(Telemetry, d)
-
-    start, end = _extract_range(t.SampleRate)
-    count = len(t.Front.Travel if t.Front.Present else t.Rear.Travel)
-    if not _validate_range(start, end, count):
-        start = None
-        end = None
-
+def _filter_data(t: Telemetry, start: int, end: int, hst: int) -> dict:
     updated_data = {'front': None, 'rear': None}
     tick = 1.0 / t.SampleRate
     if t.Front.Present:
-        f_strokes = _filter_strokes(t.Front.Strokes, start, end)
-        updated_data['front'] = _update_stroke_based(f_strokes, t.Front)
+        f_strokes = suspension_index(t.Front).select(start, end)
+        updated_data['front'] = _update_stroke_based(f_strokes, t.Front, hst)
         updated_data['front']['fft'] = update_fft(
             t.Front.Travel[start:end], tick)
     if t.Rear.Present:
-        r_strokes = _filter_strokes(t.Rear.Strokes, start, end)
-        updated_data['rear'] = _update_stroke_based(r_strokes, t.Rear)
+        r_strokes = suspension_index(t.Rear).select(start, end)
+        updated_data['rear'] = _update_stroke_based(r_strokes, t.Rear, hst)
         updated_data['rear']['fft'] = update_fft(
             t.Rear.Travel[start:end], tick)
     if t.Front.Present and t.Rear.Present:
+        max_points = current_app.config['BALANCE_MAX_POINTS']
         updated_data['balance'] = dict(
             compression=update_balance(
-                f_strokes.Compressions,
-                r_strokes.Compressions,
+                f_strokes,
+                r_strokes,
                 t.Linkage.MaxFrontTravel,
-                t.Linkage.MaxRearTravel
+                t.Linkage.MaxRearTravel,
+                False,
+                max_points
             ),
             rebound=update_balance(
-                f_strokes.Rebounds,
-                r_strokes.Rebounds,
+                f_strokes,
+                r_strokes,
                 t.Linkage.MaxFrontTravel,
-                t.Linkage.MaxRearTravel
+                t.Linkage.MaxRearTravel,
+                True,
+                max_points
             ),
         )
+    return updated_data
+
+
+@bp.route('/<int:id>/filter', methods=['GET'])
+def filter(id: int):
+    hst = _extract_hst()
+    if not hst:
+        return jsonify(msg="Invalid threshold!"), status.BAD_REQUEST
+    t = session_telemetry(id)
+    if t is None:
+        return jsonify(msg="Session does not exist!"), status.NOT_FOUND
 
-    return jsonify(updated_data)
+    start, end = _extract_range(t.SampleRate)
+    count = len(t.Front.Travel if t.Front.Present else t.Rear.Travel)
+    if not _validate_range(start, end, count):
+        start = None
+        end = None
+
+    return data_response(_filter_data(t, start, end, hst))
+
+
+@bp.route('/<int:id>/samples', methods=['GET'])
+def samples(id: int):
+    t = session_telemetry(id)
+    if t is None:
+        return jsonify(msg="Session does not exist!"), status.NOT_FOUND
+
+    start, end = _extract_range(t.SampleRate)
+    width = request.args.get('width', LOD_INITIAL_WIDTH, type=int)
+    if start is not None and end is not None:
+        if end <= start:
+            return jsonify(msg="Invalid range!"), status.BAD_REQUEST
+        # Half a window of margin on both sides, so that panning does not
+        # immediately run out of data while the next window is loading.
+        margin = (end - start) // 2
+        start, end = start - margin, end + margin
+        width *= 2
+    return jsonify(sample_pyramid(t).window(start, end, width))
 
 
 @bp.route('/<int:id>', methods=['DELETE'])
 @jwt_required()
 def delete(id: int):
     db.session.execute(db.delete(Session).filter_by(id=id))
-    db.session.execute(db.delete(SessionHtml).filter_by(session_id=id))
+    db.session.execute(db.delete(SessionFigure).filter_by(session_id=id))
+    db.session.execute(db.delete(SessionSummary).filter_by(session_id=id))
+    db.session.execute(db.delete(SessionHash).filter_by(session_id=id))
+    db.session.execute(db.delete(CacheJob).filter_by(session_id=id))
     db.session.commit()
+    telemetry_cache.invalidate(id)
     return '', status.NO_CONTENT
 
 
@@ -188,7 +311,11 @@ def put():
     url = f'{api_server}/api/internal/session'
     resp = requests.put(url, json=request.json)
     if resp.status_code == status.CREATED:
-        return jsonify(id=resp.json()['id']), status.CREATED
+        id = resp.json()['id']
+        db.session.merge(SessionHash(
+            session_id=id, hash=_content_hash(request.json['data'])))
+        db.session.commit()
+        return jsonify(id=id), status.CREATED
     else:
         return jsonify(msg="Session could not be imported"), status.BAD_REQUEST
 
@@ -208,6 +335,8 @@ def put_normalized():
 @bp.route('/psst', methods=['PUT'])
 @jwt_required()
 def put_processed():
+    if request.mimetype in RAW_PSST_MIMETYPES:
+        return _put_processed_raw()
     session_dict = request.json
     session_data = session_dict.pop('data')
     entity = dataclass_from_dict(Session, session_dict)
@@ -215,11 +344,77 @@ def put_processed():
         return jsonify(msg="Invalid data for Session"), status.BAD_REQUEST
     entity.psst = session_data
     entity = db.session.merge(entity)
+    db.session.flush()
+    db.session.merge(SessionHash(session_id=entity.id,
+                                 hash=_content_hash(session_data)))
+    telemetry_cache.invalidate(entity.id)
+    t = session_telemetry(entity.id)
+    db.session.merge(SessionSummary(session_id=entity.id,
+                                    **session_summary(t)))
     db.session.commit()
     generate_bokeh(entity.id)
     return jsonify(id=entity.id), status.CREATED
 
 
+def _put_processed_raw():
+    # The data is compressed while it is read, only its header is decoded
+    # (the rest is only walked), and the figures and the summary are
+    # generated in the background.
+    chunks = _upload_chunks()
+    if chunks is None:
+        return jsonify(msg="No PSST data!"), status.BAD_REQUEST
+    consumed = []
+    content_hash = hashlib.sha256()
+
+    def hashed(chunks):
+        for chunk in chunks:
+            content_hash.update(chunk)
+            yield chunk
+
+    def header_chunks():
+        for chunk in chunks:
+            consumed.append(chunk)
+            yield chunk
+
+    try:
+        header = header_from_psst(header_chunks())
+        timestamp, sample_rate = header.Timestamp, header.SampleRate
+        valid = (isinstance(timestamp, int) and
+                 isinstance(sample_rate, int) and sample_rate > 0 and
+                 header.record_num > 0)
+    except ValueError:
+        valid = False
+    if not valid:
+        return jsonify(msg="Invalid PSST data!"), status.BAD_REQUEST
+
+    def walked():
+        # The rest of the data is walked while it is compressed, so that
+        # truncated data is not stored.
+        for _ in header.walk():
+            yield from consumed
+            consumed.clear()
+        yield from consumed
+
+    try:
+        data = codec.encode_chunks(hashed(walked()))
+    except ValueError:
+        return jsonify(msg="Invalid PSST data!"), status.BAD_REQUEST
+    # Metadata is in the query string, or in the fields of the form.
+    entity = Session(
+        name=request.values.get('name', header.Name),
+        description=request.values.get('description', ''),
+        setup=request.values.get('setup', type=int),
+        timestamp=timestamp,
+        data=data)
+    db.session.add(entity)
+    db.session.flush()
+    db.session.add(SessionHash(session_id=entity.id,
+                               hash=content_hash.hexdigest()))
+    db.session.commit()
+    cache_generator.submit(entity.id)
+    return jsonify(id=entity.id), status.CREATED
+
+
 @bp.route('/<int:id>', methods=['PATCH'])
 @jwt_required()
 def patch(id: int):
@@ -229,6 +424,7 @@ def patch(id: int):
         description=data['desc']
     ))
     db.session.commit()
+    telemetry_cache.invalidate(id)
     return '', status.NO_CONTENT
 
 
@@ -239,10 +435,10 @@ def generate_bokeh(id: int):
     if not s:
         return jsonify(msg=f"session #{id} does not exist"), status.BAD_REQUEST
 
-    sh = db.session.execute(
-        db.select(SessionHtml).filter_by(session_id=id)).scalar_one_or_none()
-    if not sh:
-        id_queue.put(id)
+    sf = db.session.execute(db.select(SessionFigure.name).filter_by(
+        session_id=id).limit(1)).scalar_one_or_none()
+    if not sf:
+        cache_generator.submit(id)
         return '', status.NO_CONTENT
 
     return jsonify(msg=f"already generated (session {id})"), status.BAD_REQUEST
@@ -267,33 +463,52 @@ def session_html(session_id):
             db.select(Session).filter_by(id=session_id)).scalar_one_or_none()
     if not session:
         return jsonify(), status.NOT_FOUND
-
-    session_html = db.session.execute(db.select(SessionHtml).filter_by(
-        session_id=session.id)).scalar_one_or_none()
-    if not session_html:
+    hst = _extract_hst()
+    if not hst:
+        return jsonify(msg="Invalid threshold!"), status.BAD_REQUEST
+
+    figures = db.session.execute(db.select(SessionFigure.name).filter_by(
+        session_id=session.id)).scalars().all()
+    if not figures:
+        cache_generator.submit(session.id, priority=True,
+                               retry_failed=False)
         return jsonify(), status.NOT_FOUND
-    components_script = Markup(session_html.script.replace(
-        '<script type="text/javascript">', '').replace('</script>', ''))
-    components_divs = [Markup(d) if d else None for d in session_html.divs]
-
-    track = db.session.execute(
-        db.select(Track).filter_by(id=session.track)).scalar_one_or_none()
-
-    d = msgpack.unpackb(session.data)
-    t = dataclass_from_dict(Telemetry, d)
-
-    suspension_count = 0
-    if t.Front.Present:
-        suspension_count += 1
-    if t.Rear.Present:
-        suspension_count += 1
-
-    record_num = len(t.Front.Travel) if t.Front.Present else len(t.Rear.Travel)
-    elapsed_time = record_num / t.SampleRate
+    # Only the travel and velocity figures are sent with the session, the
+    # frontend fetches the rest when the section they are in is shown.
+    items = db.session.execute(
+        db.select(SessionFigure.name, SessionFigure.item)
+        .filter_by(session_id=session.id)
+        .where(SessionFigure.name.in_(['travel', 'velocity']))).all()
+
+    # The samples are only decoded if the figures have to be updated. The
+    # summary has everything else, sessions processed before summaries were
+    # introduced read it from the header of their data.
+    summary = db.session.get(SessionSummary, session.id)
+    if summary is not None:
+        elapsed_time = summary.duration
+        suspension_count = sum(v is not None for v in (
+            summary.front_travel_max, summary.rear_travel_max))
+    else:
+        header = header_from_psst(codec.decode_chunks(session.data))
+        elapsed_time = header.elapsed_time
+        suspension_count = sum(s.Present for s in (header.Front, header.Rear))
     start_time = session.timestamp
     end_time = start_time + elapsed_time
-    full_track, session_track = track_data(track.track if track else None,
-                                           start_time, end_time)
+    full_track, session_track = None, None
+    if session.track is not None:
+        def load_track():
+            track = db.session.get(Track, session.track)
+            return track_data(track.track if track else None,
+                              start_time, end_time)
+        full_track, session_track = track_cache.get(
+            (session.track, session.id, start_time, end_time), load_track)
+
+    # Figures are generated with the default threshold, the frontend applies
+    # this update to them when they are embedded.
+    update = None
+    if hst != HIGH_SPEED_THRESHOLD:
+        t = session_telemetry(session.id)
+        update = _filter_data(t, None, None, hst)
 
     response = jsonify(
         id=session.id,
@@ -302,10 +517,13 @@ def session_html(session_id):
         start_time=session.timestamp,
         end_time=end_time,
         suspension_count=suspension_count,
+        track=session.track,
         full_track=full_track,
         session_track=session_track,
-        script=components_script,
-        divs=components_divs,
+        figures=figures,
+        items={name: json.loads(item) for name, item in items},
+        hst=hst,
+        update=update,
         full_access=full_access,
     )
     if not full_access:
@@ -313,6 +531,23 @@ def session_html(session_id):
     return response
 
 
+@bp.route('/<int:id>/figures', methods=['GET'])
+def figures(id: int):
+    names = request.args.getlist('name')
+    items = db.session.execute(
+        db.select(SessionFigure.name, SessionFigure.item)
+        .filter_by(session_id=id)
+        .where(SessionFigure.name.in_(names))).all()
+    if not items:
+        return jsonify(msg="Figures do not exist!"), status.NOT_FOUND
+
+    # Items are stored as JSON already, so they are not parsed and
+    # serialized again.
+    body = ','.join(f'{json.dumps(name)}:{item}' for name, item in items)
+    return current_app.response_class('{' + body + '}',
+                                      mimetype='application/json')
+
+
 @bp.route('/<int:id>/gpx', methods=['PUT'])
 @jwt_required()
 def upload_gpx(id: int):
@@ -321,22 +556,25 @@ def upload_gpx(id: int):
     if not session:
         return jsonify(msg="Session does not exist!"), status.NOT_FOUND
 
-    d = msgpack.unpackb(session.data)
-    t = dataclass_from_dict(Telemetry, d)
-    record_num = len(t.Front.Travel) if t.Front.Present else len(t.Rear.Travel)
-    elapsed_time = record_num / t.SampleRate
+    header = header_from_psst(codec.decode_chunks(session.data))
     start_time = session.timestamp
-    end_time = start_time + elapsed_time
+    end_time = start_time + header.elapsed_time
 
-    track_dict = gpx_to_dict(request.data)
+    try:
+        track_dict = gpx_to_dict(request.data)
+    except ValueError:
+        return jsonify(msg="Invalid GPX file!"), status.BAD_REQUEST
+    if len(track_dict['time']) == 0:
+        return jsonify(msg="Track is not applicable!"), status.BAD_REQUEST
     ts, tf = track_dict['time'][0], track_dict['time'][-1]
     full_track, session_track = track_data(track_dict, start_time, end_time)
     if session_track is None:
         return jsonify(msg="Track is not applicable!"), status.BAD_REQUEST
 
-    new_track = Track(track=json.dumps(track_dict))
+    new_track = Track(track=track_dict)
     db.session.add(new_track)
     db.session.commit()
+    track_cache.invalidate(new_track.id)  # ids of deleted tracks are reused
 
     s1 = db.aliased(Session)
     s2 = db.aliased(Session)
@@ -357,5 +595,6 @@ def upload_gpx(id: int):
     db.session.execute(stmt_update)
     db.session.commit()
 
-    data = dict(full_track=full_track, session_track=session_track)
+    data = dict(track=new_track.id, full_track=full_track,
+                session_track=session_track)
     return jsonify(data), 200
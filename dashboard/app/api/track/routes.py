@@ -4,15 +4,20 @@ from flask import jsonify, request
 from flask_jwt_extended import jwt_required
 
 from app.api.track import bp
-from app.extensions import db
-from app.models.track import Track
+from app.extensions import db, track_cache
+from app.models.track import Track, track_to_json
+from app.telemetry.map import TRACK_OVERVIEW_WIDTH, track_polyline
 from app.telemetry.psst import dataclass_from_dict
+from app.utils.pagination import keyset_args, keyset_page
 
 
 @bp.route('', methods=['GET'])
 def get_all():
-    entities = db.session.execute(db.select(Track)).scalars()
-    return jsonify(list(entities)), status.OK
+    # Tracks have no timestamp of their own, they are paged by id. Only ids
+    # are listed, track points are read through the other routes.
+    ids = db.session.execute(keyset_page(
+        db.select(Track.id), (Track.id,), keyset_args('before'))).scalars()
+    return jsonify([dict(id=id) for id in ids]), status.OK
 
 
 @bp.route('/<int:id>', methods=['GET'])
@@ -21,7 +26,41 @@ def get(id: int):
         db.select(Track).filter_by(id=id)).scalar_one_or_none()
     if not entity:
         return jsonify(msg="Track does not exist!"), status.NOT_FOUND
-    return jsonify(entity), status.OK
+    # Same shape as before tracks were stored as arrays: the track is a
+    # JSON string, without simplification tolerances.
+    return jsonify(id=entity.id,
+                   track=track_to_json(entity.track)), status.OK
+
+
+@bp.route('/<int:id>/polyline', methods=['GET'])
+def polyline(id: int):
+    bounds = tuple(request.args.get(k, type=float) for k in
+                   ('x_start', 'x_end', 'y_start', 'y_end'))
+    width = request.args.get('width', TRACK_OVERVIEW_WIDTH, type=int)
+    if None in bounds:
+        bounds = None
+    else:
+        x_start, x_end, y_start, y_end = bounds
+        if x_end <= x_start or y_end <= y_start:
+            return jsonify(msg="Invalid bounds!"), status.BAD_REQUEST
+        # Half a map of margin on all sides, so that panning does not
+        # immediately run out of data while the next polyline is loading.
+        x_margin, y_margin = (x_end - x_start) / 2, (y_end - y_start) / 2
+        bounds = (x_start - x_margin, x_end + x_margin,
+                  y_start - y_margin, y_end + y_margin)
+        width *= 2
+
+    def load_track():
+        entity = db.session.get(Track, id)
+        if not entity:
+            return None
+        return {k: entity.track[k] for k in ('lat', 'lon', 'tol')
+                if k in entity.track}
+
+    track = track_cache.get((id,), load_track)
+    if track is None:
+        return jsonify(msg="Track does not exist!"), status.NOT_FOUND
+    return jsonify(track_polyline(track, width, bounds)), status.OK
 
 
 @bp.route('/<int:id>', methods=['DELETE'])
@@ -29,6 +68,7 @@ def get(id: int):
 def delete(id: int):
     db.session.execute(db.delete(Track).filter_by(id=id))
     db.session.commit()
+    track_cache.invalidate(id)
     return '', status.NO_CONTENT
 
 
@@ -40,4 +80,5 @@ def put():
         return jsonify(msg="Invalid data for Track"), status.BAD_REQUEST
     entity = db.session.merge(entity)
     db.session.commit()
+    track_cache.invalidate(entity.id)
     return jsonify(id=entity.id), status.CREATED
@@ -2,6 +2,12 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_socketio import SocketIO
 
+from app.telemetry.cache import TelemetryCache, TrackCache
+from app.utils.compress import Compress
+
 db = SQLAlchemy()
 jwt = JWTManager()
 sio = SocketIO()
+telemetry_cache = TelemetryCache()
+track_cache = TrackCache()
+compress = Compress()
@@ -1,9 +1,12 @@
 from app.models.board import Board
+from app.models.cache_job import CacheJob
 from app.models.calibration import Calibration
 from app.models.calibration import CalibrationMethod
 from app.models.linkage import Linkage
 from app.models.session import Session
-from app.models.session_html import SessionHtml
+from app.models.session_figure import SessionFigure
+from app.models.session_hash import SessionHash
+from app.models.session_summary import SessionSummary
 from app.models.setup import Setup
 from app.models.track import Track
 from app.models.user import User
\ No newline at end of file
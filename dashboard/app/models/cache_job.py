@@ -0,0 +1,17 @@
+from dataclasses import dataclass
+
+from app.extensions import db
+
+
+@dataclass
+class CacheJob(db.Model):
+    session_id: int = db.Column(db.Integer, primary_key=True)
+    priority: int = db.Column(db.Integer, nullable=False)
+    state: str = db.Column(db.String, nullable=False, index=True)
+    attempts: int = db.Column(db.Integer, nullable=False, default=0)
+    created: int = db.Column(db.Integer, nullable=False)
+    not_before: int = db.Column(db.Integer, nullable=False)
+    started: int = db.Column(db.Integer)
+    lease_until: int = db.Column(db.Integer)
+    owner: str = db.Column(db.String)
+    error: str = db.Column(db.String)
@@ -0,0 +1,127 @@
+import zlib
+
+from sqlalchemy.types import String, TypeDecorator
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Encoded values start with a tag byte and a codec id. 0xc1 is never used in
+# msgpack, and it is not valid in UTF-8 either, so neither PSST data nor HTML
+# stored before compression was introduced can be mistaken for encoded data.
+TAG = 0xc1
+ZLIB = 1
+ZSTD = 2
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 9
+
+CODEC = ZSTD if zstandard is not None else ZLIB
+HEADER = bytes((TAG, CODEC))
+
+
+def is_current(data: bytes) -> bool:
+    return data[:2] == HEADER
+
+
+def encode(data: bytes) -> bytes:
+    """ Compresses data with the preferred codec. Data that is already
+    compressed with it is returned as is, data compressed with another
+    codec is recompressed.
+    """
+
+    if is_current(data):
+        return data
+    data = decode(data)
+    if CODEC == ZSTD:
+        compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    else:
+        compressed = zlib.compress(data, ZLIB_LEVEL)
+    return HEADER + compressed
+
+
+def decode(data: bytes) -> bytes:
+    """ Returns the original bytes of encoded data, or data itself if it
+    was stored before compression was introduced.
+    """
+
+    if len(data) < 2 or data[0] != TAG:
+        return data
+    codec = data[1]
+    if codec == ZLIB:
+        return zlib.decompress(data[2:])
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstd compressed data, but the zstandard "
+                               "module is not installed")
+        return zstandard.ZstdDecompressor().decompress(data[2:])
+    raise ValueError(f"unknown storage codec: {codec}")
+
+
+def encode_chunks(chunks) -> bytes:
+    """ Same as encode, for (uncompressed) data given as an iterable of
+    chunks, which are compressed as they are read, so the whole original
+    data is never held in memory.
+    """
+
+    if CODEC == ZSTD:
+        compressor = zstandard.ZstdCompressor(
+            level=ZSTD_LEVEL).compressobj()
+    else:
+        compressor = zlib.compressobj(ZLIB_LEVEL)
+    parts = [HEADER]
+    for chunk in chunks:
+        parts.append(compressor.compress(chunk))
+    parts.append(compressor.flush())
+    return b''.join(parts)
+
+
+DECODE_CHUNK_SIZE = 16 * 1024
+
+
+def decode_chunks(data: bytes, chunk_size: int = DECODE_CHUNK_SIZE):
+    """ Same as decode, but yields the original bytes in chunks, and only
+    decompresses as much as the consumer reads, so the beginning of large
+    values is cheap to get.
+    """
+
+    if len(data) < 2 or data[0] != TAG:
+        yield data
+        return
+    codec = data[1]
+    if codec == ZLIB:
+        decompressor = zlib.decompressobj()
+        for i in range(2, len(data), chunk_size):
+            chunk = decompressor.decompress(data[i:i+chunk_size])
+            if chunk:
+                yield chunk
+        yield decompressor.flush()
+    elif codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstd compressed data, but the zstandard "
+                               "module is not installed")
+        yield from zstandard.ZstdDecompressor().read_to_iter(
+            data[2:], read_size=chunk_size)
+    else:
+        raise ValueError(f"unknown storage codec: {codec}")
+
+
+class CompressedText(TypeDecorator):
+    """ Text column stored compressed. Values written before compression was
+    introduced are read back as they are.
+    """
+
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return encode(value.encode('utf-8'))
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value
+        return decode(value).decode('utf-8')
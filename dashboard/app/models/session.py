@@ -1,32 +1,56 @@
 import base64
-import msgpack
 
 from dataclasses import dataclass
 
-from app.extensions import db
-from app.telemetry.psst import Telemetry, dataclass_from_dict
+from app.extensions import db, telemetry_cache
+from app.models import codec
+from app.telemetry.psst import Telemetry, header_from_psst
 
 
 @dataclass
 class Session(db.Model):
     id: int = db.Column(db.Integer, primary_key=True)
     name: str = db.Column(db.String)
-    setup: str = db.Column('setup_id', db.Integer, db.ForeignKey('setup.id'))
+    setup: str = db.Column('setup_id', db.Integer, db.ForeignKey('setup.id'),
+                           index=True)
     description: str = db.Column(db.String)
-    timestamp: int = db.Column(db.Integer, nullable=False)
-    track: int = db.Column('track_id', db.Integer, db.ForeignKey('track.id'))
-    data = db.Column(db.LargeBinary, nullable=False)
+    timestamp: int = db.Column(db.Integer, nullable=False, index=True)
+    track: int = db.Column('track_id', db.Integer, db.ForeignKey('track.id'),
+                           index=True)
+    # Loaded only when accessed, so that listing sessions does not read the
+    # telemetry data.
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))
+
+    @db.validates('data')
+    def _encode_data(self, key: str, data: bytes) -> bytes:
+        return codec.encode(data)
 
     @property
     def psst(self) -> bytes:
-        return self.data
+        return codec.decode(self.data)
 
     @psst.setter
     def psst(self, data: str):
         psst_data = base64.b64decode(data)
-        psst_dict = msgpack.unpackb(psst_data,
-                                    strict_map_key=True)
-        telemetry = dataclass_from_dict(Telemetry, psst_dict)
+        # Only the timestamp is needed, the samples are not decoded.
+        header = header_from_psst(psst_data)
         self.data = psst_data
-        self.timestamp = telemetry.Timestamp
+        self.timestamp = header.Timestamp
         self.setup_id = -1
+
+
+def session_telemetry(session_id: int) -> Telemetry:
+    """ Decoded telemetry of a session (None if the session does not exist)
+    from the telemetry cache. Cache entries are keyed on the length of the
+    stored data, which SQLite returns without reading the blob, so the data
+    is only read when the session is not cached. Routes that replace the
+    data invalidate the cache of the session.
+    """
+
+    size = db.session.execute(
+        db.select(db.func.length(Session.data))
+        .filter_by(id=session_id)).scalar_one_or_none()
+    if size is None:
+        return None
+    return telemetry_cache.get(session_id, size, lambda: db.session.execute(
+        db.select(Session.data).filter_by(id=session_id)).scalar_one())
@@ -0,0 +1,12 @@
+from dataclasses import dataclass
+
+from app.extensions import db
+from app.models.codec import CompressedText
+
+
+@dataclass
+class SessionFigure(db.Model):
+    session_id: int = db.Column(db.Integer, db.ForeignKey('session.id'),
+                                primary_key=True)
+    name: str = db.Column(db.String, primary_key=True)
+    item: str = db.Column(CompressedText, nullable=False)
@@ -0,0 +1,12 @@
+from dataclasses import dataclass
+
+from app.extensions import db
+
+
+@dataclass
+class SessionHash(db.Model):
+    # SHA-256 (hex) of the file a session was imported from, so that
+    # importers can skip files that are already on the server.
+    session_id: int = db.Column(db.Integer, db.ForeignKey('session.id'),
+                                primary_key=True)
+    hash: str = db.Column(db.String, nullable=False, index=True)
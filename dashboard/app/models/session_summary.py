@@ -0,0 +1,29 @@
+from dataclasses import dataclass
+
+from app.extensions import db
+
+
+@dataclass
+class SessionSummary(db.Model):
+    # See session_summary in app.telemetry.summary. Columns of suspensions
+    # that are not present are null.
+    session_id: int = db.Column(db.Integer, db.ForeignKey('session.id'),
+                                primary_key=True)
+    duration: float = db.Column(db.Float, nullable=False, index=True)
+    sample_count: int = db.Column(db.Integer, nullable=False)
+    front_travel_avg: float = db.Column(db.Float, index=True)
+    front_travel_max: float = db.Column(db.Float, index=True)
+    front_bottomouts: int = db.Column(db.Integer, index=True)
+    front_hsc: float = db.Column(db.Float, index=True)
+    front_lsc: float = db.Column(db.Float, index=True)
+    front_lsr: float = db.Column(db.Float, index=True)
+    front_hsr: float = db.Column(db.Float, index=True)
+    rear_travel_avg: float = db.Column(db.Float, index=True)
+    rear_travel_max: float = db.Column(db.Float, index=True)
+    rear_bottomouts: int = db.Column(db.Integer, index=True)
+    rear_hsc: float = db.Column(db.Float, index=True)
+    rear_lsc: float = db.Column(db.Float, index=True)
+    rear_lsr: float = db.Column(db.Float, index=True)
+    rear_hsr: float = db.Column(db.Float, index=True)
+    airtime_count: int = db.Column(db.Integer, nullable=False, index=True)
+    airtime_total: float = db.Column(db.Float, nullable=False, index=True)
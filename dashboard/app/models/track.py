@@ -1,9 +1,103 @@
+import json
+
+import msgpack
+import numpy as np
+
 from dataclasses import dataclass
 
+from sqlalchemy.types import String, TypeDecorator
+
 from app.extensions import db
+from app.models import codec
+from app.telemetry.simplify import douglas_peucker_tolerances
+
+
+# tol is the simplification tolerance of every point (see
+# douglas_peucker_tolerances)
+TRACK_FIELDS = ('lat', 'lon', 'ele', 'time', 'tol')
+
+
+def _with_tolerances(track: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    # Tracks stored or sent without simplification tolerances get them here.
+    if len(track.get('tol', [])) != len(track['lat']):
+        track = dict(track)
+        track['tol'] = douglas_peucker_tolerances(
+            np.asarray(track['lon'], dtype=np.float64),
+            np.asarray(track['lat'], dtype=np.float64))
+    return track
+
+
+def _from_json(value: str) -> dict[str, np.ndarray]:
+    # Tracks stored before they were stored as arrays. Missing elevations
+    # were stored as null, and points were not necessarily in time order.
+    # They have no simplification tolerances, those are only computed when
+    # the track is written (flask recompress rewrites these tracks).
+    d = json.loads(value)
+    track = {k: np.array(d.get(k, []), dtype=np.float64)
+             for k in TRACK_FIELDS}
+    if np.any(np.diff(track['time']) < 0):
+        p = np.argsort(track['time'], kind='stable')
+        track = {k: v[p] if len(v) == len(p) else v
+                 for k, v in track.items()}
+    return {k: v for k, v in track.items() if k != 'tol' or len(v)}
+
+
+def track_to_json(track: dict[str, np.ndarray]) -> str:
+    """ The track as it was stored before it was stored as arrays, and as
+    it is returned by the API: a JSON map of lat, lon, ele and time lists,
+    with missing elevations as null.
+    """
+
+    ele = np.asarray(track['ele'])
+    return json.dumps(dict(
+        lat=np.asarray(track['lat']).tolist(),
+        lon=np.asarray(track['lon']).tolist(),
+        ele=np.where(np.isfinite(ele), ele, None).tolist(),
+        time=np.asarray(track['time']).tolist(),
+    ))
+
+
+class TrackArrays(TypeDecorator):
+    """ Track points stored as compressed little-endian float64 arrays (a
+    msgpack map of raw buffers), read back as a dict of NumPy arrays.
+    Simplification tolerances are computed when a track is written. JSON
+    tracks written before this was introduced are still read (without
+    tolerances), and JSON strings are accepted when writing.
+    """
+
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = _from_json(value)
+        value = _with_tolerances(value)
+        packed = msgpack.packb({
+            k: np.ascontiguousarray(value[k], dtype='<f8').tobytes()
+            for k in TRACK_FIELDS if k in value})
+        return codec.encode(packed)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return _from_json(value)
+        packed = msgpack.unpackb(codec.decode(value))
+        return {k: np.frombuffer(v, dtype='<f8') for k, v in packed.items()}
+
+    def compare_values(self, x, y):
+        # Arrays can not be compared with ==, tracks are only ever replaced.
+        return x is y
 
 
 @dataclass
 class Track(db.Model):
+    # Deferred columns are not Column instances, so the ORM must not
+    # interpret the (dataclass) annotation of track.
+    __allow_unmapped__ = True
+
     id: int = db.Column(db.Integer, primary_key=True)
-    track: str = db.Column(db.String, nullable=False)
+    # Loaded only when accessed, so that listing tracks by id is cheap.
+    track: dict = db.deferred(db.Column(TrackArrays, nullable=False))
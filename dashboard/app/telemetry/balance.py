@@ -6,44 +6,57 @@ from bokeh.models import ColumnDataSource
 from bokeh.models.tickers import FixedTicker
 from bokeh.plotting import figure
 
-from app.telemetry.psst import Stroke
+from app.telemetry.index import StrokeSelection
 
 
-def _travel_velocity(strokes: list[Stroke], travel_max) -> (
-                     np.array, np.array):
-    t, v = [], []
-    for s in strokes:
-        t.append(s.Stat.MaxTravel / travel_max * 100)
-        v.append(s.Stat.MaxVelocity)
+MAX_POINTS = 2000  # scatter points shown per suspension
 
-    t = np.array(t)
-    v = np.array(v)
-    p = t.argsort()
-    return t[p], v[p]
 
+def _thin(count: int, max_points: int) -> np.ndarray:
+    # Evenly spaced strokes (in time) of the selection, so the density of
+    # the scatter plot is kept while its size is bounded.
+    if count <= max_points:
+        return np.arange(count)
+    return np.unique(np.linspace(0, count - 1, max_points).astype(np.int64))
 
-def _balance_data(front_strokes: list[Stroke], rear_strokes: list[Stroke],
-                  front_max: float, rear_max: float) -> (
-                  dict[str, Any], dict[str, Any]):
-    ft, fv = _travel_velocity(front_strokes, front_max)
-    rt, rv = _travel_velocity(rear_strokes, rear_max)
 
-    fp = np.poly1d(np.polyfit(ft, fv, 1))
-    rp = np.poly1d(np.polyfit(rt, rv, 1))
+def _travel_velocity(strokes: StrokeSelection, rebound: bool,
+                     travel_max: float, max_points: int) -> (
+                     dict[str, Any], float):
+    table = strokes.Rebounds if rebound else strokes.Compressions
+    slope, intercept = (strokes.rebound_trend if rebound else
+                        strokes.compression_trend)
 
-    f = dict(travel=ft.tolist(), velocity=fv.tolist(),
-             trend=[fp(t) for t in ft])
-    r = dict(travel=rt.tolist(), velocity=rv.tolist(),
-             trend=[rp(t) for t in rt])
+    rows = _thin(len(table), max_points)
+    x = table.MaxTravel[rows]
+    v = table.MaxVelocity[rows]
+    p = x.argsort()
+    x, v = x[p], v[p]
 
-    return f, r
+    data = dict(travel=(x / travel_max * 100).astype(np.float32),
+                velocity=v.astype(np.float32),
+                trend=(slope * x + intercept).astype(np.float32))
+    range_end = float(np.max(table.MaxTravel, initial=0) / travel_max * 100)
+    return data, range_end
 
 
-def balance_figure(front_strokes: list[Stroke], rear_strokes: list[Stroke],
-                   front_max: float, rear_max: float, flipped: bool,
-                   front_color: tuple[str], rear_color: tuple[str],
-                   name: str, title: str) -> (figure):
-    f, r = _balance_data(front_strokes, rear_strokes, front_max, rear_max)
+def _balance_data(front_strokes: StrokeSelection,
+                  rear_strokes: StrokeSelection, rebound: bool,
+                  front_max: float, rear_max: float, max_points: int) -> (
+                  dict[str, Any], dict[str, Any], float):
+    f, f_end = _travel_velocity(front_strokes, rebound, front_max,
+                                max_points)
+    r, r_end = _travel_velocity(rear_strokes, rebound, rear_max, max_points)
+    return f, r, max(f_end, r_end)
+
+
+def balance_figure(front_strokes: StrokeSelection,
+                   rear_strokes: StrokeSelection, front_max: float,
+                   rear_max: float, rebound: bool, front_color: tuple[str],
+                   rear_color: tuple[str], name: str, title: str,
+                   max_points: int = MAX_POINTS) -> (figure):
+    f, r, range_end = _balance_data(front_strokes, rear_strokes, rebound,
+                                    front_max, rear_max, max_points)
     front_source = ColumnDataSource(name='ds_f', data=f)
     rear_source = ColumnDataSource(name='ds_r', data=r)
 
@@ -51,7 +64,7 @@ def balance_figure(front_strokes: list[Stroke], rear_strokes: list[Stroke],
         name=name,
         title=title,
         height=600,
-        x_range=(0, np.fmax(f['travel'][-1], r['travel'][-1])),
+        x_range=(0, range_end),
         sizing_mode="stretch_width",
         toolbar_location=None,
         tools='',
@@ -59,7 +72,7 @@ def balance_figure(front_strokes: list[Stroke], rear_strokes: list[Stroke],
         y_axis_label="Velocity (mm/s)",
         output_backend='webgl')
     p.xaxis.ticker = FixedTicker(ticks=list(range(0, 110, 10)))
-    p.y_range.flipped = flipped
+    p.y_range.flipped = rebound
     p.circle(
         'travel', 'velocity',
         legend_label="Front",
@@ -89,12 +102,15 @@ def balance_figure(front_strokes: list[Stroke], rear_strokes: list[Stroke],
     return p
 
 
-def update_balance(front_strokes: list[Stroke], rear_strokes: list[Stroke],
-                   front_max: float, rear_max: float):
-    f_data, r_data = _balance_data(
-        front_strokes, rear_strokes, front_max, rear_max)
+def update_balance(front_strokes: StrokeSelection,
+                   rear_strokes: StrokeSelection, front_max: float,
+                   rear_max: float, rebound: bool,
+                   max_points: int = MAX_POINTS):
+    f_data, r_data, range_end = _balance_data(
+        front_strokes, rear_strokes, rebound, front_max, rear_max,
+        max_points)
     return dict(
         f_data=f_data,
         r_data=r_data,
-        range_end=np.fmax(f_data['travel'][-1], r_data['travel'][-1])
+        range_end=range_end
     )
@@ -0,0 +1,189 @@
+import threading
+
+import numpy as np
+
+from collections import OrderedDict
+
+from flask import Flask
+
+from app.telemetry.index import suspension_index
+from app.telemetry.lod import sample_pyramid
+from app.telemetry.psst import Telemetry, telemetry_from_psst
+
+
+def _nbytes(o, seen: set) -> int:
+    if isinstance(o, np.ndarray):
+        # Views are accounted for by the array that owns the memory.
+        if not isinstance(o.base, np.ndarray) and id(o) not in seen:
+            seen.add(id(o))
+            return o.nbytes
+        return 0
+    if isinstance(o, (list, tuple)):
+        return sum(_nbytes(i, seen) for i in o)
+    if isinstance(o, dict):
+        return sum(_nbytes(v, seen) for v in o.values())
+    if hasattr(o, '__dict__'):
+        return sum(_nbytes(v, seen) for v in vars(o).values())
+    return 0
+
+
+def _decode(data: bytes) -> Telemetry:
+    # Imported here, because app.models depends on app.extensions, which
+    # creates the cache.
+    from app.models import codec
+
+    telemetry = telemetry_from_psst(codec.decode(data))
+    for suspension in (telemetry.Front, telemetry.Rear):
+        if suspension.Present:
+            suspension_index(suspension)
+    sample_pyramid(telemetry)
+    return telemetry
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.telemetry = None
+        self.error = None
+
+
+class TelemetryCache:
+    """ Bounded LRU cache of decoded Telemetry instances (with their range
+    indices and sample pyramids already built), keyed by session id and a
+    version of the stored data (see session_telemetry), so stored data is
+    only read and decompressed when it has to be decoded. Concurrent
+    requests for a session that is not yet cached wait for a single decode
+    instead of decoding it in parallel.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+
+    def init_app(self, app: Flask):
+        self.max_bytes = app.config.setdefault('TELEMETRY_CACHE_SIZE',
+                                               self.max_bytes)
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._evictions += 1
+
+    def get(self, session_id: int, version, load) -> Telemetry:
+        """ Returns the cached telemetry, or decodes the stored data
+        returned by load().
+        """
+
+        key = (session_id, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._misses += 1
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.telemetry
+
+        try:
+            flight.telemetry = _decode(load())
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+                if flight.error is None:
+                    size = _nbytes(flight.telemetry, set())
+                    if size <= self.max_bytes:
+                        self._entries[key] = (flight.telemetry, size)
+                        self._bytes += size
+                        self._evict()
+            flight.done.set()
+        return flight.telemetry
+
+    def invalidate(self, session_id: int):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == session_id]:
+                _, size = self._entries.pop(key)
+                self._bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+                hits=self._hits,
+                misses=self._misses,
+                coalesced=self._coalesced,
+                evictions=self._evictions,
+                loading=len(self._flights),
+            )
+
+
+class TrackCache:
+    """ Bounded LRU cache of map data derived from tracks: the full track
+    and the interpolated session track of sessions, and the track arrays
+    that simplified polylines are cut from. Keys are tuples that start with
+    the track id, so the track is neither loaded nor processed again when a
+    session is opened or its map is moved.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def init_app(self, app: Flask):
+        self.max_bytes = app.config.setdefault('TRACK_CACHE_SIZE',
+                                               self.max_bytes)
+
+    def get(self, key: tuple, load):
+        """ Returns the cached data, or calls load() to create it. None is
+        not cached.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        data = load()
+        if data is None:
+            return None
+        size = _nbytes(data, set())
+        with self._lock:
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = (data, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self._bytes -= evicted
+        return data
+
+    def invalidate(self, track_id: int):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == track_id]:
+                _, size = self._entries.pop(key)
+                self._bytes -= size
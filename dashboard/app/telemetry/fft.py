@@ -14,16 +14,17 @@ def _fft_data(travel: list[float], tick: float) -> (dict[str, np.array]):
     balanced_travel = travel - np.mean(travel)
     n = np.max([20000, len(balanced_travel)])
     balanced_travel_f = rfft(balanced_travel, n=n)
-    balanced_spectrum = np.square(np.abs(balanced_travel_f)).tolist()
+    balanced_spectrum = np.square(np.abs(balanced_travel_f))
 
     freqs = rfftfreq(n, tick)
-    freqs = freqs[freqs <= 10].tolist()  # cut off FFT graph at 10 Hz
+    freqs = freqs[freqs <= 10]  # cut off FFT graph at 10 Hz
 
     # TODO put a label that shows the most prominent frequencies
     # max_freq_idx = np.argpartition(balanced_spectrum, -1)[-1:]
     # print(f[max_freq_idx])
 
-    return dict(freqs=freqs, spectrum=balanced_spectrum[:len(freqs)])
+    return dict(freqs=freqs.astype(np.float32),
+                spectrum=balanced_spectrum[:len(freqs)].astype(np.float32))
 
 
 def fft_figure(travel: list[float], tick: float, color: tuple[str], 
@@ -0,0 +1,359 @@
+import numpy as np
+
+from dataclasses import dataclass
+
+from app.telemetry.psst import (
+    StrokeStat,
+    StrokeTable,
+    Suspension,
+    _flat_ranges
+)
+
+
+TRAVEL_BINS_FOR_VELOCITY_HISTOGRAM = 10
+BLOCK_SIZE = 64  # number of strokes between two cumulative histogram rows
+
+
+def _prefix(values: np.ndarray) -> np.ndarray:
+    p = np.zeros(len(values) + 1, dtype=np.float64)
+    np.cumsum(values, out=p[1:])
+    return p
+
+
+@dataclass
+class Moments:
+    """ Sufficient statistics of a set of samples. Moments of disjoint sets
+    can be added together.
+    """
+
+    count: int
+    sum: float
+    sumsq: float
+    min: float
+    max: float
+
+    def __add__(self, other: 'Moments') -> 'Moments':
+        return Moments(
+            count=self.count + other.count,
+            sum=self.sum + other.sum,
+            sumsq=self.sumsq + other.sumsq,
+            min=min(self.min, other.min),
+            max=max(self.max, other.max),
+        )
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count
+
+    @property
+    def std(self) -> float:
+        # Population standard deviation, as in scipy.stats.norm.fit
+        return float(np.sqrt(max(self.sumsq / self.count - self.mean ** 2,
+                                 0.0)))
+
+
+def _stroke_extrema(values: np.ndarray, start: np.ndarray,
+                    end: np.ndarray) -> (np.ndarray, np.ndarray):
+    # Minimum and maximum of values[start[i]:end[i]+1] for every stroke.
+    # Strokes are disjoint and ordered, so the boundaries are monotonic, and
+    # every other reduceat segment is a stroke.
+    if len(start) == 0:
+        return np.zeros(0), np.zeros(0)
+    bounds = np.column_stack((start, end + 1)).ravel()
+    if bounds[-1] == len(values):
+        bounds = bounds[:-1]
+    return (np.minimum.reduceat(values, bounds)[::2],
+            np.maximum.reduceat(values, bounds)[::2])
+
+
+class _CumulativeHistogram:
+    """ Cumulative bin counts of a flat, stroke-ordered key array, stored at
+    every BLOCK_SIZE-th stroke. Counts for a range of strokes are the
+    difference of two stored rows, plus the keys of the at most 2*BLOCK_SIZE
+    strokes at the edges of the range that do not fall on a stored row.
+    """
+
+    def __init__(self, keys: np.ndarray, offsets: np.ndarray, bins: int):
+        self._keys = keys
+        self._offsets = offsets
+        self._bins = bins
+
+        blocks = (len(offsets) - 1) // BLOCK_SIZE
+        bounds = offsets[0:blocks*BLOCK_SIZE+1:BLOCK_SIZE]
+        block_ids = np.repeat(np.arange(blocks), np.diff(bounds))
+        counts = np.bincount(block_ids * bins + keys[:bounds[-1]],
+                             minlength=blocks * bins)
+        self._rows = np.zeros((blocks + 1, bins), dtype=np.int32)
+        np.cumsum(counts.reshape(blocks, bins), axis=0, out=self._rows[1:])
+
+    def _count(self, lo: int, hi: int) -> np.ndarray:
+        keys = self._keys[self._offsets[lo]:self._offsets[hi]]
+        return np.bincount(keys, minlength=self._bins)
+
+    def counts(self, lo: int, hi: int) -> np.ndarray:
+        block_lo = -(-lo // BLOCK_SIZE)
+        block_hi = hi // BLOCK_SIZE
+        if block_lo >= block_hi:
+            return self._count(lo, hi)
+        return (self._rows[block_hi] - self._rows[block_lo] +
+                self._count(lo, block_lo * BLOCK_SIZE) +
+                self._count(block_hi * BLOCK_SIZE, hi))
+
+
+class _SortedBlocks:
+    """ Sample values of strokes, sorted within every block of BLOCK_SIZE
+    strokes. The number of samples below any threshold in a range of strokes
+    is a binary search in every block the range covers, plus a count over
+    the at most 2*BLOCK_SIZE strokes at the edges of the range.
+    """
+
+    def __init__(self, values: np.ndarray, start: np.ndarray,
+                 end: np.ndarray):
+        self._values = values
+        self._start = start.astype(np.int64)
+        self._lengths = (end - start + 1).astype(np.int64)
+        offsets = _prefix(self._lengths).astype(np.int64)
+        self._bounds = offsets[::BLOCK_SIZE]
+        samples = values[_flat_ranges(self._start, self._lengths)]
+        self._sorted = np.concatenate([
+            np.sort(samples[lo:hi])
+            for lo, hi in zip(self._bounds[:-1], self._bounds[1:])] +
+            [np.zeros(0)])
+
+    def _count(self, lo: int, hi: int, threshold: float, side: str) -> int:
+        samples = self._values[_flat_ranges(self._start[lo:hi],
+                                            self._lengths[lo:hi])]
+        if side == 'left':
+            return int(np.count_nonzero(samples < threshold))
+        return int(np.count_nonzero(samples <= threshold))
+
+    def count(self, lo: int, hi: int, threshold: float,
+              side: str = 'left') -> int:
+        """ Number of samples of strokes [lo, hi) that are below threshold
+        (side='left'), or not above it (side='right').
+        """
+
+        block_lo = -(-lo // BLOCK_SIZE)
+        block_hi = min(hi // BLOCK_SIZE, len(self._bounds) - 1)
+        if block_lo >= block_hi:
+            return self._count(lo, hi, threshold, side)
+        count = 0
+        for b in range(block_lo, block_hi):
+            first, last = self._bounds[b], self._bounds[b + 1]
+            count += int(np.searchsorted(self._sorted[first:last], threshold,
+                                         side=side))
+        return (count +
+                self._count(lo, block_lo * BLOCK_SIZE, threshold, side) +
+                self._count(block_hi * BLOCK_SIZE, hi, threshold, side))
+
+
+class StrokeIndex:
+    """ Range-query index over a StrokeTable. Strokes are disjoint and ordered
+    by time, so the strokes contained in a sample range are a contiguous run
+    of rows that can be located by binary search on Start and End.
+    """
+
+    def __init__(self, strokes: StrokeTable, velocity: np.ndarray,
+                 travel_bins: int, velocity_bins: int,
+                 fine_velocity_bins: int, divider: int, rebound: bool):
+        if np.any(np.diff(strokes.Start) < 0):
+            strokes = strokes.select(np.argsort(strokes.Start, kind='stable'))
+        self.table = strokes
+        self._rebound = rebound
+
+        self._count = _prefix(strokes.Count)
+        self._sum_travel = _prefix(strokes.SumTravel)
+        self._sum_velocity = _prefix(strokes.SumVelocity)
+        self._bottomouts = _prefix(strokes.Bottomouts)
+
+        # Per-stroke velocity sums from prefix sums over the whole signal,
+        # so the normal distribution of any range of strokes is computed from
+        # aggregates instead of the samples.
+        velocity = np.asarray(velocity, dtype=np.float64)
+        start, stop = strokes.Start, strokes.End + 1
+        sv = _prefix(velocity)
+        sq = _prefix(np.square(velocity))
+        self._count_v = _prefix(stop - start)
+        self._sum_v = _prefix(sv[stop] - sv[start])
+        self._sumsq_v = _prefix(sq[stop] - sq[start])
+        self._min_v, self._max_v = _stroke_extrema(velocity, start,
+                                                   strokes.End)
+        self._sorted_v = _SortedBlocks(velocity, start, strokes.End)
+
+        # Least squares sums of the per-stroke maximum velocity over maximum
+        # travel, so the balance trend of any range of strokes is computed
+        # in closed form. Values are centered to keep the sums accurate.
+        x = strokes.MaxTravel.astype(np.float64)
+        y = strokes.MaxVelocity.astype(np.float64)
+        self._x0 = float(np.mean(x)) if len(x) else 0.0
+        self._y0 = float(np.mean(y)) if len(y) else 0.0
+        x, y = x - self._x0, y - self._y0
+        self._sum_x = _prefix(x)
+        self._sum_y = _prefix(y)
+        self._sum_xx = _prefix(x * x)
+        self._sum_xy = _prefix(x * y)
+
+        tbin = strokes.DigitizedTravel // divider
+        self._travel = _CumulativeHistogram(
+            strokes.DigitizedTravel, strokes.Offsets, travel_bins)
+        self._velocity = _CumulativeHistogram(
+            tbin * velocity_bins + strokes.DigitizedVelocity,
+            strokes.Offsets,
+            TRAVEL_BINS_FOR_VELOCITY_HISTOGRAM * velocity_bins)
+        self._fine_velocity = _CumulativeHistogram(
+            tbin * fine_velocity_bins + strokes.FineDigitizedVelocity,
+            strokes.Offsets,
+            TRAVEL_BINS_FOR_VELOCITY_HISTOGRAM * fine_velocity_bins)
+
+    def rows(self, start: int, end: int) -> (int, int):
+        # Strokes that satisfy Start > start and End < end
+        lo = 0 if start is None else int(np.searchsorted(
+            self.table.Start, start, side='right'))
+        hi = len(self.table) if end is None else int(np.searchsorted(
+            self.table.End, end, side='left'))
+        return lo, max(lo, hi)
+
+    def stats(self, lo: int, hi: int) -> StrokeStat:
+        max_velocity = self.table.MaxVelocity[lo:hi]
+        return StrokeStat(
+            SumTravel=float(self._sum_travel[hi] - self._sum_travel[lo]),
+            MaxTravel=float(np.max(self.table.MaxTravel[lo:hi], initial=0)),
+            SumVelocity=float(self._sum_velocity[hi] - self._sum_velocity[lo]),
+            MaxVelocity=float(np.min(max_velocity, initial=0) if self._rebound
+                              else np.max(max_velocity, initial=0)),
+            Bottomouts=int(self._bottomouts[hi] - self._bottomouts[lo]),
+            Count=int(self._count[hi] - self._count[lo]),
+        )
+
+    def velocity_moments(self, lo: int, hi: int) -> Moments:
+        return Moments(
+            count=int(self._count_v[hi] - self._count_v[lo]),
+            sum=float(self._sum_v[hi] - self._sum_v[lo]),
+            sumsq=float(self._sumsq_v[hi] - self._sumsq_v[lo]),
+            min=float(np.min(self._min_v[lo:hi], initial=np.inf)),
+            max=float(np.max(self._max_v[lo:hi], initial=-np.inf)),
+        )
+
+    def velocity_trend(self, lo: int, hi: int) -> (float, float):
+        """ Slope and intercept of the line fitted to the maximum velocity
+        and maximum travel of strokes [lo, hi).
+        """
+
+        n = hi - lo
+        sx = self._sum_x[hi] - self._sum_x[lo]
+        sy = self._sum_y[hi] - self._sum_y[lo]
+        sxx = self._sum_xx[hi] - self._sum_xx[lo]
+        sxy = self._sum_xy[hi] - self._sum_xy[lo]
+        denominator = n * sxx - sx * sx
+        if n == 0:
+            return 0.0, 0.0
+        if denominator <= 0:
+            return 0.0, float(sy / n + self._y0)
+        slope = (n * sxy - sx * sy) / denominator
+        intercept = (sy - slope * sx) / n
+        return (float(slope),
+                float(intercept + self._y0 - slope * self._x0))
+
+    def velocity_count(self, lo: int, hi: int, threshold: float,
+                       side: str = 'left') -> int:
+        return self._sorted_v.count(lo, hi, threshold, side)
+
+    def travel_histogram(self, lo: int, hi: int) -> np.ndarray:
+        return self._travel.counts(lo, hi)
+
+    def velocity_histogram(self, lo: int, hi: int) -> np.ndarray:
+        return self._velocity.counts(lo, hi).reshape(
+            TRAVEL_BINS_FOR_VELOCITY_HISTOGRAM, -1)
+
+    def fine_velocity_histogram(self, lo: int, hi: int) -> np.ndarray:
+        return self._fine_velocity.counts(lo, hi).reshape(
+            TRAVEL_BINS_FOR_VELOCITY_HISTOGRAM, -1)
+
+
+class StrokeSelection:
+    """ Strokes of a suspension that are fully contained in a sample range.
+    Compressions and Rebounds are StrokeTable views, so the selection can be
+    used wherever a Strokes instance is expected, while histograms and
+    statistics are answered from the index.
+    """
+
+    def __init__(self, index: 'SuspensionIndex', start: int, end: int):
+        self._compression_index = index.Compressions
+        self._rebound_index = index.Rebounds
+        self._c = index.Compressions.rows(start, end)
+        self._r = index.Rebounds.rows(start, end)
+        self.Compressions = index.Compressions.table.slice(*self._c)
+        self.Rebounds = index.Rebounds.table.slice(*self._r)
+
+    @property
+    def compression_stats(self) -> StrokeStat:
+        return self._compression_index.stats(*self._c)
+
+    @property
+    def rebound_stats(self) -> StrokeStat:
+        return self._rebound_index.stats(*self._r)
+
+    @property
+    def compression_trend(self) -> (float, float):
+        return self._compression_index.velocity_trend(*self._c)
+
+    @property
+    def rebound_trend(self) -> (float, float):
+        return self._rebound_index.velocity_trend(*self._r)
+
+    def velocity_moments(self) -> Moments:
+        return (self._compression_index.velocity_moments(*self._c) +
+                self._rebound_index.velocity_moments(*self._r))
+
+    def velocity_bands(self, threshold: float) -> (int, int, int, int):
+        """ Number of high-speed and low-speed rebound samples, and
+        low-speed and high-speed compression samples.
+        """
+
+        c = self._compression_index.velocity_moments(*self._c).count
+        r = self._rebound_index.velocity_moments(*self._r).count
+        lsc = self._compression_index.velocity_count(*self._c, threshold)
+        hsr = self._rebound_index.velocity_count(*self._r, -threshold,
+                                                 side='right')
+        return hsr, r - hsr, lsc, c - lsc
+
+    def travel_histogram(self) -> np.ndarray:
+        return (self._compression_index.travel_histogram(*self._c) +
+                self._rebound_index.travel_histogram(*self._r))
+
+    def velocity_histogram(self) -> np.ndarray:
+        return (self._compression_index.velocity_histogram(*self._c) +
+                self._rebound_index.velocity_histogram(*self._r))
+
+    def fine_velocity_histogram(self) -> np.ndarray:
+        return (self._compression_index.fine_velocity_histogram(*self._c) +
+                self._rebound_index.fine_velocity_histogram(*self._r))
+
+
+class SuspensionIndex:
+    def __init__(self, suspension: Suspension):
+        args = (
+            len(suspension.TravelBins) - 1,
+            len(suspension.VelocityBins) - 1,
+            len(suspension.FineVelocityBins) - 1,
+            (len(suspension.TravelBins) - 1) //
+            TRAVEL_BINS_FOR_VELOCITY_HISTOGRAM,
+        )
+        self.Compressions = StrokeIndex(suspension.Strokes.Compressions,
+                                        suspension.Velocity, *args,
+                                        rebound=False)
+        self.Rebounds = StrokeIndex(suspension.Strokes.Rebounds,
+                                    suspension.Velocity, *args, rebound=True)
+
+    def select(self, start: int = None, end: int = None) -> StrokeSelection:
+        return StrokeSelection(self, start, end)
+
+
+def suspension_index(suspension: Suspension) -> SuspensionIndex:
+    # The index is attached to the suspension, so it is built only once for
+    # every decoded Telemetry instance.
+    index = getattr(suspension, '_index', None)
+    if index is None:
+        index = SuspensionIndex(suspension)
+        suspension._index = index
+    return index
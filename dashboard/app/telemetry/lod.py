@@ -0,0 +1,110 @@
+import numpy as np
+
+from app.telemetry.psst import Telemetry
+
+
+LOD_FACTOR = 4  # number of blocks merged into one on the next level
+LOD_MIN_BLOCKS = 1000  # the coarsest level has at least this many blocks
+LOD_INITIAL_WIDTH = 2000  # width (in pixels) used for the cached figures
+LOD_MAX_WIDTH = 8000
+
+
+def _reduce(mn: np.ndarray, mx: np.ndarray) -> (np.ndarray, np.ndarray):
+    pad = -len(mn) % LOD_FACTOR
+    mn = np.pad(mn, (0, pad), mode='edge').reshape(-1, LOD_FACTOR)
+    mx = np.pad(mx, (0, pad), mode='edge').reshape(-1, LOD_FACTOR)
+    return mn.min(axis=1), mx.max(axis=1)
+
+
+class _SignalPyramid:
+    """ Min/max pyramid of a signal. Level 0 is the signal itself, a block on
+    level k covers LOD_FACTOR**k samples, and stores their minimum and
+    maximum, so peaks survive decimation on every level.
+    """
+
+    def __init__(self, signal: np.ndarray):
+        self.levels = [(signal, signal)]
+        mn, mx = signal, signal
+        while len(mn) > LOD_MIN_BLOCKS * LOD_FACTOR:
+            mn, mx = _reduce(mn, mx)
+            self.levels.append((mn, mx))
+
+    def window(self, level: int, lo: int, hi: int) -> np.ndarray:
+        mn, mx = self.levels[level]
+        if level == 0:
+            return mn[lo:hi]
+        # Minimum and maximum are emitted as two consecutive points per block.
+        return np.column_stack((mn[lo:hi], mx[lo:hi])).ravel()
+
+
+class SamplePyramid:
+    """ Multi-resolution travel and velocity data of a Telemetry. A window
+    query returns the coarsest level that still has at least two points
+    (block minimum and maximum) per pixel of the requested width.
+    """
+
+    def __init__(self, telemetry: Telemetry):
+        self.sample_rate = telemetry.SampleRate
+        self.length = len(telemetry.Front.Travel if telemetry.Front.Present
+                          else telemetry.Rear.Travel)
+
+        def pyramid(suspension, signal: str):
+            if not suspension.Present:
+                return None
+            return _SignalPyramid(getattr(suspension, signal))
+
+        self._travel = (pyramid(telemetry.Front, 'Travel'),
+                        pyramid(telemetry.Rear, 'Travel'))
+        self._velocity = (pyramid(telemetry.Front, 'Velocity'),
+                          pyramid(telemetry.Rear, 'Velocity'))
+        self._levels = len(next(p for p in self._travel if p).levels)
+
+    def _level(self, lo: int, hi: int, width: int) -> int:
+        level = 0
+        while (level + 1 < self._levels and
+               (hi - lo) / LOD_FACTOR ** (level + 1) >= width):
+            level += 1
+        return level
+
+    def _time(self, level: int, lo: int, hi: int) -> np.ndarray:
+        block = LOD_FACTOR ** level
+        t = np.arange(lo, hi) * block
+        if level != 0:
+            t = np.column_stack((t, t + block / 2)).ravel()
+        return t / self.sample_rate
+
+    def _data(self, pyramids: tuple, level: int, lo: int, hi: int,
+              t: np.ndarray, scale: float) -> dict[str, np.ndarray]:
+        data = dict(t=t.astype(np.float32))
+        for name, pyramid in zip(('f', 'r'), pyramids):
+            if pyramid:
+                values = pyramid.window(level, lo, hi) / scale
+            else:
+                values = np.zeros(len(t))
+            data[name] = values.astype(np.float32)
+        return data
+
+    def window(self, start: int, end: int, width: int) -> (
+               dict[str, dict[str, np.ndarray]]):
+        lo = 0 if start is None else max(0, start)
+        hi = self.length if end is None else min(self.length, end + 1)
+        width = int(np.clip(width, 1, LOD_MAX_WIDTH))
+
+        level = self._level(lo, hi, width)
+        block = LOD_FACTOR ** level
+        lo, hi = lo // block, -(-hi // block)
+        t = self._time(level, lo, hi)
+        return dict(
+            travel=self._data(self._travel, level, lo, hi, t, 1),
+            velocity=self._data(self._velocity, level, lo, hi, t, 1000),
+        )
+
+
+def sample_pyramid(telemetry: Telemetry) -> SamplePyramid:
+    # Attached to the telemetry, so that cached telemetries keep their
+    # pyramid between requests.
+    pyramid = getattr(telemetry, '_pyramid', None)
+    if pyramid is None:
+        pyramid = SamplePyramid(telemetry)
+        telemetry._pyramid = pyramid
+    return pyramid
@@ -1,12 +1,10 @@
 import io
-import json
-import math
 import numpy as np
-import gpxpy
-import gpxpy.gpx
 import xyzservices.providers as xyz
 
+from datetime import datetime, timezone
 from typing import Any
+from xml.etree import ElementTree
 
 from bokeh.models import Circle, ColumnDataSource
 from bokeh.models.callbacks import CustomJS
@@ -14,81 +12,174 @@ from bokeh.palettes import Spectral11
 from bokeh.plotting import figure
 from scipy.interpolate import pchip_interpolate
 
+from app.telemetry.simplify import douglas_peucker_tolerances, simplified
+
+
+TRACK_OVERVIEW_WIDTH = 1000  # width (in pixels) the whole track is sent for
+TRACK_MAX_WIDTH = 8000
 
-def _geographic_to_mercator(y_lat: float, x_lon: float) -> (float, float):
-    if abs(x_lon) > 180 or abs(y_lat) >= 90:
-        return None
 
-    num = x_lon * 0.017453292519943295
-    x_m = 6378137.0 * num
-    a = y_lat * 0.017453292519943295
-    y_m = 3189068.5 * math.log((1.0 + math.sin(a)) / (1.0 - math.sin(a)))
+def _geographic_to_mercator(lat: np.ndarray, lon: np.ndarray) -> (
+                            np.ndarray, np.ndarray):
+    a = np.radians(lat)
+    y_m = 3189068.5 * np.log((1.0 + np.sin(a)) / (1.0 - np.sin(a)))
+    x_m = 6378137.0 * np.radians(lon)
     return y_m, x_m
 
 
-def _session_track(start: int, end: int, t: np.array, track: dict) -> (
-                   dict[str, list[float]]):
-    session_indices = np.where(np.logical_and(t >= start, t <= end))
-    if len(session_indices[0]) == 0:
+def _local_name(tag: str) -> str:
+    # GPX 1.0 and 1.1 use different namespaces, elements are matched by
+    # their local name.
+    return tag.rpartition('}')[2]
+
+
+def _floats(values: list[str]) -> np.ndarray:
+    # Missing values become NaN, invalid ones make NumPy give up, and those
+    # are converted one by one.
+    try:
+        return np.array(values, dtype=np.float64)
+    except ValueError:
+        pass
+    floats = np.full(len(values), np.nan)
+    for i, v in enumerate(values):
+        try:
+            floats[i] = float(v)
+        except (TypeError, ValueError):
+            pass
+    return floats
+
+
+def _parse_time(text: str) -> float:
+    try:
+        time = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return np.nan
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=timezone.utc)  # GPX times are UTC
+    return time.timestamp()
+
+
+def _timestamps(times: list[str]) -> np.ndarray:
+    # Almost every GPX file uses UTC times with a Z suffix, those are parsed
+    # by NumPy at once. Anything else (offsets, missing times) is parsed one
+    # by one.
+    if all(t is not None and t.endswith('Z') for t in times):
+        try:
+            parsed = np.array([t[:-1] for t in times], dtype='datetime64[us]')
+            return parsed.astype(np.int64) / 1e6
+        except ValueError:
+            pass
+    return np.array([_parse_time(t) for t in times], dtype=np.float64)
+
+
+def _read_points(gpx_file) -> (list[str], list[str], list[str], list[str]):
+    lat, lon, ele, time = [], [], [], []
+    for _, elem in ElementTree.iterparse(gpx_file):
+        if _local_name(elem.tag) != 'trkpt':
+            continue
+        values = dict(ele=None, time=None)
+        for child in elem:
+            name = _local_name(child.tag)
+            if name in values and child.text:
+                values[name] = child.text.strip()
+        lat.append(elem.get('lat'))
+        lon.append(elem.get('lon'))
+        ele.append(values['ele'])
+        time.append(values['time'])
+        elem.clear()  # only the current point is kept in memory
+    return lat, lon, ele, time
+
+
+def _session_track(start: int, end: int, t: np.ndarray, track: dict) -> (
+                   dict[str, np.ndarray]):
+    # Track points are in time order, so the points within the session are
+    # located by binary search.
+    start_idx = int(np.searchsorted(t, start, side='left'))
+    end_idx = int(np.searchsorted(t, end, side='right'))
+    if start_idx >= end_idx:
         return None
 
-    start_idx = session_indices[0][0]
-    end_idx = session_indices[0][-1] + 1  # +1, so that the last is included
-
-    session_lon = np.array(track['lon'][start_idx:end_idx])
-    session_lat = np.array(track['lat'][start_idx:end_idx])
-    session_time = np.array(t[start_idx:end_idx]) - start
+    session_lon = track['lon'][start_idx:end_idx]
+    session_lat = track['lat'][start_idx:end_idx]
+    session_time = t[start_idx:end_idx] - start
     session_time[0] = 0
 
     x = np.arange(0, session_time[-1], 0.1)
     yi = np.array([session_lon, session_lat])
     y = pchip_interpolate(session_time, yi, x, axis=1)
 
-    return dict(lon=list(y[0, :]), lat=list(y[1, :]))
-
-
-def gpx_to_dict(gpx_data: str) -> dict[str, Any]:
-    gpx_dict = dict(lat=[], lon=[], ele=[], time=[])
-    gpx_file = io.BytesIO(gpx_data)
-    gpx = gpxpy.parse(gpx_file)
-    for track in gpx.tracks:
-        for segment in track.segments:
-            for point in segment.points:
-                lat, lon = _geographic_to_mercator(point.latitude,
-                                                   point.longitude)
-                gpx_dict['lat'].append(lat)
-                gpx_dict['lon'].append(lon)
-                gpx_dict['ele'].append(point.elevation)
-                gpx_dict['time'].append(point.time.timestamp())
-    return gpx_dict
+    return dict(lon=y[0, :], lat=y[1, :])
+
+
+def gpx_to_dict(gpx_data: bytes) -> dict[str, Any]:
+    """ Reads the track points of a GPX file into arrays, in time order,
+    along with the simplification tolerance of every point. Points with
+    missing or invalid coordinates or time are left out. Raises ValueError
+    if the file is not valid XML.
+    """
+
+    try:
+        lat, lon, ele, time = _read_points(io.BytesIO(gpx_data))
+    except ElementTree.ParseError as e:
+        raise ValueError(f"invalid GPX file: {e}") from e
+
+    lat, lon, ele = _floats(lat), _floats(lon), _floats(ele)
+    time = _timestamps(time)
+
+    valid = (np.isfinite(lat) & np.isfinite(lon) & np.isfinite(time) &
+             (np.abs(lat) < 90) & (np.abs(lon) <= 180))
+    # Points are kept in time order, as the session window is looked up by
+    # binary search on time.
+    p = np.flatnonzero(valid)
+    p = p[np.argsort(time[p], kind='stable')]
+    lat, lon = _geographic_to_mercator(lat[p], lon[p])
+    # Elevation is optional, missing values are NaN.
+    return dict(lat=lat, lon=lon, ele=ele[p], time=time[p],
+                tol=douglas_peucker_tolerances(lon, lat))
+
+
+def track_polyline(track: dict[str, np.ndarray], width: int,
+                   bounds: tuple = None) -> dict[str, np.ndarray]:
+    """ Track simplified to the detail level that fits a map of the given
+    width (in pixels) showing bounds (x_start, x_end, y_start, y_end, in
+    Web Mercator meters), or the whole track if bounds is None. Only the
+    parts of the track within bounds are returned. Tracks without
+    simplification tolerances (stored as JSON, not yet recompressed) are
+    not simplified.
+    """
+
+    lon, lat = track['lon'], track['lat']
+    tolerances = track.get('tol')
+    if tolerances is None:
+        tolerances = np.full(len(lon), np.inf)
+    if bounds is None:
+        extent = max(np.ptp(lon), np.ptp(lat)) if len(lon) else 0
+    else:
+        extent = max(bounds[1] - bounds[0], bounds[3] - bounds[2])
+    width = int(np.clip(width, 1, TRACK_MAX_WIDTH))
+    lon, lat = simplified(lon, lat, tolerances, extent / width, bounds)
+    return dict(lat=lat, lon=lon)
 
 
-def track_data(track: str, start_timestamp: int, end_timestamp: int) -> (
-               dict[str, Any], dict[str, list[float]]):
+def track_data(track: dict[str, np.ndarray], start_timestamp: int,
+               end_timestamp: int) -> (dict[str, np.ndarray],
+                                       dict[str, np.ndarray]):
     if not track:
         return None, None
 
-    if type(track) is str:
-        full_track = json.loads(track)
-    else:
-        full_track = dict(track)  # Copy, so that we leage the original intact.
-
-    # We don't yet use elevation data, so currently there is no need to include
-    # it in the datasource. It is just saved to the database for future use.
-    full_track.pop('ele', None)
-    # We also do not need to include time data in the datasource, but we need
-    # it for later calculations.
-    timestamps = np.array(full_track.pop('time', None))
-
+    # The full track is only shown as an overview, the frontend loads the
+    # details of the area it shows. The session track is not simplified,
+    # so that positions on it follow the travel graph.
+    full_track = track_polyline(track, TRACK_OVERVIEW_WIDTH)
     session_track = _session_track(start_timestamp,
                                    end_timestamp,
-                                   timestamps,
-                                   full_track)
+                                   track['time'],
+                                   track)
 
     return full_track, session_track
 
 
-def map_figure() -> (figure, CustomJS):
+def map_figure() -> figure:
     ds_track = ColumnDataSource(name='ds_track', data=dict(lat=[], lon=[]))
     ds_session = ColumnDataSource(name='ds_session', data=dict(lat=[], lon=[]))
 
@@ -144,6 +235,4 @@ def map_figure() -> (figure, CustomJS):
     p.js_on_change('inner_width', on_resize)
     p.js_on_change('inner_height', on_resize)
 
-    on_seek = CustomJS(args=dict(dss=ds_session, pos=pos_marker), code='')
-
-    return p, on_seek
+    return p
@@ -1,3 +1,6 @@
+import msgpack
+import numpy as np
+
 from dataclasses import dataclass, fields as datafields
 
 
@@ -35,19 +38,143 @@ class Stroke:
     Start: int
     End: int
     Stat: StrokeStat
-    DigitizedTravel: list[int]
-    DigitizedVelocity: list[int]
-    FineDigitizedVelocity: list[int]
+    DigitizedTravel: np.ndarray
+    DigitizedVelocity: np.ndarray
+    FineDigitizedVelocity: np.ndarray
+
+
+def _offsets(counts: np.ndarray) -> np.ndarray:
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def _flat_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    # Concatenation of arange(start, start + count) for every start/count pair
+    offsets = _offsets(counts)
+    return (np.repeat(starts - offsets[:-1], counts) +
+            np.arange(offsets[-1], dtype=np.int64))
+
+
+def _concatenate(arrays: list, dtype: type) -> np.ndarray:
+    if not arrays:
+        return np.empty(0, dtype=dtype)
+    return np.concatenate(arrays).astype(dtype, copy=False)
+
+
+@dataclass
+class StrokeTable:
+    """ Struct-of-arrays representation of a list of strokes. Row i of the
+    per-stroke columns describes the i-th stroke, its digitized samples are
+    DigitizedX[Offsets[i]:Offsets[i+1]].
+    """
+
+    Start: np.ndarray
+    End: np.ndarray
+    Count: np.ndarray
+    SumTravel: np.ndarray
+    MaxTravel: np.ndarray
+    SumVelocity: np.ndarray
+    MaxVelocity: np.ndarray
+    Bottomouts: np.ndarray
+    Offsets: np.ndarray
+    DigitizedTravel: np.ndarray
+    DigitizedVelocity: np.ndarray
+    FineDigitizedVelocity: np.ndarray
+
+    @classmethod
+    def from_strokes(cls, strokes: list[Stroke]) -> 'StrokeTable':
+        def column(field: str, dtype: type) -> np.ndarray:
+            return np.array([getattr(s.Stat, field) for s in strokes],
+                            dtype=dtype)
+
+        def digitized(field: str) -> np.ndarray:
+            return _concatenate([getattr(s, field) for s in strokes], np.int32)
+
+        return cls(
+            Start=np.array([s.Start for s in strokes], dtype=np.int32),
+            End=np.array([s.End for s in strokes], dtype=np.int32),
+            Count=column('Count', np.int32),
+            SumTravel=column('SumTravel', np.float64),
+            MaxTravel=column('MaxTravel', np.float64),
+            SumVelocity=column('SumVelocity', np.float64),
+            MaxVelocity=column('MaxVelocity', np.float64),
+            Bottomouts=column('Bottomouts', np.int32),
+            Offsets=_offsets([len(s.DigitizedTravel) for s in strokes]),
+            DigitizedTravel=digitized('DigitizedTravel'),
+            DigitizedVelocity=digitized('DigitizedVelocity'),
+            FineDigitizedVelocity=digitized('FineDigitizedVelocity'),
+        )
+
+    def __len__(self) -> int:
+        return len(self.Start)
+
+    def select(self, rows: np.ndarray) -> 'StrokeTable':
+        rows = np.flatnonzero(rows) if rows.dtype == bool else rows
+        lengths = np.diff(self.Offsets)[rows]
+        flat = _flat_ranges(self.Offsets[rows], lengths)
+        return StrokeTable(
+            Start=self.Start[rows],
+            End=self.End[rows],
+            Count=self.Count[rows],
+            SumTravel=self.SumTravel[rows],
+            MaxTravel=self.MaxTravel[rows],
+            SumVelocity=self.SumVelocity[rows],
+            MaxVelocity=self.MaxVelocity[rows],
+            Bottomouts=self.Bottomouts[rows],
+            Offsets=_offsets(lengths),
+            DigitizedTravel=self.DigitizedTravel[flat],
+            DigitizedVelocity=self.DigitizedVelocity[flat],
+            FineDigitizedVelocity=self.FineDigitizedVelocity[flat],
+        )
+
+    def slice(self, lo: int, hi: int) -> 'StrokeTable':
+        # Same as select(np.arange(lo, hi)), but returns views instead of
+        # copying the digitized data.
+        first, last = self.Offsets[lo], self.Offsets[hi]
+        return StrokeTable(
+            Start=self.Start[lo:hi],
+            End=self.End[lo:hi],
+            Count=self.Count[lo:hi],
+            SumTravel=self.SumTravel[lo:hi],
+            MaxTravel=self.MaxTravel[lo:hi],
+            SumVelocity=self.SumVelocity[lo:hi],
+            MaxVelocity=self.MaxVelocity[lo:hi],
+            Bottomouts=self.Bottomouts[lo:hi],
+            Offsets=self.Offsets[lo:hi+1] - first,
+            DigitizedTravel=self.DigitizedTravel[first:last],
+            DigitizedVelocity=self.DigitizedVelocity[first:last],
+            FineDigitizedVelocity=self.FineDigitizedVelocity[first:last],
+        )
+
+    def sample_indices(self) -> np.ndarray:
+        return _flat_ranges(self.Start.astype(np.int64),
+                            (self.End - self.Start + 1).astype(np.int64))
+
+    def sample_map(self, length: int) -> np.ndarray:
+        # Index of the stroke each sample belongs to, -1 outside of strokes.
+        m = np.full(length, -1, dtype=np.int32)
+        lengths = self.End - self.Start + 1
+        m[self.sample_indices()] = np.repeat(
+            np.arange(len(self), dtype=np.int32), lengths)
+        return m
+
+
+def _as_stroke_table(strokes) -> StrokeTable:
+    if isinstance(strokes, StrokeTable):
+        return strokes
+    return StrokeTable.from_strokes(
+        [_as_dataclass(Stroke, d) for d in strokes or []])
 
 
 @dataclass
 class Strokes:
-    Compressions: list[Stroke]
-    Rebounds: list[Stroke]
+    Compressions: StrokeTable
+    Rebounds: StrokeTable
 
     def __post_init__(self):
-        self.Compressions = [dataclass_from_dict(Stroke, d) for d in self.Compressions]
-        self.Rebounds = [dataclass_from_dict(Stroke, d) for d in self.Rebounds]
+        self.Compressions = _as_stroke_table(self.Compressions)
+        self.Rebounds = _as_stroke_table(self.Rebounds)
 
 
 @dataclass
@@ -60,12 +187,12 @@ class Airtime:
 class Suspension:
     Present: bool
     Calibration: Calibration
-    Travel: list[float]
-    Velocity: list[float]
+    Travel: np.ndarray
+    Velocity: np.ndarray
     Strokes: Strokes
-    TravelBins: list[float]
-    VelocityBins: list[float]
-    FineVelocityBins: list[float]
+    TravelBins: np.ndarray
+    VelocityBins: np.ndarray
+    FineVelocityBins: np.ndarray
 
 
 @dataclass
@@ -80,7 +207,7 @@ class Telemetry:
     Airtimes: list[Airtime]
 
     def __post_init__(self):
-        self.Airtimes = [dataclass_from_dict(Airtime, d) for d in self.Airtimes]
+        self.Airtimes = [_as_dataclass(Airtime, d) for d in self.Airtimes]
 
 
 def _dataclass_from_dict(klass: type, d: dict):
@@ -96,3 +223,469 @@ def _dataclass_from_dict(klass: type, d: dict):
 def dataclass_from_dict(klass: type, d: dict):
     o = _dataclass_from_dict(klass, d)
     return o if type(o) == klass else None
+
+
+def _as_dataclass(klass: type, d):
+    return d if isinstance(d, klass) else dataclass_from_dict(klass, d)
+
+
+_NIL = 0xc0
+_FLOAT64 = 0xcb
+_BIN_AND_EXT = {0xc4, 0xc5, 0xc6, 0xc7, 0xc8, 0xc9,
+                0xd4, 0xd5, 0xd6, 0xd7, 0xd8}
+
+
+class _ColumnarReader:
+    """ Decodes PSST data into a Telemetry instance with NumPy-backed sample
+    arrays. Sample arrays are never materialized as Python lists: float64
+    arrays (as written by gosst) are viewed in place with a strided
+    np.frombuffer, bin/ext payloads are interpreted as little-endian typed
+    buffers, and small integer arrays are read as raw fixint bytes.
+    """
+
+    def __init__(self, data: bytes):
+        self._data = data
+        self._bytes = np.frombuffer(data, dtype=np.uint8)
+        self._unpacker = msgpack.Unpacker(max_buffer_size=len(data))
+        self._unpacker.feed(data)
+
+    def _array_header(self, offset: int) -> (int, int):
+        marker = self._data[offset]
+        if 0x90 <= marker <= 0x9f:
+            return marker & 0x0f, 1
+        if marker == 0xdc:
+            return int.from_bytes(self._data[offset+1:offset+3], 'big'), 3
+        if marker == 0xdd:
+            return int.from_bytes(self._data[offset+1:offset+5], 'big'), 5
+        return None, 0
+
+    def _skip(self, length: int):
+        while length > 0:
+            chunk = self._unpacker.read_bytes(min(length, 1 << 20))
+            length -= len(chunk)
+
+    def _special_array(self, dtype: type) -> np.ndarray:
+        marker = self._data[self._unpacker.tell()]
+        if marker == _NIL:
+            self._unpacker.skip()
+            return np.empty(0, dtype=dtype)
+        if marker in _BIN_AND_EXT:
+            value = self._unpacker.unpack()
+            raw = value.data if isinstance(value, msgpack.ExtType) else value
+            return np.frombuffer(raw, dtype=np.dtype(dtype).newbyteorder('<'))
+        return None
+
+    def _floats(self) -> np.ndarray:
+        values = self._special_array(np.float64)
+        if values is not None:
+            return values
+
+        offset = self._unpacker.tell()
+        count, header_length = self._array_header(offset)
+        start = offset + header_length
+        if count and start + 9 * count <= len(self._data):
+            markers = self._bytes[start:start + 9 * count:9]
+            if np.all(markers == _FLOAT64):
+                self._skip(header_length + 9 * count)
+                values = np.ndarray(count, dtype='>f8', buffer=self._data,
+                                    offset=start + 1, strides=(9,))
+                return values.astype(np.float64)
+
+        return np.array(self._unpacker.unpack(), dtype=np.float64)
+
+    def _ints(self) -> np.ndarray:
+        values = self._special_array(np.int32)
+        if values is not None:
+            return values
+
+        offset = self._unpacker.tell()
+        count, header_length = self._array_header(offset)
+        start = offset + header_length
+        raw = self._data[start:start + count] if count else b''
+        if len(raw) == count and raw.isascii():  # only positive fixints
+            self._skip(header_length + count)
+            return np.frombuffer(raw, dtype=np.uint8).astype(np.int32)
+
+        return np.array(self._unpacker.unpack(), dtype=np.int32)
+
+    def _map(self, readers: dict) -> dict:
+        d = {}
+        for _ in range(self._unpacker.read_map_header()):
+            key = self._unpacker.unpack()
+            reader = readers.get(key)
+            d[key] = reader() if reader else self._unpacker.unpack()
+        return d
+
+    def _stroke(self) -> Stroke:
+        d = self._map(dict(
+            DigitizedTravel=self._ints,
+            DigitizedVelocity=self._ints,
+            FineDigitizedVelocity=self._ints,
+        ))
+        d['Stat'] = StrokeStat(**d['Stat'])
+        return Stroke(**d)
+
+    def _strokes(self) -> StrokeTable:
+        if self._data[self._unpacker.tell()] == _NIL:
+            self._unpacker.skip()
+            return StrokeTable.from_strokes([])
+        count = self._unpacker.read_array_header()
+        return StrokeTable.from_strokes([self._stroke() for _ in range(count)])
+
+    def _suspension(self) -> Suspension:
+        d = self._map(dict(
+            Travel=self._floats,
+            Velocity=self._floats,
+            TravelBins=self._floats,
+            VelocityBins=self._floats,
+            FineVelocityBins=self._floats,
+            Strokes=lambda: Strokes(**self._map(dict(
+                Compressions=self._strokes,
+                Rebounds=self._strokes,
+            ))),
+        ))
+        d['Calibration'] = Calibration(**d['Calibration'])
+        return Suspension(**d)
+
+    def telemetry(self) -> Telemetry:
+        d = self._map(dict(
+            Front=self._suspension,
+            Rear=self._suspension,
+        ))
+        d['Linkage'] = Linkage(**d['Linkage'])
+        d['Airtimes'] = d['Airtimes'] or []
+        return Telemetry(**d)
+
+
+def telemetry_from_psst(data: bytes) -> Telemetry:
+    return _ColumnarReader(data).telemetry()
+
+
+_FIXED_SIZES = {
+    0xc0: 1, 0xc2: 1, 0xc3: 1,  # nil, false, true
+    0xca: 5, 0xcb: 9,  # float 32, 64
+    0xcc: 2, 0xcd: 3, 0xce: 5, 0xcf: 9,  # uint 8, 16, 32, 64
+    0xd0: 2, 0xd1: 3, 0xd2: 5, 0xd3: 9,  # int 8, 16, 32, 64
+    0xd4: 3, 0xd5: 4, 0xd6: 6, 0xd7: 10, 0xd8: 18,  # fixext 1 - 16
+}
+# Size of the length field, and the bytes between it and the payload.
+_SIZED = {
+    0xc4: (1, 0), 0xc5: (2, 0), 0xc6: (4, 0),  # bin 8, 16, 32
+    0xc7: (1, 1), 0xc8: (2, 1), 0xc9: (4, 1),  # ext 8, 16, 32
+    0xd9: (1, 0), 0xda: (2, 0), 0xdb: (4, 0),  # str 8, 16, 32
+}
+# Size of the length field, and the number of values per element.
+_CONTAINERS = {
+    0xdc: (2, 1), 0xdd: (4, 1),  # array 16, 32
+    0xde: (2, 2), 0xdf: (4, 2),  # map 16, 32
+}
+
+
+def _is_array(marker: int) -> bool:
+    return 0x90 <= marker <= 0x9f or marker in (0xdc, 0xdd)
+
+
+def _is_map(marker: int) -> bool:
+    return 0x80 <= marker <= 0x8f or marker in (0xde, 0xdf)
+
+
+class _MsgpackWalker:
+    """ Walks msgpack data read from a sequence of chunks without decoding
+    it. Values are skipped by their length headers, arrays of fixed size
+    scalars (float64 samples, fixint digitized values) in one step, so
+    only the values that are actually read are unpacked, and chunks are
+    only consumed as far as the walk goes.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._data = bytearray()
+        self.pos = 0
+
+    def _load(self, end: int) -> bool:
+        while len(self._data) < end:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return False
+            self._data += chunk
+        return True
+
+    def _need(self, end: int):
+        if not self._load(end):
+            raise ValueError("truncated msgpack data")
+
+    def discard(self):
+        # Drops the data that has already been walked.
+        del self._data[:self.pos]
+        self.pos = 0
+
+    def at_end(self) -> bool:
+        return not self._load(self.pos + 1)
+
+    def _uint(self, size: int) -> int:
+        self._need(self.pos + size)
+        value = int.from_bytes(self._data[self.pos:self.pos+size], 'big')
+        self.pos += size
+        return value
+
+    def header(self) -> (int, int, int):
+        # Reads the header of the next value, and returns its marker, the
+        # number of values it contains and the size of its payload.
+        self._need(self.pos + 1)
+        marker = self._data[self.pos]
+        self.pos += 1
+        if marker <= 0x7f or marker >= 0xe0:  # fixint
+            return marker, 0, 0
+        if marker <= 0x8f:  # fixmap
+            return marker, 2 * (marker & 0x0f), 0
+        if marker <= 0x9f:  # fixarray
+            return marker, marker & 0x0f, 0
+        if marker <= 0xbf:  # fixstr
+            return marker, 0, marker & 0x1f
+        if marker in _FIXED_SIZES:
+            return marker, 0, _FIXED_SIZES[marker] - 1
+        if marker in _SIZED:
+            size, extra = _SIZED[marker]
+            return marker, 0, self._uint(size) + extra
+        if marker in _CONTAINERS:
+            size, values = _CONTAINERS[marker]
+            return marker, values * self._uint(size), 0
+        raise ValueError(f"invalid msgpack marker: {marker:#x}")
+
+    def _skip_uniform(self, count: int) -> bool:
+        # Skips the elements of an array at once, if all of them have the
+        # same fixed size marker.
+        if count == 0:
+            return True
+        self._need(self.pos + 1)
+        marker = self._data[self.pos]
+        if marker <= 0x7f or marker >= 0xe0:
+            size = 1
+        else:
+            size = _FIXED_SIZES.get(marker)
+        if size is None:
+            return False
+        end = self.pos + size * count
+        self._need(end)
+        markers = self._data[self.pos:end:size]
+        if (markers != bytes((marker,)) * count and
+                not (marker <= 0x7f and markers.isascii())):
+            return False
+        self.pos = end
+        return True
+
+    def _skip_nested(self):
+        # Arrays of maps (strokes) are skipped by msgpack itself, which is
+        # much faster than walking them here. The data is loaded until the
+        # array fits.
+        while True:
+            unpacker = msgpack.Unpacker(
+                max_buffer_size=len(self._data) - self.pos)
+            unpacker.feed(self._data[self.pos:])
+            try:
+                unpacker.skip()
+            except msgpack.OutOfData:
+                size = len(self._data)
+                self._load(2 * size)
+                if len(self._data) == size:
+                    raise ValueError("truncated msgpack data")
+                continue
+            self.pos += unpacker.tell()
+            return
+
+    def skip(self, count: int = 1):
+        while count:
+            count -= 1
+            start = self.pos
+            marker, values, payload = self.header()
+            if values and _is_array(marker):
+                if self._skip_uniform(values):
+                    continue
+                first = self._data[self.pos]
+                if _is_map(first) or _is_array(first):
+                    self.pos = start
+                    self._skip_nested()
+                    continue
+            self.pos += payload
+            count += values
+
+    def read(self):
+        start = self.pos
+        self.skip()
+        self._need(self.pos)
+        return msgpack.unpackb(bytes(self._data[start:self.pos]))
+
+    def map_size(self) -> int:
+        marker, values, _ = self.header()
+        if marker == _NIL:
+            return 0
+        if not _is_map(marker):
+            raise ValueError("msgpack map expected")
+        return values // 2
+
+    def array_size(self) -> (int, callable):
+        # Length of an array (or of a little-endian float64 buffer) without
+        # reading its elements, and a function that skips them.
+        marker, values, payload = self.header()
+        if _is_array(marker):
+            def skip():
+                if not self._skip_uniform(values):
+                    self.skip(values)
+            return values, skip
+
+        size = payload
+
+        def skip():
+            self.pos += size
+        if marker in _BIN_AND_EXT:
+            if marker >= 0xc7:
+                payload -= 1  # ext type
+            return payload // 8, skip
+        if marker == _NIL:
+            return 0, skip
+        raise ValueError("msgpack array expected")
+
+
+@dataclass
+class SuspensionHeader:
+    Present: bool
+    Samples: int
+
+
+class TelemetryHeader:
+    """ Header fields of PSST data, and the number of samples per
+    suspension, read without decoding the samples. Fields are read when
+    they are first accessed, and the data is only walked as far as they
+    are, so the timestamp or the number of records (which is known from
+    the length of the front travel array) only need the first few hundred
+    bytes.
+    """
+
+    def __init__(self, chunks):
+        self._walker = _MsgpackWalker(chunks)
+        self._fields = {}
+        self._resume = []
+        self._skip = 0  # values left in the last suspension read
+        try:
+            self._remaining = self._walker.map_size()
+        except (ValueError, TypeError) as e:
+            raise ValueError("invalid PSST data") from e
+
+    def _suspension(self) -> SuspensionHeader:
+        walker = self._walker
+        remaining = walker.map_size()
+        present, samples = False, 0
+        found, resume = set(), []
+        while remaining and not {'Present', 'Travel'} <= found:
+            for r in resume:
+                r()
+            resume = []
+            key = walker.read()
+            remaining -= 1
+            found.add(key)
+            if key == 'Present':
+                present = bool(walker.read())
+            elif key == 'Travel':
+                samples, skip = walker.array_size()
+                resume.append(skip)
+            else:
+                walker.skip()
+        # The rest of the suspension is skipped only if a later field is
+        # accessed.
+        self._resume = resume
+        self._skip = 2 * remaining
+        return SuspensionHeader(Present=present, Samples=samples)
+
+    def _field(self, name: str):
+        try:
+            while name not in self._fields and self._remaining:
+                for resume in self._resume:
+                    resume()
+                self._resume = []
+                self._walker.skip(self._skip)
+                self._skip = 0
+                key = self._walker.read()
+                self._remaining -= 1
+                if key in ('Front', 'Rear'):
+                    self._fields[key] = self._suspension()
+                else:
+                    self._fields[key] = self._walker.read()
+        except (ValueError, TypeError) as e:
+            raise ValueError("invalid PSST data") from e
+        return self._fields.get(name)
+
+    def walk(self):
+        """ Walks the rest of the data, and yields after every value, so
+        that the chunks can be passed on while they are walked. Walked data
+        is not kept. Raises ValueError if the data does not end exactly at
+        the end of the PSST map.
+        """
+
+        walker = self._walker
+        try:
+            while True:
+                for resume in self._resume:
+                    resume()
+                self._resume = []
+                while self._skip:
+                    walker.skip()
+                    self._skip -= 1
+                    walker.discard()
+                    yield
+                if not self._remaining:
+                    break
+                key = walker.read()
+                self._remaining -= 1
+                if key in ('Front', 'Rear'):
+                    self._fields[key] = self._suspension()
+                else:
+                    self._fields[key] = walker.read()
+                walker.discard()
+                yield
+            if not walker.at_end():
+                raise ValueError("data after the end of PSST data")
+        except (ValueError, TypeError) as e:
+            raise ValueError("invalid PSST data") from e
+
+    @property
+    def Name(self) -> str:
+        return self._field('Name')
+
+    @property
+    def Version(self) -> int:
+        return self._field('Version')
+
+    @property
+    def SampleRate(self) -> int:
+        return self._field('SampleRate')
+
+    @property
+    def Timestamp(self) -> int:
+        return self._field('Timestamp')
+
+    @property
+    def Front(self) -> SuspensionHeader:
+        return self._field('Front') or SuspensionHeader(False, 0)
+
+    @property
+    def Rear(self) -> SuspensionHeader:
+        return self._field('Rear') or SuspensionHeader(False, 0)
+
+    @property
+    def record_num(self) -> int:
+        front = self.Front
+        return front.Samples if front.Present else self.Rear.Samples
+
+    @property
+    def elapsed_time(self) -> float:
+        return self.record_num / self.SampleRate
+
+
+def header_from_psst(data) -> TelemetryHeader:
+    """ Reads the header of PSST data given as bytes, or as an iterable of
+    consecutive chunks (e.g. decompressed on the fly).
+    """
+
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = (data,)
+    return TelemetryHeader(data)
@@ -1,22 +1,25 @@
-import msgpack
+import json
+
 import numpy as np
 
-from bokeh.document import Document
-from bokeh.events import DocumentReady
-from bokeh.embed import components
+from bokeh.embed import json_item
 from bokeh.layouts import row
 from bokeh.models.callbacks import CustomJS
 from bokeh.palettes import Spectral11
 from bokeh.themes import built_in_themes, DARK_MINIMAL
+from flask import current_app
 
 from app.extensions import db
-from app.models.session import Session
-from app.models.session_html import SessionHtml
+from app.models.session import session_telemetry
+from app.models.session_figure import SessionFigure
+from app.models.session_summary import SessionSummary
 from app.telemetry.balance import balance_figure
 from app.telemetry.fft import fft_figure
+from app.telemetry.index import suspension_index
 from app.telemetry.leverage import leverage_ratio_figure, shock_wheel_figure
+from app.telemetry.lod import LOD_INITIAL_WIDTH, sample_pyramid
 from app.telemetry.map import map_figure
-from app.telemetry.psst import Telemetry, dataclass_from_dict
+from app.telemetry.summary import session_summary
 from app.telemetry.travel import travel_figure, travel_histogram_figure
 from app.telemetry.velocity import velocity_figure
 from app.telemetry.velocity import (
@@ -25,28 +28,25 @@ from app.telemetry.velocity import (
 )
 
 
-def create_cache(session_id: int, lod: int, hst: int):
+def create_cache(session_id: int, hst: int):
     front_color, rear_color = Spectral11[1], Spectral11[2]
 
-    session = db.session.execute(
-        db.select(Session).filter_by(id=session_id)).scalar_one_or_none()
-    if not session:
+    telemetry = session_telemetry(session_id)
+    if telemetry is None:
         return None
-
-    d = msgpack.unpackb(session.data)
-    telemetry = dataclass_from_dict(Telemetry, d)
+    max_points = current_app.config['BALANCE_MAX_POINTS']
 
     tick = 1.0 / telemetry.SampleRate  # time step length in seconds
 
     if telemetry.Front.Present:
+        front_strokes = suspension_index(telemetry.Front).select()
         p_front_travel_hist = travel_histogram_figure(
-            telemetry.Front.Strokes,
+            front_strokes,
             telemetry.Front.TravelBins,
             front_color,
             "Travel histogram (front)")
         p_front_vel_hist, p_front_vel_hist_ls = velocity_histogram_figure(
-            telemetry.Front.Strokes,
-            telemetry.Front.Velocity,
+            front_strokes,
             telemetry.Front.TravelBins,
             telemetry.Front.VelocityBins,
             telemetry.Front.FineVelocityBins,
@@ -54,8 +54,7 @@ def create_cache(session_id: int, lod: int, hst: int):
             "Speed histogram (front)",
             "Low-speed (front)")
         p_front_vel_stats = velocity_band_stats_figure(
-            telemetry.Front.Strokes,
-            telemetry.Front.Velocity,
+            front_strokes,
             hst)
         p_front_fft = fft_figure(
             telemetry.Front.Travel,
@@ -64,14 +63,14 @@ def create_cache(session_id: int, lod: int, hst: int):
             "Frequencies (front)")
 
     if telemetry.Rear.Present:
+        rear_strokes = suspension_index(telemetry.Rear).select()
         p_rear_travel_hist = travel_histogram_figure(
-            telemetry.Rear.Strokes,
+            rear_strokes,
             telemetry.Rear.TravelBins,
             rear_color,
             "Travel histogram (rear)")
         p_rear_vel_hist, p_rear_vel_hist_ls = velocity_histogram_figure(
-            telemetry.Rear.Strokes,
-            telemetry.Rear.Velocity,
+            rear_strokes,
             telemetry.Rear.TravelBins,
             telemetry.Rear.VelocityBins,
             telemetry.Rear.FineVelocityBins,
@@ -79,8 +78,7 @@ def create_cache(session_id: int, lod: int, hst: int):
             "Speed histogram (rear)",
             "Low-speed (rear)")
         p_rear_vel_stats = velocity_band_stats_figure(
-            telemetry.Rear.Strokes,
-            telemetry.Rear.Velocity,
+            rear_strokes,
             hst)
         p_rear_fft = fft_figure(
             telemetry.Rear.Travel,
@@ -88,12 +86,11 @@ def create_cache(session_id: int, lod: int, hst: int):
             rear_color,
             "Frequencies (rear)")
 
-    p_travel = travel_figure(telemetry, lod, front_color, rear_color)
-    p_velocity = velocity_figure(telemetry, lod, front_color, rear_color)
-    p_travel.x_range.js_link('start', p_velocity.x_range, 'start')
-    p_travel.x_range.js_link('end', p_velocity.x_range, 'end')
-    p_velocity.x_range.js_link('start', p_travel.x_range, 'start')
-    p_velocity.x_range.js_link('end', p_travel.x_range, 'end')
+    samples = sample_pyramid(telemetry).window(None, None, LOD_INITIAL_WIDTH)
+    p_travel = travel_figure(telemetry, samples['travel'], front_color,
+                             rear_color)
+    p_velocity = velocity_figure(telemetry, samples['velocity'], front_color,
+                                 rear_color)
 
     '''
     Leverage-related graphs. These are input data, not something measured.
@@ -109,49 +106,38 @@ def create_cache(session_id: int, lod: int, hst: int):
     '''
     if telemetry.Front.Present and telemetry.Rear.Present:
         p_balance_compression = balance_figure(
-            telemetry.Front.Strokes.Compressions,
-            telemetry.Rear.Strokes.Compressions,
+            front_strokes,
+            rear_strokes,
             telemetry.Linkage.MaxFrontTravel,
             telemetry.Linkage.MaxRearTravel,
             False,
             front_color,
             rear_color,
             'balance_compression',
-            "Compression velocity balance")
+            "Compression velocity balance",
+            max_points)
         p_balance_rebound = balance_figure(
-            telemetry.Front.Strokes.Rebounds,
-            telemetry.Rear.Strokes.Rebounds,
+            front_strokes,
+            rear_strokes,
             telemetry.Linkage.MaxFrontTravel,
             telemetry.Linkage.MaxRearTravel,
             True,
             front_color,
             rear_color,
             'balance_rebound',
-            "Rebound velocity balance")
-
-    on_seek_code = '''
-        if (isNaN(cb_obj.location)) {
-            return
-        }
-        if (dss.data['lat'].length != 0) {
-            let idx = Math.floor(cb_obj.location * 10);
-            if (idx < 0) {
-                idx = 0;
-            } else if (idx >= dss.data['lon'].length) {
-                idx = dss.data['lon'].length - 1;
-            }
-            let lon = dss.data['lon'][idx];
-            let lat = dss.data['lat'][idx];
-            pos.x = lon;
-            pos.y = lat;
-        }
-        SST.seekVideo(cb_obj.location)'''
-    p_map, on_seek = map_figure()
-    on_seek.code = on_seek_code
-    p_travel.toolbar.active_inspect.overlay.js_on_change('location', on_seek)
+            "Rebound velocity balance",
+            max_points)
+
+    p_map = map_figure()
+    # The map is a separate item, so the position marker is looked up by the
+    # frontend instead of being linked here.
+    p_travel.toolbar.active_inspect.overlay.js_on_change('location', CustomJS(
+        code='SST.seek(cb_obj.location);'))
 
     '''
-    Construct the layout.
+    Every figure is stored as an independent JSON item, so that the frontend
+    can fetch and embed them one section at a time. Ranges of the travel and
+    velocity figures are linked by the frontend too.
     '''
     suspension_count = 0
     if telemetry.Front.Present:
@@ -159,59 +145,45 @@ def create_cache(session_id: int, lod: int, hst: int):
     if telemetry.Rear.Present:
         suspension_count += 1
 
-    dark_minimal_theme = built_in_themes[DARK_MINIMAL]
-    document = Document()
-
-    document.add_root(p_travel)
-    document.add_root(p_velocity)
-    document.add_root(p_map)
-    document.add_root(p_lr)
-    document.add_root(p_sw)
-    columns = ['session_id', 'script', 'travel', 'velocity', 'map', 'lr', 'sw']
-
+    figures = dict(travel=p_travel, velocity=p_velocity, map=p_map, lr=p_lr,
+                   sw=p_sw)
     if telemetry.Front.Present:
         prefix = 'front_' if suspension_count == 2 else ''
         p_front_travel_hist.name = f'{prefix}travel_hist'
         p_front_fft.name = f'{prefix}fft'
-        p_front_velocity = row(
+        figures['f_thist'] = p_front_travel_hist
+        figures['f_fft'] = p_front_fft
+        figures['f_vhist'] = row(
             name=f'{prefix}velocity_hist',
             sizing_mode='stretch_width',
             children=[
                 p_front_vel_hist,
                 p_front_vel_hist_ls,
                 p_front_vel_stats])
-        document.add_root(p_front_travel_hist)
-        document.add_root(p_front_fft)
-        document.add_root(p_front_velocity)
-        columns.extend(['f_thist', 'f_fft', 'f_vhist'])
     if telemetry.Rear.Present:
         prefix = 'rear_' if suspension_count == 2 else ''
         p_rear_travel_hist.name = f'{prefix}travel_hist'
         p_rear_fft.name = f'{prefix}fft'
-        p_rear_velocity = row(
+        figures['r_thist'] = p_rear_travel_hist
+        figures['r_fft'] = p_rear_fft
+        figures['r_vhist'] = row(
             name=f'{prefix}velocity_hist',
             sizing_mode='stretch_width',
             children=[
                 p_rear_vel_hist,
                 p_rear_vel_hist_ls,
                 p_rear_vel_stats])
-        document.add_root(p_rear_travel_hist)
-        document.add_root(p_rear_fft)
-        document.add_root(p_rear_velocity)
-        columns.extend(['r_thist', 'r_fft', 'r_vhist'])
     if suspension_count == 2:
-        document.add_root(p_balance_compression)
-        document.add_root(p_balance_rebound)
-        columns.extend(['cbalance', 'rbalance'])
-
-    # Some Bokeh models (like the map) need to be dynamically initialized based
-    # on values in a particular Flask session.
-    document.js_on_event(DocumentReady, CustomJS(
-        args=dict(), code='SST.init_models();'))
+        figures['cbalance'] = p_balance_compression
+        figures['rbalance'] = p_balance_rebound
 
-    script, divs = components(document.roots, theme=dark_minimal_theme)
-    components_data = dict(zip(columns, [session_id, script] + list(divs)))
-    session_html = dataclass_from_dict(SessionHtml, components_data)
-
-    db.session.add(session_html)
+    dark_minimal_theme = built_in_themes[DARK_MINIMAL]
+    db.session.execute(
+        db.delete(SessionFigure).filter_by(session_id=session_id))
+    for name, p in figures.items():
+        item = json_item(p, theme=dark_minimal_theme)
+        db.session.add(SessionFigure(session_id=session_id, name=name,
+                                     item=json.dumps(item)))
+    db.session.merge(SessionSummary(session_id=session_id,
+                                    **session_summary(telemetry)))
     db.session.commit()
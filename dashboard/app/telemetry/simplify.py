@@ -0,0 +1,95 @@
+import numpy as np
+
+
+def douglas_peucker_tolerances(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """ Runs the Douglas-Peucker algorithm for every tolerance at the same
+    time. Returns, for every vertex, the largest tolerance at which the
+    vertex is still kept. The polyline simplified with tolerance e is the
+    vertices whose value is at least e, and simplification levels are
+    nested: a vertex kept at some tolerance is kept at all smaller ones.
+    """
+
+    n = len(x)
+    tolerances = np.zeros(n)
+    if n == 0:
+        return tolerances
+    tolerances[0] = tolerances[-1] = np.inf
+
+    # Every pass splits all segments that still have interior points at
+    # their farthest one, so the number of passes is the depth of the
+    # recursion, and a pass is a few operations on the remaining points.
+    kept = np.zeros(n, dtype=bool)
+    kept[[0, -1]] = True
+    # Distances below the rounding error of the coordinates are 0.
+    noise = 4 * np.finfo(np.float64).eps * (
+        np.abs(x).max() + np.abs(y).max())
+    while True:
+        vertices = np.flatnonzero(kept)
+        points = np.flatnonzero(~kept)
+        if len(points) == 0:
+            return tolerances
+        segment = np.searchsorted(vertices, points) - 1
+        lo, hi = vertices[segment], vertices[segment + 1]
+        px, py = x[points] - x[lo], y[points] - y[lo]
+        dx, dy = x[hi] - x[lo], y[hi] - y[lo]
+        norm = np.hypot(dx, dy)
+        d = np.where(norm > 0,
+                     np.abs(dy * px - dx * py) / np.where(norm > 0, norm, 1),
+                     np.hypot(px, py))
+
+        # Points of a segment are consecutive, the first of every segment
+        # starts a reduceat group.
+        starts = np.diff(segment, prepend=-1) != 0
+        farthest = np.maximum.reduceat(d, np.flatnonzero(starts))
+        group = np.cumsum(starts) - 1
+
+        # Splitting a segment whose points are all on it (a stationary fix,
+        # a straight line) would remove one point per pass, all of them get
+        # tolerance 0 at once instead.
+        flat = farthest[group] <= noise
+        kept[points[flat]] = True
+
+        # The middle one of the farthest points of every other segment, so
+        # that ties do not make the passes remove one point each either.
+        split = np.flatnonzero((d == farthest[group]) & ~flat)
+        first = np.flatnonzero(np.diff(group[split], prepend=-1) != 0)
+        ties = np.diff(first, append=len(split))
+        split = split[first + ties // 2]
+
+        # A vertex can not outlive the segment it splits, this is what makes
+        # the levels nested.
+        cap = np.minimum(tolerances[lo[split]], tolerances[hi[split]])
+        tolerances[points[split]] = np.minimum(d[split], cap)
+        kept[points[split]] = True
+
+
+def simplified(x: np.ndarray, y: np.ndarray, tolerances: np.ndarray,
+               tolerance: float, bounds: tuple = None) -> (
+               np.ndarray, np.ndarray):
+    """ Vertices of the polyline simplified with the given tolerance. If
+    bounds (x_start, x_end, y_start, y_end) are given, only the segments
+    that overlap them are returned, and gaps between those are marked with
+    NaN, which breaks the line when it is drawn.
+    """
+
+    keep = np.flatnonzero(tolerances >= tolerance)
+    x, y = x[keep], y[keep]
+    if bounds is None or len(keep) < 2:
+        return x, y
+
+    x_start, x_end, y_start, y_end = bounds
+    visible = ((np.minimum(x[:-1], x[1:]) <= x_end) &
+               (np.maximum(x[:-1], x[1:]) >= x_start) &
+               (np.minimum(y[:-1], y[1:]) <= y_end) &
+               (np.maximum(y[:-1], y[1:]) >= y_start))
+    vertices = np.zeros(len(x), dtype=bool)
+    vertices[:-1] |= visible
+    vertices[1:] |= visible
+    idx = np.flatnonzero(vertices)
+    if len(idx) == 0:
+        return x[:0], y[:0]
+
+    gaps = np.flatnonzero(np.diff(idx) > 1) + 1
+    x = np.insert(x[idx], gaps, np.nan)
+    y = np.insert(y[idx], gaps, np.nan)
+    return x, y
@@ -0,0 +1,46 @@
+from app.telemetry.index import suspension_index
+from app.telemetry.psst import Suspension, Telemetry
+from app.telemetry.velocity import HIGH_SPEED_THRESHOLD
+
+
+def _suspension_summary(suspension: Suspension, prefix: str) -> dict:
+    if not suspension.Present:
+        return {}
+    strokes = suspension_index(suspension).select()
+    c, r = strokes.compression_stats, strokes.rebound_stats
+    count = c.Count + r.Count
+    hsr, lsr, lsc, hsc = strokes.velocity_bands(HIGH_SPEED_THRESHOLD)
+    total = hsr + lsr + lsc + hsc
+
+    def percent(n: int) -> float:
+        return n / total * 100.0 if total else 0.0
+
+    return {
+        f'{prefix}_travel_avg': ((c.SumTravel + r.SumTravel) / count
+                                 if count else 0.0),
+        f'{prefix}_travel_max': max(c.MaxTravel, r.MaxTravel),
+        f'{prefix}_bottomouts': c.Bottomouts + r.Bottomouts,
+        f'{prefix}_hsc': percent(hsc),
+        f'{prefix}_lsc': percent(lsc),
+        f'{prefix}_lsr': percent(lsr),
+        f'{prefix}_hsr': percent(hsr),
+    }
+
+
+def session_summary(telemetry: Telemetry) -> dict:
+    """ Statistics of a whole session, as stored in the session_summary
+    table. Travel is in mm, velocity zones are in percent of the stroke
+    samples (with the default high speed threshold), times are in seconds.
+    Values of suspensions that are not present are left out.
+    """
+
+    sample_count = len(telemetry.Front.Travel if telemetry.Front.Present
+                       else telemetry.Rear.Travel)
+    return dict(
+        duration=sample_count / telemetry.SampleRate,
+        sample_count=sample_count,
+        airtime_count=len(telemetry.Airtimes),
+        airtime_total=float(sum(a.End - a.Start for a in telemetry.Airtimes)),
+        **_suspension_summary(telemetry.Front, 'front'),
+        **_suspension_summary(telemetry.Rear, 'rear'),
+    )
@@ -1,6 +1,6 @@
 import numpy as np
 
-from bokeh.events import DoubleTap, SelectionGeometry
+from bokeh.events import DoubleTap, RangesUpdate, SelectionGeometry
 from bokeh.models import ColumnDataSource
 from bokeh.models.annotations import BoxAnnotation, Label, Span
 from bokeh.models.axes import LinearAxis
@@ -10,29 +10,22 @@ from bokeh.models.tools import BoxSelectTool, CrosshairTool, WheelZoomTool
 from bokeh.palettes import Spectral11
 from bokeh.plotting import figure
 
-from app.telemetry.psst import Airtime, Strokes, Telemetry
+from app.telemetry.index import StrokeSelection
+from app.telemetry.psst import Airtime, Telemetry
 
 
 HISTOGRAM_RANGE_MULTIPLIER = 1.3
 
 
-def travel_figure(telemetry: Telemetry, lod: int,
+def travel_figure(telemetry: Telemetry, data: dict[str, np.array],
                   front_color: tuple[str], rear_color: tuple[str]) -> figure:
     length = len(telemetry.Front.Travel if telemetry.Front.Present else
                  telemetry.Rear.Travel)
-    time = np.around(np.arange(0, length, lod) / telemetry.SampleRate, 4)
+    duration = round((length - 1) / telemetry.SampleRate, 4)
     front_max = telemetry.Linkage.MaxFrontTravel
     rear_max = telemetry.Linkage.MaxRearTravel
 
-    if telemetry.Front.Present:
-        tf_lod = np.around(telemetry.Front.Travel[::lod], 4)
-    else:
-        tf_lod = np.full(length, 0)[::lod]
-    if telemetry.Rear.Present:
-        tr_lod = np.around(telemetry.Rear.Travel[::lod], 4)
-    else:
-        tr_lod = np.full(length, 0)[::lod]
-    source = ColumnDataSource(data=dict(t=time, f=tf_lod, r=tr_lod,))
+    source = ColumnDataSource(name='ds_travel', data=data)
     p = figure(
         name='travel',
         title="Wheel travel",
@@ -57,7 +50,7 @@ def travel_figure(telemetry: Telemetry, lod: int,
     p.extra_y_ranges = {'rear': Range1d(start=rear_max, end=0)}
     p.add_layout(LinearAxis(y_range_name='rear'), 'right')
 
-    p.x_range = Range1d(0, time[-1], bounds='auto')
+    p.x_range = Range1d(0, duration, bounds='auto')
 
     line = p.line(
         't', 'f',
@@ -118,6 +111,14 @@ def travel_figure(telemetry: Telemetry, lod: int,
                  SST.update.plots(geometry['x0'], geometry['x1']);
                  '''))
 
+    p.js_on_event(
+        RangesUpdate,
+        CustomJS(
+            args=dict(p=p),
+            code='''
+                 SST.update.samples(cb_obj.x0, cb_obj.x1, p.inner_width);
+                 '''))
+
     wz = WheelZoomTool(maintain_focus=False, dimensions='width')
     p.add_tools(wz)
     p.toolbar.active_scroll = wz
@@ -140,19 +141,16 @@ def travel_figure(telemetry: Telemetry, lod: int,
     return p
 
 
-def _travel_histogram_data(strokes: Strokes, bins: list[float]) -> (
-                           dict[str, list[float]]):
-    hist = np.zeros(len(bins) - 1)
-    total_count = 0
-    for s in strokes.Compressions + strokes.Rebounds:
-        total_count += s.Stat.Count
-        for d in s.DigitizedTravel:
-            hist[d] += 1
-    hist = hist / total_count * 100.0
-    return dict(y=bins[:-1], right=hist.tolist())
+def _travel_histogram_data(strokes: StrokeSelection, bins: list[float]) -> (
+                           dict[str, np.array]):
+    total_count = (strokes.compression_stats.Count +
+                   strokes.rebound_stats.Count)
+    hist = strokes.travel_histogram() / total_count * 100.0
+    return dict(y=np.asarray(bins[:-1], dtype=np.float32),
+                right=hist.astype(np.float32))
 
 
-def travel_histogram_figure(strokes: Strokes, bins: list[float],
+def travel_histogram_figure(strokes: StrokeSelection, bins: list[float],
                             color: tuple[str], title: str) -> figure:
     max_travel = bins[-1]
     data = _travel_histogram_data(strokes, bins)
@@ -179,19 +177,13 @@ def travel_histogram_figure(strokes: Strokes, bins: list[float],
     return p
 
 
-def _travel_stats(strokes: Strokes, max_travel: float) -> (
+def _travel_stats(strokes: StrokeSelection, max_travel: float) -> (
                   float, float, str, str):
-    sum = 0
-    count = 0
-    mx = 0
-    bo = 0
-    for s in strokes.Compressions + strokes.Rebounds:
-        sum += s.Stat.SumTravel
-        count += s.Stat.Count
-        bo += s.Stat.Bottomouts
-        if s.Stat.MaxTravel > mx:
-            mx = s.Stat.MaxTravel
-    avg = sum / count
+    c, r = strokes.compression_stats, strokes.rebound_stats
+    count = c.Count + r.Count
+    mx = max(c.MaxTravel, r.MaxTravel)
+    bo = c.Bottomouts + r.Bottomouts
+    avg = (c.SumTravel + r.SumTravel) / count
 
     avg_text = f"avg.: {avg:.2f} mm ({avg/max_travel*100:.1f}%)"
     mx_text = (f"max.: {mx:.2f} mm ({mx/max_travel*100:.1f}%) / "
@@ -199,7 +191,7 @@ def _travel_stats(strokes: Strokes, max_travel: float) -> (
     return avg, mx, avg_text, mx_text
 
 
-def _add_travel_stat_labels(strokes: Strokes, max_travel: float,
+def _add_travel_stat_labels(strokes: StrokeSelection, max_travel: float,
                             hist_max: float, p: figure):
     avg, mx, avg_text, mx_text = _travel_stats(strokes, max_travel)
     s_avg = Span(name='s_avg', location=avg, dimension='width',
@@ -242,7 +234,7 @@ def _add_airtime_labels(p_travel: figure, airtimes: list[Airtime]):
         p_travel.add_layout(airtime_label)
 
 
-def update_travel_histogram(strokes: Strokes, bins: list[float]):
+def update_travel_histogram(strokes: StrokeSelection, bins: list[float]):
     data = _travel_histogram_data(strokes, bins)
     avg, mx, avg_text, mx_text = _travel_stats(strokes, bins[-1])
     return dict(
@@ -15,34 +15,23 @@ from bokeh.palettes import Spectral11
 from bokeh.plotting import figure
 from scipy.stats import norm
 
-from app.telemetry.psst import Strokes, Telemetry
+from app.telemetry.index import Moments, StrokeSelection
+from app.telemetry.psst import Telemetry
 
 
-TRAVEL_BINS_FOR_VELOCITY_HISTOGRAM = 10
 HISTOGRAM_RANGE_MULTIPLIER = 1.5
 HISTOGRAM_RANGE_HIGH = 2000
 HISTOGRAM_RANGE_LOW = -HISTOGRAM_RANGE_HIGH
+HIGH_SPEED_THRESHOLD = 200  # mm/s, default of the velocity band statistics
 
 
-def velocity_figure(telemetry: Telemetry, lod: int,
+def velocity_figure(telemetry: Telemetry, data: dict[str, np.array],
                     front_color: tuple[str], rear_color: tuple[str]) -> figure:
     length = len(telemetry.Front.Velocity if telemetry.Front.Present else
                  telemetry.Rear.Velocity)
-    time = np.around(np.arange(0, length, lod) / telemetry.SampleRate, 4)
-
-    if telemetry.Front.Present:
-        vf_lod = np.around(telemetry.Front.Velocity[::lod], 4) / 1000
-    else:
-        vf_lod = np.full(length, 0)[::lod]
-    if telemetry.Rear.Present:
-        vr_lod = np.around(telemetry.Rear.Velocity[::lod], 4) / 1000
-    else:
-        vr_lod = np.full(length, 0)[::lod]
-    source = ColumnDataSource(data=dict(
-        t=time,
-        f=vf_lod,
-        r=vr_lod,
-    ))
+    duration = round((length - 1) / telemetry.SampleRate, 4)
+
+    source = ColumnDataSource(name='ds_velocity', data=data)
     p = figure(
         name='velocity',
         title="Suspension velocity",
@@ -61,7 +50,7 @@ def velocity_figure(telemetry: Telemetry, lod: int,
         y_axis_label="Velocity (m/s)",
         output_backend='webgl')
 
-    p.x_range = Range1d(0, time[-1], bounds='auto')
+    p.x_range = Range1d(0, duration, bounds='auto')
 
     line = p.line(
         't', 'f',
@@ -88,74 +77,61 @@ def velocity_figure(telemetry: Telemetry, lod: int,
     return p
 
 
-def _normal_distribution_data(strokes: Strokes, velocity: list[float],
-                              step: float) -> dict[str, np.array]:
-    stroke_velocity = []
-    for s in strokes.Compressions + strokes.Rebounds:
-        stroke_velocity.extend(velocity[s.Start:s.End+1])
-    stroke_velocity = np.array(stroke_velocity)
-    mu, std = norm.fit(stroke_velocity)
-    ny = np.linspace(stroke_velocity.min(), stroke_velocity.max(), 100)
-    pdf = norm.pdf(ny, mu, std) * step * 100
-    return dict(pdf=pdf.tolist(), ny=ny.tolist())
+def _normal_distribution_data(moments: Moments, step: float) -> (
+                              dict[str, np.array]):
+    # Same fit as scipy.stats.norm.fit on the velocity samples of the
+    # strokes, but from the aggregates of the stroke index.
+    if moments.count == 0:
+        return dict(pdf=np.zeros(0, dtype=np.float32),
+                    ny=np.zeros(0, dtype=np.float32))
+    ny = np.linspace(moments.min, moments.max, 100)
+    pdf = norm.pdf(ny, moments.mean, moments.std) * step * 100
+    return dict(pdf=pdf.astype(np.float32), ny=ny.astype(np.float32))
 
 
-def _velocity_histogram_data(strokes: Strokes, hst: int, tbins: list[float],
-                             vbins: list[float], vbins_fine: list[float]) -> (
+def _velocity_histogram_data(strokes: StrokeSelection, hst: int,
+                             tbins: list[float], vbins: list[float],
+                             vbins_fine: list[float]) -> (
                              dict[str, Any], float):
     step = vbins[1] - vbins[0]
     step_lowspeed = vbins_fine[1] - vbins_fine[0]
-    divider = (len(tbins) - 1) // TRAVEL_BINS_FOR_VELOCITY_HISTOGRAM
-    hist = np.zeros((TRAVEL_BINS_FOR_VELOCITY_HISTOGRAM, len(vbins) - 1))
-    total_count = 0
-
-    hist_lowspeed = np.zeros((TRAVEL_BINS_FOR_VELOCITY_HISTOGRAM,
-                              len(vbins_fine) - 1))
-
-    for s in strokes.Compressions + strokes.Rebounds:
-        total_count += s.Stat.Count
-        for i in range(s.Stat.Count):
-            vbin = s.DigitizedVelocity[i]
-            tbin = s.DigitizedTravel[i] // divider
-            hist[tbin][vbin] += 1
-
-            vbin_fine = s.FineDigitizedVelocity[i]
-            if -(hst+step_lowspeed) <= vbins_fine[vbin_fine] < hst:
-                hist_lowspeed[tbin][vbin_fine] += 1
+    total_count = (strokes.compression_stats.Count +
+                   strokes.rebound_stats.Count)
+    hist = strokes.velocity_histogram()
+
+    fine_bins = np.asarray(vbins_fine[:-1])
+    lowspeed = (fine_bins >= -(hst+step_lowspeed)) & (fine_bins < hst)
+    hist_lowspeed = strokes.fine_velocity_histogram()
+    hist_lowspeed[:, ~lowspeed] = 0
+
     hist = hist / total_count * 100.0
     hist_lowspeed = hist_lowspeed / total_count * 100.0
 
-    thist = np.transpose(hist)
-    largest_bin = 0
-    for i in range(len(thist)):
-        sm = np.sum(thist[i])
-        if sm > largest_bin:
-            largest_bin = sm
+    largest_bin = np.max(np.sum(hist, axis=0), initial=0)
+    largest_bin_lowspeed = np.max(np.sum(hist_lowspeed, axis=0), initial=0)
 
-    thist_lowspeed = np.transpose(hist_lowspeed)
-    largest_bin_lowspeed = 0
-    for i in range(len(thist_lowspeed)):
-        sm = np.sum(thist_lowspeed[i])
-        if sm > largest_bin_lowspeed:
-            largest_bin_lowspeed = sm
+    hist = hist.astype(np.float32)
+    hist_lowspeed = hist_lowspeed.astype(np.float32)
 
-    sd = {str(k): v.tolist() for k, v in enumerate(hist)}
-    sd['y'] = (np.array(vbins[:-1]) + step / 2).tolist()
+    sd = {str(k): v for k, v in enumerate(hist)}
+    sd['y'] = (np.asarray(vbins[:-1]) + step / 2).astype(np.float32)
 
-    sd_lowspeed = {str(k): v.tolist() for k, v in enumerate(hist_lowspeed)}
-    sd_lowspeed['y'] = (np.array(vbins_fine[:-1]) + step_lowspeed / 2).tolist()
+    sd_lowspeed = {str(k): v for k, v in enumerate(hist_lowspeed)}
+    sd_lowspeed['y'] = (np.asarray(vbins_fine[:-1]) +
+                        step_lowspeed / 2).astype(np.float32)
 
     return (sd, sd_lowspeed,
             HISTOGRAM_RANGE_MULTIPLIER * largest_bin,
             HISTOGRAM_RANGE_MULTIPLIER * largest_bin_lowspeed)
 
 
-def velocity_histogram_figure(strokes: Strokes, velocity: list[float],
-                              tbins: list[float], vbins: list[float],
-                              vbins_fine: list[float], hst: int,
-                              title: str, title_lowspeed: str) -> figure:
+def velocity_histogram_figure(strokes: StrokeSelection, tbins: list[float],
+                              vbins: list[float], vbins_fine: list[float],
+                              hst: int, title: str,
+                              title_lowspeed: str) -> figure:
     step = vbins[1] - vbins[0]
     step_lowspeed = vbins_fine[1] - vbins_fine[0]
+    moments = strokes.velocity_moments()
     sd, sd_lowspeed, mx, mx_lowspeed = _velocity_histogram_data(
         strokes, hst, tbins, vbins, vbins_fine)
     source = ColumnDataSource(name='ds_hist', data=sd)
@@ -184,7 +160,7 @@ def velocity_histogram_figure(strokes: Strokes, velocity: list[float],
 
     source_normal = ColumnDataSource(
         name='ds_normal',
-        data=_normal_distribution_data(strokes, velocity, step))
+        data=_normal_distribution_data(moments, step))
     p.line(x='pdf', y='ny', line_width=2, source=source_normal,
            line_dash='dashed', color=Spectral11[-2])
 
@@ -211,7 +187,7 @@ def velocity_histogram_figure(strokes: Strokes, velocity: list[float],
 
     source_normal_lowspeed = ColumnDataSource(
         name='ds_normal_lowspeed',
-        data=_normal_distribution_data(strokes, velocity, step_lowspeed))
+        data=_normal_distribution_data(moments, step_lowspeed))
     p_lowspeed.line(x='pdf', y='ny', line_width=2,
                     source=source_normal_lowspeed,
                     line_dash='dashed', color=Spectral11[-2])
@@ -252,7 +228,7 @@ def velocity_histogram_figure(strokes: Strokes, velocity: list[float],
     return p, p_lowspeed
 
 
-def _add_velocity_stat_labels(p: figure, strokes: Strokes, mx):
+def _add_velocity_stat_labels(p: figure, strokes: StrokeSelection, mx):
     avgr, maxr, avgc, maxc = _velocity_stats(strokes)
 
     s_avgr = Span(name='s_avgr', location=avgr, dimension='width',
@@ -313,49 +289,22 @@ def _add_velocity_stat_labels(p: figure, strokes: Strokes, mx):
     p.add_layout(l_maxc)
 
 
-def _velocity_stats(strokes: Strokes) -> (float, float, float, float):
-    csum = 0
-    ccount = 0
-    maxc = 0
-    for c in strokes.Compressions:
-        csum += c.Stat.SumVelocity
-        ccount += c.Stat.Count
-        if c.Stat.MaxVelocity > maxc:
-            maxc = c.Stat.MaxVelocity
-    avgc = csum / ccount
-
-    rsum = 0
-    rcount = 0
-    maxr = 0
-    for r in strokes.Rebounds:
-        rsum += r.Stat.SumVelocity
-        rcount += r.Stat.Count
-        if r.Stat.MaxVelocity < maxr:
-            maxr = r.Stat.MaxVelocity
-    avgr = rsum / rcount
+def _velocity_stats(strokes: StrokeSelection) -> (float, float, float, float):
+    c = strokes.compression_stats
+    avgc = c.SumVelocity / c.Count
+    maxc = c.MaxVelocity
+
+    r = strokes.rebound_stats
+    avgr = r.SumVelocity / r.Count
+    maxr = r.MaxVelocity
     return avgr, maxr, avgc, maxc
 
 
-def _velocity_band_stats(strokes: Strokes, velocity: list[float],
+def _velocity_band_stats(strokes: StrokeSelection,
                          high_speed_threshold: float) -> (
                          float, float, float, float):
-    velocity_ = np.array(velocity)
-    total_count = 0
-    lsc, hsc = 0, 0
-    for c in strokes.Compressions:
-        total_count += c.Stat.Count
-        stroke_lsc = np.count_nonzero(
-            velocity_[c.Start:c.End+1] < high_speed_threshold)
-        lsc += stroke_lsc
-        hsc += c.Stat.Count - stroke_lsc
-
-    lsr, hsr = 0, 0
-    for r in strokes.Rebounds:
-        total_count += r.Stat.Count
-        stroke_lsr = np.count_nonzero(
-            velocity_[r.Start:r.End+1] > -high_speed_threshold)
-        lsr += stroke_lsr
-        hsr += r.Stat.Count - stroke_lsr
+    hsr, lsr, lsc, hsc = strokes.velocity_bands(high_speed_threshold)
+    total_count = hsr + lsr + lsc + hsc
 
     lsc = lsc / total_count * 100.0
     hsc = hsc / total_count * 100.0
@@ -365,10 +314,9 @@ def _velocity_band_stats(strokes: Strokes, velocity: list[float],
     return hsr, lsr, lsc, hsc
 
 
-def velocity_band_stats_figure(strokes: Strokes, velocity: list[float],
+def velocity_band_stats_figure(strokes: StrokeSelection,
                                high_speed_threshold: float) -> figure:
-    hsr, lsr, lsc, hsc = _velocity_band_stats(strokes, velocity,
-                                              high_speed_threshold)
+    hsr, lsr, lsc, hsc = _velocity_band_stats(strokes, high_speed_threshold)
     source = ColumnDataSource(name='ds_stats', data=dict(
         x=[0], hsc=[hsc], lsc=[lsc], lsr=[lsr], hsr=[hsr]))
     p = figure(
@@ -416,12 +364,12 @@ def velocity_band_stats_figure(strokes: Strokes, velocity: list[float],
     return p
 
 
-def update_velocity_histogram(strokes: Strokes, velocity: list[float],
-                              tbins: list[float], vbins: list[float],
-                              vbins_fine: list[float],
+def update_velocity_histogram(strokes: StrokeSelection, tbins: list[float],
+                              vbins: list[float], vbins_fine: list[float],
                               high_speed_threshold: int):
     step = vbins[1] - vbins[0]
     step_lowspeed = vbins_fine[1] - vbins_fine[0]
+    moments = strokes.velocity_moments()
     data, data_lowspeed, mx, mx_lowspeed = _velocity_histogram_data(
         strokes, high_speed_threshold, tbins, vbins, vbins_fine)
     avgr, maxr, avgc, maxc = _velocity_stats(strokes)
@@ -430,9 +378,10 @@ def update_velocity_histogram(strokes: Strokes, velocity: list[float],
         mx=mx,
         data_lowspeed=data_lowspeed,
         mx_lowspeed=mx_lowspeed,
-        normal_data=_normal_distribution_data(strokes, velocity, step),
-        normal_data_lowspeed=_normal_distribution_data(strokes, velocity,
+        normal_data=_normal_distribution_data(moments, step),
+        normal_data_lowspeed=_normal_distribution_data(moments,
                                                        step_lowspeed),
+        hst=high_speed_threshold,
         avgr=avgr,
         maxr=maxr,
         avgc=avgc,
@@ -444,10 +393,9 @@ def update_velocity_histogram(strokes: Strokes, velocity: list[float],
     )
 
 
-def update_velocity_band_stats(strokes: Strokes, velocity: list[float],
+def update_velocity_band_stats(strokes: StrokeSelection,
                                high_speed_threshold: float):
-    hsr, lsr, lsc, hsc = _velocity_band_stats(strokes, velocity,
-                                              high_speed_threshold)
+    hsr, lsr, lsc, hsc = _velocity_band_stats(strokes, high_speed_threshold)
     return dict(
         data=dict(x=[0], hsc=[hsc], lsc=[lsc], lsr=[lsr], hsr=[hsr]),
         hsr=hsr,
@@ -0,0 +1,338 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import click
+
+from flask import Flask
+from flask.cli import AppGroup
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db, sio
+from app.models.cache_job import CacheJob
+from app.models.session import Session
+from app.models.session_figure import SessionFigure
+from app.models.session_summary import SessionSummary
+from app.telemetry.velocity import HIGH_SPEED_THRESHOLD
+
+
+LEASE_MARGIN = 60  # seconds a lease outlives the timeout of its job
+POLL_INTERVAL = 5  # seconds between looking for jobs queued elsewhere
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FAILED = 'failed'
+
+
+def _worker(conn):
+    # Runs in a separate process with its own application instance, so that
+    # generating the Bokeh components does not block request handling.
+    from app import create_app
+    from app.telemetry.session_html import create_cache
+
+    # Every job is a different session, so decoded telemetry is not cached
+    # (it would only hold on to memory, and invalidations of the server
+    # process do not reach the worker).
+    os.environ['FLASK_TELEMETRY_CACHE_SIZE'] = '0'
+    app = create_app()
+    conn.send(None)  # ready, job timeouts do not include the startup time
+    with app.app_context():
+        while True:
+            session_id = conn.recv()
+            try:
+                create_cache(session_id, HIGH_SPEED_THRESHOLD)
+                conn.send(None)
+            except BaseException as e:
+                conn.send(f"{type(e).__name__}: {e}")
+
+
+class CacheGenerator:
+    """ Generates the Bokeh components of sessions in a pool of worker
+    processes. Jobs are rows of the cache_job table, so they survive restarts
+    and can be queued from other processes. A worker claims a job by leasing
+    it; leases of crashed workers expire, and the job is claimed again. A
+    session is queued at most once, sessions a user is waiting for are
+    generated first, failed jobs are retried with exponential backoff, and
+    a worker that exceeds the job timeout is killed and replaced.
+    """
+
+    def __init__(self, workers: int = 2, timeout: int = 600,
+                 retries: int = 3, backoff: int = 30):
+        self.workers = workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._app = None
+        self._wakeup = threading.Condition()
+        self._started = False
+
+    def init_app(self, app: Flask):
+        self._app = app
+        self.workers = app.config.setdefault('CACHE_WORKERS', self.workers)
+        self.timeout = app.config.setdefault('CACHE_JOB_TIMEOUT',
+                                             self.timeout)
+        self.retries = app.config.setdefault('CACHE_JOB_RETRIES',
+                                             self.retries)
+        self.backoff = app.config.setdefault('CACHE_JOB_BACKOFF',
+                                             self.backoff)
+        app.cli.add_command(cache_cli)
+
+    def start(self):
+        with self._wakeup:
+            if self._started:
+                return
+            self._started = True
+        with self._app.app_context():
+            count = self.enqueue_missing()
+        # Worker processes are spawned instead of forked, because the server
+        # process might already be running threads (or green threads).
+        ctx = multiprocessing.get_context('spawn')
+        for slot in range(self.workers):
+            t = threading.Thread(target=self._run, args=(ctx, slot),
+                                 daemon=True)
+            t.start()
+        self._app.logger.info(
+            f"Bokeh HTML generator started with {self.workers} workers, "
+            f"{count} sessions without components queued")
+
+    def _notify(self):
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def submit(self, session_id: int, priority: bool = False,
+               retry_failed: bool = True) -> bool:
+        level = 0 if priority else 1
+        now = int(time.time())
+        job = db.session.get(CacheJob, session_id)
+        if job is None:
+            db.session.add(CacheJob(session_id=session_id, priority=level,
+                                    state=QUEUED, created=now,
+                                    not_before=now))
+        elif job.state == RUNNING:
+            return False
+        elif job.state == FAILED:
+            if not retry_failed:
+                return False
+            job.state = QUEUED
+            job.priority = level
+            job.attempts = 0
+            job.not_before = now
+        elif job.priority > level:
+            job.priority = level
+            job.not_before = now
+        else:
+            return False
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # queued concurrently
+            return False
+        self._notify()
+        return True
+
+    def enqueue(self, sessions) -> int:
+        # Queues every session selected by the sessions query (of session
+        # ids) that does not have a job yet, and requeues the failed ones.
+        now = int(time.time())
+        ids = sessions.scalar_subquery()
+        requeued = db.session.execute(
+            db.update(CacheJob)
+            .where(CacheJob.state == FAILED, CacheJob.session_id.in_(ids))
+            .values(state=QUEUED, attempts=0, not_before=now))
+        inserted = db.session.execute(db.insert(CacheJob).from_select(
+            ['session_id', 'priority', 'state', 'attempts', 'created',
+             'not_before'],
+            db.select(Session.id, db.literal(1), db.literal(QUEUED),
+                      db.literal(0), db.literal(now), db.literal(now))
+            .where(Session.id.in_(ids))
+            .where(~db.exists().where(CacheJob.session_id == Session.id))))
+        db.session.commit()
+        self._notify()
+        return requeued.rowcount + inserted.rowcount
+
+    def enqueue_missing(self) -> int:
+        # Sessions without Bokeh components, or without a summary (stored
+        # before summaries were introduced)
+        return self.enqueue(db.select(Session.id).where(db.or_(
+            ~db.exists().where(SessionFigure.session_id == Session.id),
+            ~db.exists().where(SessionSummary.session_id == Session.id))))
+
+    def _claim(self, owner: str) -> int:
+        now = int(time.time())
+        expired = db.and_(CacheJob.state == RUNNING,
+                          CacheJob.lease_until < now)
+        # A job whose worker died too many times is not claimed again.
+        db.session.execute(
+            db.update(CacheJob)
+            .where(expired, CacheJob.attempts > self.retries)
+            .values(state=FAILED, error="lease expired"))
+        claimable = db.or_(
+            db.and_(CacheJob.state == QUEUED, CacheJob.not_before <= now),
+            expired)
+        while True:
+            session_id = db.session.execute(
+                db.select(CacheJob.session_id)
+                .where(claimable)
+                .order_by(CacheJob.priority, CacheJob.created)
+                .limit(1)).scalar_one_or_none()
+            if session_id is None:
+                db.session.commit()
+                return None
+            # The claim only succeeds if nobody else claimed the job since
+            # it was selected.
+            claimed = db.session.execute(
+                db.update(CacheJob)
+                .where(CacheJob.session_id == session_id, claimable)
+                .values(state=RUNNING, owner=owner, started=now,
+                        lease_until=now + self.timeout + LEASE_MARGIN,
+                        attempts=CacheJob.attempts + 1))
+            db.session.commit()
+            if claimed.rowcount == 1:
+                return session_id
+
+    def _finish(self, session_id: int, owner: str, error: str):
+        job = db.session.get(CacheJob, session_id)
+        if job is None or job.owner != owner:
+            return  # deleted, or claimed again after the lease expired
+        if error is None:
+            db.session.delete(job)
+        elif job.attempts <= self.retries:
+            job.state = QUEUED
+            job.not_before = (int(time.time()) +
+                              self.backoff * 2 ** (job.attempts - 1))
+            job.error = error
+        else:
+            job.state = FAILED
+            job.error = error
+        db.session.commit()
+
+        if error is None:
+            sio.emit("session_ready", dict(id=session_id))
+            self._app.logger.info(f"cache ready for session {session_id}")
+        else:
+            self._app.logger.error(
+                f"cache failed for session {session_id} "
+                f"(attempt {job.attempts}): {error}")
+
+    def _spawn(self, ctx) -> tuple:
+        conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=_worker, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        try:
+            conn.recv()
+        except EOFError:
+            process.join()
+            raise
+        return process, conn
+
+    def _execute(self, process, conn, ctx, session_id: int) -> tuple:
+        try:
+            if process is None or not process.is_alive():
+                process, conn = self._spawn(ctx)
+            conn.send(session_id)
+            if conn.poll(self.timeout):
+                return process, conn, conn.recv()
+            process.kill()
+            process.join()
+            return process, conn, f"timed out after {self.timeout} s"
+        except (EOFError, OSError):
+            if process is not None:
+                process.join()
+            return process, conn, "worker process exited"
+
+    def _run(self, ctx, slot: int):
+        owner = f"{os.getpid()}/{slot}"
+        process, conn = None, None
+        while True:
+            with self._app.app_context():
+                session_id = self._claim(owner)
+            if session_id is None:
+                with self._wakeup:
+                    self._wakeup.wait(POLL_INTERVAL)
+                continue
+
+            self._app.logger.info(f"generating cache for session {session_id}")
+            process, conn, error = self._execute(process, conn, ctx,
+                                                 session_id)
+            with self._app.app_context():
+                self._finish(session_id, owner, error)
+
+    def status(self) -> dict:
+        jobs = db.session.execute(db.select(CacheJob).order_by(
+            CacheJob.priority, CacheJob.created)).scalars()
+        status = dict(workers=self.workers, queued=[], running=[], failed=[])
+        for job in jobs:
+            if job.state == QUEUED:
+                status[QUEUED].append(dict(
+                    session_id=job.session_id,
+                    priority=job.priority == 0,
+                    attempts=job.attempts,
+                    not_before=job.not_before,
+                    error=job.error))
+            elif job.state == RUNNING:
+                status[RUNNING].append(dict(
+                    session_id=job.session_id,
+                    started=job.started,
+                    attempts=job.attempts))
+            else:
+                status[FAILED].append(dict(
+                    session_id=job.session_id,
+                    attempts=job.attempts,
+                    error=job.error))
+        return status
+
+
+cache_cli = AppGroup('cache', help="Manage Bokeh component generation.")
+
+
+@cache_cli.command('enqueue')
+@click.option('--all', 'all_', is_flag=True,
+              help="Regenerate the components of every session.")
+@click.option('--missing', is_flag=True,
+              help="Generate components of sessions that have none, or "
+                   "no summary.")
+@click.argument('ids', nargs=-1, type=int)
+def enqueue_command(all_: bool, missing: bool, ids: tuple[int]):
+    from app import cache_generator
+
+    if all_:
+        count = cache_generator.enqueue(db.select(Session.id))
+    elif missing:
+        count = cache_generator.enqueue_missing()
+    else:
+        count = cache_generator.enqueue(
+            db.select(Session.id).where(Session.id.in_(ids)))
+    click.echo(f"{count} sessions queued")
+
+
+@cache_cli.command('run')
+@click.option('--workers', type=int, help="Number of worker processes.")
+def run_command(workers: int):
+    """ Processes queued jobs until the queue is empty. """
+    from app import cache_generator
+
+    if workers:
+        cache_generator.workers = workers
+    cache_generator.start()
+    while True:
+        s = cache_generator.status()
+        db.session.commit()  # ends the transaction, so the next poll is fresh
+        if not s[QUEUED] and not s[RUNNING]:
+            break
+        click.echo(f"{len(s[QUEUED])} queued, {len(s[RUNNING])} running, "
+                   f"{len(s[FAILED])} failed")
+        time.sleep(POLL_INTERVAL)
+    click.echo(f"done, {len(s[FAILED])} failed")
+
+
+@cache_cli.command('status')
+def status_command():
+    from app import cache_generator
+
+    s = cache_generator.status()
+    for state in (QUEUED, RUNNING, FAILED):
+        click.echo(f"{state}: {len(s[state])}")
+    for job in s[FAILED]:
+        click.echo(f"  session {job['session_id']}: {job['error']}")
@@ -0,0 +1,67 @@
+import gzip
+
+from flask import Flask, Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class Compress:
+    """ Compresses API responses with brotli or gzip, whichever the client
+    accepts (brotli is preferred, if the module is available). Small
+    responses, streamed responses and responses that already have a
+    Content-Encoding are left alone.
+    """
+
+    def __init__(self, min_size: int = 500, level: int = 6,
+                 mimetypes: tuple[str] = ('application/json',
+                                          'application/msgpack')):
+        self.min_size = min_size
+        self.level = level
+        self.mimetypes = mimetypes
+
+    def init_app(self, app: Flask):
+        self.min_size = app.config.setdefault('COMPRESS_MIN_SIZE',
+                                              self.min_size)
+        self.level = app.config.setdefault('COMPRESS_LEVEL', self.level)
+        self.mimetypes = app.config.setdefault('COMPRESS_MIMETYPES',
+                                               self.mimetypes)
+        app.after_request(self._after_request)
+
+    def _encoding(self) -> str:
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def _compress(self, data: bytes, encoding: str) -> bytes:
+        if encoding == 'br':
+            # Brotli quality goes up to 11, gzip level to 9.
+            return brotli.compress(data, quality=min(self.level, 11))
+        return gzip.compress(data, compresslevel=min(self.level, 9))
+
+    def _after_request(self, response: Response) -> Response:
+        if response.mimetype not in self.mimetypes:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.direct_passthrough or
+                response.is_streamed or
+                response.status_code < 200 or
+                response.status_code >= 300 or
+                'Content-Encoding' in response.headers):
+            return response
+
+        encoding = self._encoding()
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        response.set_data(self._compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
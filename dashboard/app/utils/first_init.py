@@ -120,3 +120,13 @@ def first_init():
     sqlite_uri = current_app.config['SQLALCHEMY_DATABASE_URI']
     if not path.isfile(urlparse(sqlite_uri).path):
         _initiate_database()
+    else:
+        # Creates the tables and indexes added since the database was
+        # initiated, and drops the tables that are not used anymore (Bokeh
+        # components are stored per figure in session_figure).
+        db.create_all()
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+        db.session.execute(db.text('DROP TABLE IF EXISTS session_html'))
+        db.session.commit()
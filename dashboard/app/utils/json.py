@@ -0,0 +1,43 @@
+import base64
+
+import numpy as np
+
+from flask.json.provider import DefaultJSONProvider
+
+
+# JavaScript has no 64-bit typed arrays (without BigInt), so these are sent
+# as their 32-bit counterparts.
+_NARROWED = {
+    np.dtype(np.int64): np.int32,
+    np.dtype(np.uint64): np.uint32,
+    np.dtype(np.bool_): np.uint8,
+}
+
+
+def little_endian(a: np.ndarray) -> np.ndarray:
+    a = np.asarray(a, dtype=_NARROWED.get(a.dtype, a.dtype))
+    return np.ascontiguousarray(a, dtype=a.dtype.newbyteorder('<'))
+
+
+def encode_array(a: np.ndarray) -> dict:
+    a = little_endian(a)
+    return {
+        '__ndarray__': base64.b64encode(a.data).decode('ascii'),
+        'dtype': a.dtype.name,
+        'shape': a.shape,
+    }
+
+
+class NumpyJSONProvider(DefaultJSONProvider):
+    """ Encodes NumPy arrays as base64 typed buffers instead of decimal
+    number lists (the frontend turns them into typed arrays with
+    SST.decode), and NumPy scalars as plain numbers.
+    """
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, np.ndarray):
+            return encode_array(o)
+        if isinstance(o, np.generic):
+            return o.item()
+        return DefaultJSONProvider.default(o)
@@ -0,0 +1,40 @@
+from flask import request
+
+from app.extensions import db
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def keyset_args(*names: str) -> tuple:
+    """ Key values of the last row of the previous page, from the query
+    parameters with the given names. Only the leading parameters that are
+    present are used.
+    """
+
+    values = []
+    for name in names:
+        value = request.args.get(name, type=int)
+        if value is None:
+            break
+        values.append(value)
+    return tuple(values)
+
+
+def keyset_page(stmt, keys: tuple, before: tuple):
+    """ Orders stmt by keys, descending, and limits it to the rows before the
+    given key values, and to the number of rows in the limit query
+    parameter. As pages are located through the (indexed) keys instead of
+    an offset, every page costs the same, however deep it is.
+    """
+
+    stmt = stmt.order_by(*[k.desc() for k in keys])
+    if before:
+        if len(before) == 1:
+            stmt = stmt.where(keys[0] < before[0])
+        else:
+            stmt = stmt.where(db.tuple_(*keys[:len(before)]) <
+                              db.tuple_(*before))
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return stmt.limit(min(max(limit, 1), MAX_PAGE_SIZE))
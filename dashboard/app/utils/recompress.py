@@ -0,0 +1,80 @@
+import click
+
+from sqlalchemy.orm.attributes import flag_modified
+
+from app.extensions import db
+from app.models import codec
+from app.models.session import Session
+from app.models.session_figure import SessionFigure
+from app.models.track import Track
+
+
+def _batches(model, key, outdated, batch_size: int, column):
+    # Keyset pagination over the (session) key, so every batch is a cheap
+    # index range scan, and rewritten rows do not shift the following
+    # batches. A batch holds every outdated row of batch_size keys.
+    last = None
+    while True:
+        keys = db.select(key).where(outdated).distinct().order_by(key)
+        if last is not None:
+            keys = keys.where(key > last)
+        keys = db.session.execute(keys.limit(batch_size)).scalars().all()
+        if not keys:
+            return
+        yield db.session.execute(
+            db.select(model).options(db.undefer(column))
+            .where(outdated, key.in_(keys))).scalars().all()
+        last = keys[-1]
+        db.session.commit()
+        db.session.expunge_all()  # keeps memory usage at one batch
+
+
+def recompress(batch_size: int) -> tuple[int, int, int]:
+    """ Rewrites Session data, Bokeh figures and tracks that are not yet
+    stored with the current codec (rows written before compression was
+    introduced, or with another codec, and tracks stored as JSON). Returns
+    the number of rewritten sessions, figures and tracks.
+    """
+
+    sessions = 0
+    outdated = db.func.substr(Session.data, 1, 2) != codec.HEADER
+    for rows in _batches(Session, Session.id, outdated, batch_size,
+                         Session.data):
+        for session in rows:
+            session.data = session.data  # encoded by the validator
+        sessions += len(rows)
+
+    figures = 0
+    # Uncompressed figures are stored as TEXT.
+    outdated = db.or_(
+        db.func.typeof(SessionFigure.item) == 'text',
+        db.func.substr(SessionFigure.item, 1, 2) != codec.HEADER)
+    for rows in _batches(SessionFigure, SessionFigure.session_id, outdated,
+                         batch_size, SessionFigure.item):
+        for figure in rows:
+            flag_modified(figure, 'item')
+        figures += len(rows)
+
+    tracks = 0
+    outdated = db.or_(
+        db.func.typeof(Track.track) == 'text',
+        db.func.substr(Track.track, 1, 2) != codec.HEADER)
+    for rows in _batches(Track, Track.id, outdated, batch_size,
+                         Track.track):
+        for track in rows:
+            flag_modified(track, 'track')
+        tracks += len(rows)
+
+    return sessions, figures, tracks
+
+
+@click.command('recompress')
+@click.option('--batch-size', type=int, default=50, show_default=True,
+              help="Number of sessions rewritten per transaction.")
+def recompress_command(batch_size: int):
+    """ Compresses sessions stored before compression was introduced. """
+    sessions, figures, tracks = recompress(batch_size)
+    click.echo(f"{sessions} sessions, {figures} figures and {tracks} tracks "
+               "recompressed")
+    if sessions or tracks:
+        click.echo("Run VACUUM on the database to reclaim the freed space.")
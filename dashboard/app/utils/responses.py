@@ -0,0 +1,44 @@
+import msgpack
+import numpy as np
+
+from flask import current_app, request
+
+from app.utils.json import little_endian
+
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+
+def _msgpack_default(o):
+    # Same layout as the JSON encoding of arrays, but with the raw buffer
+    # instead of its base64 representation.
+    if isinstance(o, np.ndarray):
+        a = little_endian(o)
+        return {
+            '__ndarray__': a.tobytes(),
+            'dtype': a.dtype.name,
+            'shape': a.shape,
+        }
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(f"Object of type {type(o).__name__} is not msgpack "
+                    "serializable")
+
+
+def wants_msgpack() -> bool:
+    # JSON stays the default, msgpack has to be asked for explicitly.
+    best = request.accept_mimetypes.best_match(
+        ['application/json', MSGPACK_MIMETYPE])
+    return best == MSGPACK_MIMETYPE
+
+
+def data_response(data):
+    """ Returns data as msgpack if the client prefers that according to its
+    Accept header, and as JSON otherwise.
+    """
+
+    if wants_msgpack():
+        return current_app.response_class(
+            msgpack.packb(data, default=_msgpack_default),
+            mimetype=MSGPACK_MIMETYPE)
+    return current_app.json.response(data)
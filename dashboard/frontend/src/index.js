@@ -8,8 +8,8 @@ var SST = require("./models/Global")
 m.route.prefix = '#'
 m.route(document.body, "/dashboard", {
     "/dashboard": {
-        render: function() {
-            return m(Layout, m(Dashboard, {key: "last"}))
+        render: function(vnode) {
+            return m(Layout, m(Dashboard, {key: "last", hst: vnode.attrs.hst}))
         }
     },
     "/dashboard/:key": {
@@ -4,7 +4,29 @@ var Login = require("../views/Login")
 var VideoPlayer = require("../views/VideoPlayer")
 var Layout = require("../views/Layout")
 
+const TYPED_ARRAYS = {
+  float32: Float32Array,
+  float64: Float64Array,
+  int8: Int8Array,
+  int16: Int16Array,
+  int32: Int32Array,
+  uint8: Uint8Array,
+  uint16: Uint16Array,
+  uint32: Uint32Array,
+}
+
 var SST = {
+  decode: function(value) {
+    // NumPy arrays are sent as base64 encoded little-endian buffers (see
+    // app/utils/json.py), they are turned into typed arrays in place.
+    if (value === null || typeof value !== "object") return value;
+    if (value.__ndarray__ !== undefined) {
+      const bytes = Uint8Array.from(atob(value.__ndarray__), c => c.charCodeAt(0));
+      return new TYPED_ARRAYS[value.dtype](bytes.buffer);
+    }
+    for (const key in value) value[key] = SST.decode(value[key]);
+    return value;
+  },
   setError: function(error) {
     Layout.error = error
   },
@@ -13,12 +35,39 @@ var SST = {
     const parts = value.split(`; ${name}=`);
     if (parts.length === 2) return parts.pop().split(';').shift();
   },
-  init_models: function() {
-    // Store travel graph Span in VideoPlayer
-    VideoPlayer.travelSpan = Bokeh.documents[0].get_model_by_name("s_current_time")
-
-    // Map
-    SST.update.map(Session.current.full_track, Session.current.session_track)
+  model: function(name) {
+    // Every figure is embedded as a separate Bokeh document.
+    for (const doc of Bokeh.documents) {
+      const model = doc.get_model_by_name(name);
+      if (model !== null) return model;
+    }
+    return null;
+  },
+  embed: function(items) {
+    return Promise.all(Object.entries(items).map(([name, item]) => {
+      const target = "figure-" + name;
+      if (document.getElementById(target) === null) return null;
+      return Bokeh.embed.embed_item(item, target).then(() => {
+        const doc = Bokeh.documents.find(d => d.get_model_by_id(item.root_id) !== null);
+        SST.init_figure(name, doc);
+      });
+    }))
+    .then(() => SST.update.refresh());
+  },
+  init_figure: function(name, doc) {
+    if (name == "travel") {
+      // Store travel graph Span in VideoPlayer
+      VideoPlayer.travelSpan = SST.model("s_current_time")
+    } else if (name == "map") {
+      SST.update.map(Session.current.full_track, Session.current.session_track)
+      // Only an overview of the track is sent with the session, details are
+      // loaded for the area the map shows.
+      const map = doc.get_model_by_name("map");
+      for (const range of [map.x_range, map.y_range]) {
+        range.properties.start.change.connect(() => SST.update.track());
+        range.properties.end.change.connect(() => SST.update.track());
+      }
+    }
 
     // Disable tools on mobile
     if( /Android|webOS|iPhone|iPad|iPod|BlackBerry|IEMobile|Opera Mini/i.test(navigator.userAgent) ) {
@@ -29,7 +78,7 @@ var SST = {
           if (item.active_inspect) { item.active_inspect = null; }
         }
       };
-      Bokeh.documents[0].roots().forEach(item => {
+      doc.roots().forEach(item => {
         disable_tools(item);
         if (item.children) {
           item.children.forEach(child => disable_tools(child));
@@ -37,65 +86,150 @@ var SST = {
       });
     }
   },
+  link_ranges: function() {
+    // Travel and velocity are separate documents, so their x ranges are kept
+    // in sync here.
+    const travel = SST.model("travel").x_range;
+    const velocity = SST.model("velocity").x_range;
+    const link = (from, to) => {
+      from.properties.start.change.connect(() => { to.start = from.start });
+      from.properties.end.change.connect(() => { to.end = from.end });
+    };
+    link(travel, velocity);
+    link(velocity, travel);
+  },
+  seek: function(location) {
+    if (isNaN(location)) {
+      return
+    }
+    const map = SST.model("map");
+    if (map !== null) {
+      const dss = map.select_one("ds_session");
+      if (dss.data['lat'].length != 0) {
+        let idx = Math.floor(location * 10);
+        if (idx < 0) {
+          idx = 0;
+        } else if (idx >= dss.data['lon'].length) {
+          idx = dss.data['lon'].length - 1;
+        }
+        const pos = map.select_one("pos_marker");
+        pos.x = dss.data['lon'][idx];
+        pos.y = dss.data['lat'][idx];
+      }
+    }
+    SST.seekVideo(location)
+  },
   seekVideo: VideoPlayer.seek,
   update: {
     process_double_json: function(u) {
-      const f_fft = Bokeh.documents[0].get_model_by_name("front_fft");
-      const r_fft = Bokeh.documents[0].get_model_by_name("rear_fft");
-      const f_thist = Bokeh.documents[0].get_model_by_name("front_travel_hist");
-      const r_thist = Bokeh.documents[0].get_model_by_name("rear_travel_hist");
-      const f_vhist = Bokeh.documents[0].get_model_by_name("front_velocity_hist");
-      const r_vhist = Bokeh.documents[0].get_model_by_name("rear_velocity_hist");
-      const cbalance = Bokeh.documents[0].get_model_by_name("balance_compression");
-      const rbalance = Bokeh.documents[0].get_model_by_name("balance_rebound");
+      const f_fft = SST.model("front_fft");
+      const r_fft = SST.model("rear_fft");
+      const f_thist = SST.model("front_travel_hist");
+      const r_thist = SST.model("rear_travel_hist");
+      const f_vhist = SST.model("front_velocity_hist");
+      const r_vhist = SST.model("rear_velocity_hist");
+      const cbalance = SST.model("balance_compression");
+      const rbalance = SST.model("balance_rebound");
 
       SST.update.fft(f_fft, u.front.fft);
       SST.update.fft(r_fft, u.rear.fft);
       SST.update.thist(f_thist, u.front.thist);
       SST.update.thist(r_thist, u.rear.thist);
-      SST.update.vhist(f_vhist.children[0], f_vhist.children[1], u.front.vhist);
-      SST.update.vhist(r_vhist.children[0], r_vhist.children[1], u.rear.vhist);
-      SST.update.vbands(f_vhist.children[2], u.front.vbands);
-      SST.update.vbands(r_vhist.children[2], u.rear.vbands);
+      SST.update.vhist(f_vhist, u.front.vhist);
+      SST.update.vhist(r_vhist, u.rear.vhist);
+      SST.update.vbands(f_vhist, u.front.vbands);
+      SST.update.vbands(r_vhist, u.rear.vbands);
       SST.update.balance(cbalance, u.balance.compression);
       SST.update.balance(rbalance, u.balance.rebound);
     },
     process_single_json: function(u) {
-      const fft = Bokeh.documents[0].get_model_by_name("fft");
-      const thist = Bokeh.documents[0].get_model_by_name("travel_hist");
-      const vhist = Bokeh.documents[0].get_model_by_name("velocity_hist");
+      const fft = SST.model("fft");
+      const thist = SST.model("travel_hist");
+      const vhist = SST.model("velocity_hist");
 
       if (u.front !== null) {
         SST.update.fft(fft, u.front.fft);
         SST.update.thist(thist, u.front.thist);
-        SST.update.vhist(vhist.children[0], vhist.children[1], u.front.vhist);
-        SST.update.vbands(vhist.children[2], u.front.vbands);
+        SST.update.vhist(vhist, u.front.vhist);
+        SST.update.vbands(vhist, u.front.vbands);
       } else {
         SST.update.fft(fft, u.rear.fft);
         SST.update.thist(thist, u.rear.thist);
-        SST.update.vhist(vhist.children[0], vhist.children[1], u.rear.vhist);
-        SST.update.vbands(vhist.children[2], u.rear.vbands);
+        SST.update.vhist(vhist, u.rear.vhist);
+        SST.update.vbands(vhist, u.rear.vbands);
       }
     },
     plots: function(start, end) {
-      const args = "?start=" + start + "&end=" + end;
+      const args = "?start=" + start + "&end=" + end + "&hst=" + Session.current.hst;
       m.request({
         method: "GET",
         url: '/api/session/' + Session.current.id + '/filter' + args,
       })
       .then((update) => {
-          Session.current.suspension_count == 2 ? SST.update.process_double_json(update) :
-                                                  SST.update.process_single_json(update);
+          SST.update.last = SST.decode(update);
+          SST.update.refresh();
       })
       .catch((error) => {
         SST.setError('Invalid range!')
       })
     },
+    refresh: function() {
+      // Figures embedded after a range was selected would show the whole
+      // session otherwise.
+      const u = SST.update.last;
+      if (u === undefined) {
+        return
+      }
+      Session.current.suspension_count == 2 ? SST.update.process_double_json(u) :
+                                              SST.update.process_single_json(u);
+    },
+    samples: function(start, end, width) {
+      // Travel and velocity plots are (re)loaded with the detail level that
+      // fits the visible window, after the range stopped changing.
+      clearTimeout(SST.update.samplesTimeout);
+      SST.update.samplesTimeout = setTimeout(() => {
+        const args = "?start=" + start + "&end=" + end + "&width=" + Math.round(width);
+        m.request({
+          method: "GET",
+          url: '/api/session/' + Session.current.id + '/samples' + args,
+        })
+        .then((u) => {
+          SST.decode(u);
+          const travel = SST.model("travel");
+          const velocity = SST.model("velocity");
+          travel.select_one("ds_travel").data = u.travel;
+          velocity.select_one("ds_velocity").data = u.velocity;
+        })
+      }, 200);
+    },
+    track: function() {
+      clearTimeout(SST.update.trackTimeout);
+      SST.update.trackTimeout = setTimeout(() => {
+        const map = SST.model("map");
+        if (map === null || !Session.current.track) {
+          return
+        }
+        const args = "?x_start=" + map.x_range.start + "&x_end=" + map.x_range.end +
+                     "&y_start=" + map.y_range.start + "&y_end=" + map.y_range.end +
+                     "&width=" + Math.round(map.inner_width);
+        m.request({
+          method: "GET",
+          url: '/api/track/' + Session.current.track + '/polyline' + args,
+        })
+        .then((u) => {
+          map.select_one("ds_track").data = SST.decode(u);
+        })
+      }, 200);
+    },
+    // Figures of sections that were not shown yet are not embedded, these
+    // are skipped.
     fft: function(p, u) {
+      if (p === null) return;
       p.select_one("ds_fft").data = u.data;
       p.select_one("b_fft").glyph.width = 4.9 / u.data.freqs.length
     },
     thist: function(p, u) {
+      if (p === null) return;
       p.select_one("ds_hist").data = u.data;
       p.x_range.end = u.range_end;
 
@@ -111,11 +245,16 @@ var SST = {
       const s_max = p.select_one("s_max");
       s_max.location = u.mx;
     },
-    vhist: function(p, p_lowspeed, u) {
+    vhist: function(row, u) {
+      if (row === null) return;
+      const p = row.children[0];
+      const p_lowspeed = row.children[1];
       p.select_one("ds_hist").data = u.data;
       p.x_range.end = u.mx;
       p_lowspeed.select_one("ds_hist_lowspeed").data = u.data_lowspeed;
       p_lowspeed.x_range.end = u.mx_lowspeed;
+      p_lowspeed.y_range.start = u.hst + 100;
+      p_lowspeed.y_range.end = -(u.hst + 100);
   
       p.select_one("ds_normal").data = u.normal_data;
       p_lowspeed.select_one("ds_normal_lowspeed").data = u.normal_data_lowspeed;
@@ -145,7 +284,9 @@ var SST = {
       l_maxc.y = Math.min(bottom, u.maxc);
       l_maxc.text = u.maxc_text;
     },
-    vbands: function(p, u) {
+    vbands: function(row, u) {
+      if (row === null) return;
+      const p = row.children[2];
       p.select_one("ds_stats").data = u.data;
   
       const l_hsr = p.select_one("l_hsr");
@@ -164,12 +305,16 @@ var SST = {
       p.y_range.end = u.hsr + u.lsr + u.lsc + u.hsc;
     },
     balance: function(p, u) {
+      if (p === null) return;
       p.select_one("ds_f").data = u.f_data;
       p.select_one("ds_r").data = u.r_data;
       p.x_range.end = u.range_end;
     },
     map: function(full_track, session_track) {
-      const map = Bokeh.documents[0].get_model_by_name("map");
+      const map = SST.model("map");
+      if (map === null) {
+        return
+      }
       if (session_track) {
         const start_lon = session_track["lon"][0];
         const start_lat = session_track["lat"][0];
@@ -196,9 +341,9 @@ var SST = {
         map.select_one("pos_marker").size = 13
       } else {
         // visible = false does not work, so we just set the size to 0
-        Bokeh.documents[0].get_model_by_name("start_point").size = 0
-        Bokeh.documents[0].get_model_by_name("end_point").size = 0
-        Bokeh.documents[0].get_model_by_name("pos_marker").size = 0
+        map.select_one("start_point").size = 0
+        map.select_one("end_point").size = 0
+        map.select_one("pos_marker").size = 0
       }
     },
   }
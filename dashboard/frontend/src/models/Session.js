@@ -9,28 +9,42 @@ var timestampToString = function(timestamp) {
   })
 }
 
+const PAGE_SIZE = 100
+
 var Session = {
   gpxError: "",
   list: {},
-  loadList: function() {
+  last: null,
+  more: false,
+  loadPage: function(args) {
     return m.request({
       method: "GET",
-      url: "/api/session",
+      url: "/api/session?limit=" + PAGE_SIZE + args,
     })
     .then(function(result) {
-      Session.list = {}
-      let lastDate = ""
-      result.forEach(function(item, index) {
+      result.forEach(function(item) {
         const d = timestampToString(item.timestamp)
-        if (d != lastDate) {
-          Session.list[d] = [item]
-          lastDate = d
-        } else {
-          Session.list[d].push(item)
+        if (Session.list[d] === undefined) {
+          Session.list[d] = []
         }
+        Session.list[d].push(item)
       })
+      if (result.length != 0) {
+        Session.last = result[result.length - 1]
+      }
+      Session.more = result.length == PAGE_SIZE
     })
   },
+  loadList: function() {
+    Session.list = {}
+    Session.last = null
+    return Session.loadPage("")
+  },
+  loadMore: function() {
+    // Pages continue from the last session loaded so far.
+    const last = Session.last
+    return Session.loadPage("&before=" + last.timestamp + "&before_id=" + last.id)
+  },
   putNormalized: function(normalizedSession) {
     return m.request({
       method: "PUT",
@@ -87,17 +101,39 @@ var Session = {
     m.redraw()
   },
   current: {loaded: false},
-  load: function(id) {
+  load: function(id, hst) {
     return m.request({
       method: "GET",
-      url: "/api/session/" + id + "/bokeh",
+      url: "/api/session/" + id + "/bokeh" + (hst ? "?hst=" + hst : ""),
     })
     .then(function(result) {
-      Session.current = result
+      Session.current = SST.decode(result)
       Session.current.loaded = true
-      Session.current.divIds = Session.current.divs.filter(e => e !== null).map(div => {
-        return div.split("\"")[1]
-      })
+      Session.current.requested = new Set(Object.keys(Session.current.items))
+      if (Session.current.update !== null) {
+        // Figures were generated with another high speed threshold
+        SST.update.last = Session.current.update
+      }
+    })
+  },
+  loadFigures: function(names) {
+    // Figures are fetched when the section they are in is first shown.
+    // Figures the session does not have (e.g. balance with one suspension)
+    // and figures already requested are skipped.
+    const current = Session.current
+    names = names.filter(n => current.figures.includes(n) && !current.requested.has(n))
+    if (names.length == 0) {
+      return Promise.resolve()
+    }
+    names.forEach(n => current.requested.add(n))
+    return m.request({
+      method: "GET",
+      url: "/api/session/" + current.id + "/figures?" + names.map(n => "name=" + n).join("&"),
+    })
+    .then(function(items) {
+      if (Session.current === current) {
+        return SST.embed(items)
+      }
     })
   },
   patch: function(name, description) {
@@ -128,6 +164,8 @@ var Session = {
     })
     .then(function(result) {
       if (result !== undefined) {
+        SST.decode(result);
+        Session.current.track = result.track
         SST.update.map(result.full_track, result.session_track);
         Session.current.session_track = result.session_track
       }
@@ -4,19 +4,32 @@ var Login = require("./Login")
 var Notes = require("./Notes")
 var VideoPlayer = require("./VideoPlayer")
 
+// Figures are embedded into the elements with the "figure-<name>" id. Those
+// of a tab are fetched when the tab is first selected.
+var figure = function(selector, name) {
+  return m(selector, {id: "figure-" + name})
+}
+
+// The spring rate tab is selected by default, so it is loaded with the
+// other sections visible on page load.
+const INITIAL_FIGURES = ["map", "lr", "sw", "f_thist", "r_thist", "f_fft", "r_fft"]
+
 var SingleSuspensionTabs = {
   view: function() {
+    const s = Session.current.figures.includes("f_thist") ? "f" : "r"
     return m("div", {class: Session.current.session_track || VideoPlayer.loaded ? "tabs" : "tabs novidmap"}, [
-      m("input.radiotab", {name: "tabs", tabindex: "1", type: "radio", id: "tabone", checked: "checked"}),
+      m("input.radiotab", {name: "tabs", tabindex: "1", type: "radio", id: "tabone", checked: "checked",
+                           onchange: () => Session.loadFigures([s + "_thist", s + "_fft"])}),
       m("label.label", {style: "grid-column: 1", for: "tabone"}, "Spring rate"),
       m(".panel springrate", {tabindex: "1"}, [
-        m(".travel-hist", m.trust(Session.current.divs[6] ? Session.current.divs[5] : Session.current.divs[8])),
-        m(".fft", m.trust(Session.current.divs[6] ? Session.current.divs[7] : Session.current.divs[9])),
+        figure(".travel-hist", s + "_thist"),
+        figure(".fft", s + "_fft"),
       ]),
-      m("input.radiotab", {name: "tabs", tabindex: "1", type: "radio", id: "tabtwo"}),
+      m("input.radiotab", {name: "tabs", tabindex: "1", type: "radio", id: "tabtwo",
+                           onchange: () => Session.loadFigures([s + "_vhist"])}),
       m("label.label", {style: "grid-column: 2", for: "tabtwo"}, "Damping"),
       m(".panel damping", {tabindex: "1"}, [
-        m(".velocity-hist", m.trust(Session.current.divs[7] ? Session.current.divs[7] : Session.current.divs[10])),
+        figure(".velocity-hist", s + "_vhist"),
       ]),
     ])
   }
@@ -29,58 +42,47 @@ var DualSuspensionTabs = {
   },
   view: function() {
     return m("div", {class: Session.current.session_track || VideoPlayer.loaded ? "tabs" : "tabs novidmap"}, [
-      m("input.radiotab", {name: "tabs", tabindex: "1", type: "radio", id: "tabone"}),
+      m("input.radiotab", {name: "tabs", tabindex: "1", type: "radio", id: "tabone",
+                           onchange: () => Session.loadFigures(["f_thist", "r_thist", "f_fft", "r_fft"])}),
       m("label.label", {style: "grid-column: 1", for: "tabone"}, "Spring rate"),
       m(".panel springrate", {tabindex: "1"}, [
-        m(".front-travel-hist", m.trust(Session.current.divs[5])),
-        m(".rear-travel-hist", m.trust(Session.current.divs[8])),
-        m(".front-fft", m.trust(Session.current.divs[6])),
-        m(".rear-fft", m.trust(Session.current.divs[9])),
+        figure(".front-travel-hist", "f_thist"),
+        figure(".rear-travel-hist", "r_thist"),
+        figure(".front-fft", "f_fft"),
+        figure(".rear-fft", "r_fft"),
       ]),
-      m("input.radiotab", {name: "tabs", tabindex: "1", type: "radio", id: "tabtwo"}),
+      m("input.radiotab", {name: "tabs", tabindex: "1", type: "radio", id: "tabtwo",
+                           onchange: () => Session.loadFigures(["f_vhist", "r_vhist"])}),
       m("label.label", {style: "grid-column: 2", for: "tabtwo"}, "Damping"),
       m(".panel damping", {tabindex: "1"}, [
-        m(".front-velocity-hist", m.trust(Session.current.divs[7])),
-        m(".rear-velocity-hist", m.trust(Session.current.divs[10])),
+        figure(".front-velocity-hist", "f_vhist"),
+        figure(".rear-velocity-hist", "r_vhist"),
       ]),
-      m("input.radiotab", {name: "tabs", tabindex: "1", type: "radio", id: "tabthree"}),
+      m("input.radiotab", {name: "tabs", tabindex: "1", type: "radio", id: "tabthree",
+                           onchange: () => Session.loadFigures(["cbalance", "rbalance"])}),
       m("label.label", {style: "grid-column: 3", for: "tabthree"}, "Balance"),
       m(".panel balance", {tabindex: "1"}, [
-        m(".balance-compression", m.trust(Session.current.divs[11])),
-        m(".balance-rebound", m.trust(Session.current.divs[12])),
+        figure(".balance-compression", "cbalance"),
+        figure(".balance-rebound", "rbalance"),
       ]),
     ])
   }
 }
 
-function waitForDivs(divIds, callback) {
-  const observedDivs = new Set();
-  const observer = new MutationObserver((mutations) => {
-    for (const mutation of mutations) {
-      for (const node of mutation.addedNodes) {
-        if (node.nodeType === Node.ELEMENT_NODE && divIds.includes(node.id)) {
-          observedDivs.add(node.id);
-          if (observedDivs.size === divIds.length) {
-            callback();
-            observer.disconnect();
-          }
-        }
-      }
-    }
-  });
-  observer.observe(document.body, { childList: true, subtree: true });
-}
-
 module.exports = {
   oncreate: function(vnode) {
     // Load new session and update dashboard
-    Session.load(vnode.attrs.key)
+    Session.load(vnode.attrs.key, vnode.attrs.hst)
     .then(() => {
       document.getElementById("layout-stylesheet").setAttribute("href",
         Session.current.suspension_count == 1 ? "static/layout-single.css" : "static/layout-double.css")
       document.title = `Sufni Suspenion Telemetry (${Session.current.name})`
-      m.redraw()
-      waitForDivs(Session.current.divIds, () => {eval(Session.current.script)})
+      m.redraw.sync()
+      return SST.embed(Session.current.items)
+    })
+    .then(() => {
+      SST.link_ranges()
+      return Session.loadFigures(INITIAL_FIGURES)
     })
     .catch((error) => {
       if (error.code == 401) {
@@ -89,11 +91,9 @@ module.exports = {
     })
   },
   onremove: function() {
-    if (Bokeh.documents.length != 0) {
-      Bokeh.documents[0].clear()
-      delete Bokeh.documents[0]
-      Bokeh.documents.splice(0)
-    }
+    Bokeh.documents.forEach(doc => doc.clear())
+    Bokeh.documents.splice(0)
+    SST.update.last = undefined
     Session.current = {loaded: false}
     document.getElementById("layout-stylesheet").setAttribute("href", "")
     document.title = "Sufni Suspenion Telemetry"
@@ -102,17 +102,19 @@ module.exports = {
   view: function() {
     return Session.current.loaded ? m(".container", {id: "page-content"}, [
       m(".video-map", [
-        m(".map", {style: VideoPlayer.loaded ? "" : "height: 100%"}, m.trust(Session.current.divs[2])),
+        m(".map", {style: VideoPlayer.loaded ? "" : "height: 100%", id: "figure-map"}),
         m(VideoPlayer),
       ]),
       m("div", {
-        class: Session.current.session_track || VideoPlayer.loaded ? "travel" : "travel novidmap"
-      }, m.trust(Session.current.divs[0])),
+        class: Session.current.session_track || VideoPlayer.loaded ? "travel" : "travel novidmap",
+        id: "figure-travel",
+      }),
       m("div", {
-        class: Session.current.session_track || VideoPlayer.loaded ? "velocity" : "velocity novidmap"
-      }, m.trust(Session.current.divs[1])),
-      m(".lr", m.trust(Session.current.divs[3])),
-      m(".sw", m.trust(Session.current.divs[4])),
+        class: Session.current.session_track || VideoPlayer.loaded ? "velocity" : "velocity novidmap",
+        id: "figure-velocity",
+      }),
+      figure(".lr", "lr"),
+      figure(".sw", "sw"),
       m(".description", m(Notes)),
       Session.current.suspension_count == 2 ? m(DualSuspensionTabs) : m(SingleSuspensionTabs),
     ]) : m("div", "SESSION IS LOADING")
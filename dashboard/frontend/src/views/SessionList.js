@@ -46,6 +46,8 @@ module.exports = {
       return m(".session-list-day", [m(SessionDayItem, d)].concat(s.map(function(session) {
         return m(SessionListItem, [session])
       })))
-    }))
+    }).concat(Session.more ? [
+      m("button", {style: "margin: 15px;", onclick: Session.loadMore}, "more"),
+    ] : []))
   },
 }
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from synthetic_psst import generate_gpx, generate_psst
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'dashboard'))
+
+
+TIMESTAMP = 1680000000
+HST = 200
+
+
+def _measure(fn, repeat: int) -> dict:
+    fn()  # warm up imports and caches
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    # Peak memory is measured in a separate run, because tracing
+    # allocations slows down the measured function.
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    return dict(
+        min=min(times),
+        median=statistics.median(times),
+        peak=peak,
+    )
+
+
+def _create_app(directory: str):
+    from app.utils.first_init import _generate_rsa_keys
+
+    private_key = os.path.join(directory, 'jwt.key')
+    public_key = os.path.join(directory, 'jwt.pub')
+    _generate_rsa_keys(private_key, public_key)
+    os.environ.update(
+        FLASK_SQLALCHEMY_DATABASE_URI=(
+            'sqlite:///' + os.path.join(directory, 'benchmark.db')),
+        FLASK_JWT_PRIVATE_KEY_FILE=private_key,
+        FLASK_JWT_PUBLIC_KEY_FILE=public_key,
+        FLASK_CACHE_WORKERS='0',  # caches are generated by the benchmark
+    )
+
+    from app import create_app
+    from app.extensions import db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _add_session(app, psst: bytes, gpx: bytes) -> int:
+    from app.extensions import db
+    from app.models.session import Session
+    from app.models.track import Track
+    from app.telemetry.map import gpx_to_dict
+
+    with app.app_context():
+        track = Track(track=gpx_to_dict(gpx))
+        db.session.add(track)
+        db.session.commit()
+        session = Session(name="benchmark", description="", data=psst,
+                          timestamp=TIMESTAMP, track=track.id)
+        db.session.add(session)
+        db.session.commit()
+        return session.id
+
+
+def _analyzer_benchmarks(psst: bytes, gpx: bytes) -> dict:
+    import msgpack
+
+    from bokeh.palettes import Spectral11
+
+    from app.telemetry.balance import balance_figure
+    from app.telemetry.fft import fft_figure
+    from app.telemetry.index import SuspensionIndex, suspension_index
+    from app.telemetry.lod import (
+        LOD_INITIAL_WIDTH,
+        SamplePyramid,
+        sample_pyramid
+    )
+    from app.telemetry.map import gpx_to_dict, track_data
+    from app.telemetry.psst import (
+        Telemetry,
+        dataclass_from_dict,
+        telemetry_from_psst
+    )
+    from app.telemetry.simplify import douglas_peucker_tolerances
+    from app.telemetry.travel import travel_figure, travel_histogram_figure
+    from app.telemetry.velocity import (
+        velocity_band_stats_figure,
+        velocity_figure,
+        velocity_histogram_figure
+    )
+
+    color = Spectral11[1]
+    t = telemetry_from_psst(psst)
+    s = t.Front if t.Front.Present else t.Rear
+    strokes = suspension_index(s).select()
+    samples = sample_pyramid(t).window(None, None, LOD_INITIAL_WIDTH)
+    tick = 1.0 / t.SampleRate
+    length = len(s.Travel)
+    track = gpx_to_dict(gpx)
+    # The same track, stopped for its middle half (a stationary GPS fix).
+    x, y = track['lon'].copy(), track['lat'].copy()
+    quarter = len(x) // 4
+    x[quarter:-quarter], y[quarter:-quarter] = x[quarter], y[quarter]
+
+    benchmarks = {
+        'decode': lambda: telemetry_from_psst(psst),
+        'decode (dataclass_from_dict)': lambda: dataclass_from_dict(
+            Telemetry, msgpack.unpackb(psst)),
+        'stroke index': lambda: SuspensionIndex(s),
+        'sample pyramid': lambda: SamplePyramid(t),
+        'travel_figure': lambda: travel_figure(
+            t, samples['travel'], color, color),
+        'velocity_figure': lambda: velocity_figure(
+            t, samples['velocity'], color, color),
+        'travel_histogram_figure': lambda: travel_histogram_figure(
+            strokes, s.TravelBins, color, ""),
+        'velocity_histogram_figure': lambda: velocity_histogram_figure(
+            strokes, s.TravelBins, s.VelocityBins, s.FineVelocityBins, HST,
+            "", ""),
+        'velocity_band_stats_figure': lambda: velocity_band_stats_figure(
+            strokes, HST),
+        'fft_figure': lambda: fft_figure(s.Travel, tick, color, ""),
+        'gpx_to_dict': lambda: gpx_to_dict(gpx),
+        'simplify (stationary)': lambda: douglas_peucker_tolerances(x, y),
+        'track_data': lambda: track_data(
+            track, TIMESTAMP, TIMESTAMP + length * tick),
+    }
+    if t.Front.Present and t.Rear.Present:
+        f = suspension_index(t.Front).select()
+        r = suspension_index(t.Rear).select()
+        benchmarks['balance_figure'] = lambda: balance_figure(
+            f, r, t.Linkage.MaxFrontTravel,
+            t.Linkage.MaxRearTravel, False, color, color, "balance", "")
+    return benchmarks
+
+
+def _app_benchmarks(app, session_id: int, duration: float) -> dict:
+    from app.extensions import telemetry_cache
+    from app.telemetry.session_html import create_cache
+
+    def cache():
+        with app.app_context():
+            create_cache(session_id, HST)
+
+    cache()  # /bokeh needs the components
+    client = app.test_client()
+
+    def get(url: str, cold: bool = False):
+        def fn():
+            if cold:
+                telemetry_cache.invalidate(session_id)
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+        return fn
+
+    url = f'/api/session/{session_id}'
+    window = f'start={duration / 4}&end={duration / 2}'
+    return {
+        'create_cache': cache,
+        'GET /filter (cold)': get(f'{url}/filter', cold=True),
+        'GET /filter': get(f'{url}/filter'),
+        'GET /filter?start&end': get(f'{url}/filter?{window}'),
+        'GET /samples?start&end': get(f'{url}/samples?{window}&width=1000'),
+        'GET /bokeh': get(f'{url}/bokeh'),
+        'GET /figures': get(f'{url}/figures?name=f_vhist&name=r_vhist'),
+        'GET /psst': get(f'{url}/psst'),
+        'GET /session': get('/api/session'),
+    }
+
+
+def _print_results(results: list[dict], baseline: dict):
+    print(f"{'scenario':<24} {'benchmark':<32} {'min ms':>10} "
+          f"{'median ms':>10} {'peak MiB':>10}" +
+          (f" {'vs base':>8}" if baseline else ""))
+    for r in results:
+        line = (f"{r['scenario']:<24} {r['benchmark']:<32} "
+                f"{r['min'] * 1000:>10.2f} {r['median'] * 1000:>10.2f} "
+                f"{r['peak'] / 1024 / 1024:>10.2f}")
+        base = baseline.get((r['scenario'], r['benchmark']))
+        if base:
+            line += f" {r['median'] / base['median']:>7.2f}x"
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Time and peak memory of dashboard analyzers, Bokeh "
+                    "cache generation and API endpoints on synthetic data")
+    parser.add_argument(
+        "-d", "--duration",
+        type=float, nargs='+', default=[60, 600, 1800],
+        help="Session durations in seconds (one scenario for each)")
+    parser.add_argument(
+        "-r", "--sample-rate",
+        type=int, default=1000,
+        help="Sample rate in Hz")
+    parser.add_argument(
+        "--no-front",
+        action='store_true',
+        help="Sessions without front suspension data")
+    parser.add_argument(
+        "--no-rear",
+        action='store_true',
+        help="Sessions without rear suspension data")
+    parser.add_argument(
+        "-s", "--stroke-density",
+        type=float, default=4.0,
+        help="Mean number of strokes per second")
+    parser.add_argument(
+        "-a", "--airtimes",
+        type=int, default=5,
+        help="Number of airtimes")
+    parser.add_argument(
+        "-n", "--repeat",
+        type=int, default=5,
+        help="Number of timed runs per benchmark")
+    parser.add_argument(
+        "-k", "--select",
+        help="Only run benchmarks whose name contains this string")
+    parser.add_argument(
+        "-o", "--output",
+        help="Save results to this JSON file")
+    parser.add_argument(
+        "-c", "--compare",
+        help="Compare median times to results saved with --output")
+    cmd_args = parser.parse_args()
+
+    baseline = {}
+    if cmd_args.compare:
+        with open(cmd_args.compare) as f:
+            baseline = {(r['scenario'], r['benchmark']): r
+                        for r in json.load(f)['results']}
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        app = _create_app(directory)
+        for duration in cmd_args.duration:
+            scenario = f"{duration:g}s@{cmd_args.sample_rate}Hz"
+            psst = generate_psst(
+                duration=duration,
+                sample_rate=cmd_args.sample_rate,
+                front=not cmd_args.no_front,
+                rear=not cmd_args.no_rear,
+                stroke_density=cmd_args.stroke_density,
+                airtimes=cmd_args.airtimes,
+                timestamp=TIMESTAMP)
+            gpx = generate_gpx(duration=duration, timestamp=TIMESTAMP)
+            session_id = _add_session(app, psst, gpx)
+
+            benchmarks = _analyzer_benchmarks(psst, gpx)
+            benchmarks.update(_app_benchmarks(app, session_id, duration))
+            for name, fn in benchmarks.items():
+                if cmd_args.select and cmd_args.select not in name:
+                    continue
+                r = _measure(fn, cmd_args.repeat)
+                r.update(scenario=scenario, benchmark=name)
+                results.append(r)
+                print(f"{scenario} {name}: {r['median'] * 1000:.2f} ms, "
+                      f"{r['peak'] / 1024 / 1024:.2f} MiB", file=sys.stderr)
+
+    _print_results(results, baseline)
+    if cmd_args.output:
+        with open(cmd_args.output, 'w') as f:
+            json.dump(dict(args=vars(cmd_args), results=results), f, indent=2)
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+import argparse
+import base64
+import getpass
+import glob
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http import HTTPStatus as status
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+
+SST_EXTENSIONS = ('.sst',)
+PSST_EXTENSIONS = ('.psst',)
+HASH_CHUNK_SIZE = 1024 * 1024
+HASH_BATCH_SIZE = 1000
+
+
+def find_files(paths: list[str]) -> list[str]:
+    """ Files given directly, matched by glob patterns, or found in
+    directories (recursively, by extension), in order, without duplicates.
+    """
+
+    extensions = SST_EXTENSIONS + PSST_EXTENSIONS
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                files += [os.path.join(root, n) for n in sorted(names)
+                          if os.path.splitext(n)[1].lower() in extensions]
+        else:
+            files += [f for f in sorted(glob.glob(path, recursive=True))
+                      if os.path.isfile(f)]
+    seen = set()
+    return [f for f in files
+            if not (os.path.abspath(f) in seen or
+                    seen.add(os.path.abspath(f)))]
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Journal:
+    """ Append-only JSON lines file of the imported files, so an interrupted
+    import can be resumed without asking the server about them again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.imported = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.imported[entry['hash']] = entry['id']
+                    except (ValueError, KeyError):
+                        pass  # line of an interrupted write
+
+    def add(self, path: str, hash: str, id: int):
+        line = json.dumps(dict(path=path, hash=hash, id=id))
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+            self.imported[hash] = id
+
+
+class Importer:
+    """ Uploads files through one pooled HTTP session, logging in once
+    (and again only if the token expires during a long import).
+    """
+
+    def __init__(self, server: str, user: str, password: str, setup: int,
+                 jobs: int, insecure: bool):
+        self.server = server
+        self.setup = setup
+        self._credentials = dict(username=user, password=password)
+        self._lock = threading.Lock()
+        self.http = requests.Session()
+        self.http.verify = not insecure
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=jobs)
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
+        self.login()
+
+    def login(self):
+        resp = self.http.post(f'{self.server}/auth/login',
+                              json=self._credentials)
+        token = resp.json().get('access_token')
+        if token is None:
+            raise RuntimeError("login failed")
+        # The token is sent in a header, cookies would need CSRF tokens.
+        self.http.cookies.clear()
+        self.http.headers['Authorization'] = f'Bearer {token}'
+
+    def _request(self, method: str, url: str, **kwargs):
+        auth = self.http.headers['Authorization']
+        resp = self.http.request(method, url, **kwargs)
+        if resp.status_code == status.UNAUTHORIZED:
+            with self._lock:
+                if self.http.headers['Authorization'] == auth:
+                    self.login()
+            if hasattr(kwargs.get('data'), 'seek'):
+                kwargs['data'].seek(0)  # streamed file
+            resp = self.http.request(method, url, **kwargs)
+        return resp
+
+    def known(self, hashes: list[str]) -> dict:
+        known = {}
+        for i in range(0, len(hashes), HASH_BATCH_SIZE):
+            resp = self._request(
+                'POST', f'{self.server}/api/session/hashes',
+                json=dict(hashes=hashes[i:i+HASH_BATCH_SIZE]))
+            resp.raise_for_status()
+            known.update(resp.json())
+        return known
+
+    def upload(self, path: str) -> int:
+        name = os.path.basename(path)
+        description = f'imported from {path}'
+        if os.path.splitext(path)[1].lower() in PSST_EXTENSIONS:
+            # Streamed as is, see the raw path of PUT /api/session/psst.
+            with open(path, 'rb') as f:
+                resp = self._request(
+                    'PUT', f'{self.server}/api/session/psst',
+                    params=dict(name=name, description=description),
+                    headers={'Content-Type': 'application/msgpack'},
+                    data=f)
+        else:
+            with open(path, 'rb') as f:
+                data = base64.b64encode(f.read()).decode('ascii')
+            resp = self._request(
+                'PUT', f'{self.server}/api/session',
+                json=dict(name=name, description=description,
+                          setup=self.setup, data=data))
+        if resp.status_code != status.CREATED:
+            raise RuntimeError(resp.json().get('msg', resp.reason))
+        return resp.json()['id']
+
+
+def _mb(size: int) -> float:
+    return size / 1024 / 1024
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Imports SST and PSST files concurrently, skipping the "
+                    "ones that are already on the server.")
+    parser.add_argument(
+        "paths",
+        nargs='+',
+        help="Files, glob patterns or directories")
+    parser.add_argument(
+        "user",
+        help="Username")
+    parser.add_argument(
+        "-S", "--setup",
+        type=int,
+        help="Setup ID (needed for SST files)")
+    parser.add_argument(
+        "-s", "--server",
+        default='http://localhost:5000',
+        help="HTTP server URL")
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=4,
+        help="Number of concurrent uploads")
+    parser.add_argument(
+        "--journal",
+        default='bulk_import.journal',
+        help="Progress journal, an interrupted import is resumed from it")
+    parser.add_argument(
+        "-k", "--insecure",
+        action='store_true',
+        help="Allow insecure server connections")
+    cmd_args = parser.parse_args()
+
+    files = find_files(cmd_args.paths)
+    if not files:
+        print("[ERR] no files to import")
+        sys.exit(-1)
+    if cmd_args.setup is None and any(
+            os.path.splitext(f)[1].lower() not in PSST_EXTENSIONS
+            for f in files):
+        print("[ERR] a setup is needed to import SST files")
+        sys.exit(-1)
+
+    journal = Journal(cmd_args.journal)
+    password = getpass.getpass('password: ')
+    try:
+        importer = Importer(cmd_args.server, cmd_args.user, password,
+                            cmd_args.setup, cmd_args.jobs,
+                            cmd_args.insecure)
+    except (RuntimeError, ValueError):
+        print("[ERR] login failed")
+        sys.exit(-1)
+
+    with ThreadPoolExecutor(max_workers=cmd_args.jobs) as executor:
+        hashes = dict(zip(files, executor.map(file_hash, files)))
+        pending = [h for h in dict.fromkeys(hashes.values())
+                   if h not in journal.imported]
+        known = importer.known(pending)
+        queued, queued_hashes = [], set()
+        for f, h in hashes.items():
+            if h in journal.imported or h in known or h in queued_hashes:
+                continue
+            queued.append(f)
+            queued_hashes.add(h)
+        print(f"{len(files)} files, {len(files) - len(queued)} already "
+              f"imported, {len(queued)} to import")
+
+        start = time.perf_counter()
+        imported, failed, size = 0, 0, 0
+        futures = {executor.submit(importer.upload, f): f for f in queued}
+        for future in as_completed(futures):
+            f = futures[future]
+            try:
+                id = future.result()
+            except (RuntimeError, requests.RequestException, OSError) as e:
+                failed += 1
+                print(f"[ERR] {f}: {e}")
+                continue
+            journal.add(f, hashes[f], id)
+            imported += 1
+            size += os.path.getsize(f)
+            elapsed = time.perf_counter() - start
+            print(f"[{imported + failed}/{len(queued)}] {f} -> session {id} "
+                  f"({imported / elapsed:.2f} files/s, "
+                  f"{_mb(size) / elapsed:.2f} MB/s)")
+
+    elapsed = time.perf_counter() - start
+    if elapsed > 0 and imported:
+        print(f"{imported} files ({_mb(size):.1f} MB) imported in "
+              f"{elapsed:.1f} s: {imported / elapsed:.2f} files/s, "
+              f"{_mb(size) / elapsed:.2f} MB/s")
+    if failed:
+        print(f"[ERR] {failed} files could not be imported")
+        sys.exit(-1)
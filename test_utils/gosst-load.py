@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import math
+import time
+
+from collections import Counter
+
+import numpy as np
+
+from synthetic_psst import generate_sst
+
+try:
+    import socketio
+except ImportError:
+    socketio = None
+
+
+STATUS_HEADER_OK = 4
+STATUS_SUCCESS = 6
+SST_HEADER_SIZE = 16
+SST_RECORD_SIZE = 4
+MAX_SIZE = 32 * 1024 * 1024  # largest file gosst-tcp accepts
+PERCENTILES = (50, 90, 95, 99)
+
+
+class UploadError(Exception):
+    pass
+
+
+def duration_sampler(spec: str, rng: np.random.Generator):
+    """ Recording durations (in seconds) of the uploaded files: fixed:S,
+    uniform:LO:HI or lognormal:MEDIAN:SIGMA.
+    """
+
+    kind, *params = spec.split(':')
+    try:
+        params = [float(p) for p in params]
+    except ValueError:
+        params = []
+    if kind == 'fixed' and len(params) == 1:
+        return lambda: params[0]
+    if kind == 'uniform' and len(params) == 2:
+        return lambda: rng.uniform(*params)
+    if kind == 'lognormal' and len(params) == 2:
+        return lambda: params[0] * math.exp(rng.normal(0, params[1]))
+    raise ValueError(f"invalid duration distribution: {spec}")
+
+
+class ReadyWatcher:
+    """ Collects the session_ready events of the dashboard (emitted when the
+    cache of a session is generated), and lets uploads wait for the event
+    of their session. The Socket.IO client runs in its own threads.
+    """
+
+    def __init__(self, url: str, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._ready = {}
+        self._waiters = {}
+        self._client = socketio.Client()
+        self._client.on('session_ready', self._on_ready)
+        self._client.connect(url)
+
+    def _on_ready(self, data=None):
+        now = time.perf_counter()
+        if isinstance(data, dict) and 'id' in data:
+            self._loop.call_soon_threadsafe(self._set, data['id'], now)
+
+    def _set(self, id: int, when: float):
+        self._ready.setdefault(id, when)
+        waiter = self._waiters.pop(id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(when)
+
+    async def wait(self, id: int, timeout: float) -> float:
+        if id in self._ready:
+            return self._ready[id]
+        waiter = self._waiters.setdefault(id, self._loop.create_future())
+        return await asyncio.wait_for(waiter, timeout)
+
+    def close(self):
+        self._client.disconnect()
+
+
+async def upload(address: str, port: int, board: str, name: str,
+                 data: bytes) -> dict:
+    """ Uploads a file like a DAQ unit does, returns the timings of the
+    protocol steps, in seconds from the start of the upload.
+    """
+
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(address, port)
+    try:
+        # gosst-tcp reads the header with a single read
+        writer.write(b'ID' + bytes.fromhex(board) +
+                     len(data).to_bytes(8, 'little', signed=False) +
+                     name.encode())
+        await writer.drain()
+        response = (await reader.readexactly(1))[0]
+        if response != STATUS_HEADER_OK:
+            raise UploadError(f"header rejected ({response:#04x})")
+        header = time.perf_counter()
+
+        writer.write(data)
+        await writer.drain()
+        sent = time.perf_counter()
+        response = (await reader.readexactly(1))[0]
+        if response != STATUS_SUCCESS:
+            raise UploadError(f"session rejected ({response:#04x})")
+        id = int.from_bytes(await reader.readexactly(4), 'little')
+        done = time.perf_counter()
+    finally:
+        writer.close()
+    return dict(id=id, size=len(data), start=start, header=header - start,
+                sent=sent - start, ingested=done - start, end=done)
+
+
+async def board(index: int, cmd_args, records: bytes, durations: list,
+                watcher: ReadyWatcher, results: list, errors: Counter):
+    board_id = f'{cmd_args.board_base + index:016x}'
+    await asyncio.sleep(index * cmd_args.ramp_up / max(cmd_args.boards, 1))
+    for k, duration in enumerate(durations):
+        if k:
+            await asyncio.sleep(cmd_args.interval)
+        length = int(duration * cmd_args.sample_rate) * SST_RECORD_SIZE
+        timestamp = int(time.time() - duration)
+        data = (b'SST' + records[3:8] + timestamp.to_bytes(8, 'little') +
+                records[SST_HEADER_SIZE:SST_HEADER_SIZE + length])
+        try:
+            result = await asyncio.wait_for(
+                upload(cmd_args.address, cmd_args.port, board_id,
+                       f'{k + 1:05d}.SST', data),
+                cmd_args.timeout)
+        except (UploadError, OSError, asyncio.IncompleteReadError,
+                asyncio.TimeoutError) as e:
+            errors[str(e) or type(e).__name__] += 1
+            continue
+        if watcher is not None:
+            try:
+                ready = await watcher.wait(result['id'], cmd_args.timeout)
+                result['ready'] = ready - result['start']
+                result['end'] = ready
+            except asyncio.TimeoutError:
+                errors['session_ready timeout'] += 1
+        results.append(result)
+
+
+def _report(results: list, errors: Counter, start: float):
+    print(f"{len(results)} uploads succeeded, {sum(errors.values())} failed")
+    for error, count in errors.most_common():
+        print(f"  {count} x {error}")
+    if not results:
+        return
+
+    print(f"{'seconds':<16}" +
+          ''.join(f"{f'p{p}':>9}" for p in PERCENTILES) + f"{'max':>9}")
+    for key, label in (('header', 'header ack'), ('sent', 'data sent'),
+                       ('ingested', 'ingested (id)'),
+                       ('ready', 'session_ready')):
+        values = [r[key] for r in results if key in r]
+        if values:
+            print(f"{label:<16}" +
+                  ''.join(f"{v:>9.3f}"
+                          for v in np.percentile(values, PERCENTILES)) +
+                  f"{max(values):>9.3f}")
+
+    size = sum(r['size'] for r in results) / 1024 / 1024
+    elapsed = max(r['end'] for r in results) - start
+    print(f"{len(results)} files, {size:.1f} MB in {elapsed:.1f} s: "
+          f"{len(results) / elapsed:.2f} files/s, {size / elapsed:.2f} MB/s")
+
+
+async def main(cmd_args):
+    rng = np.random.default_rng(cmd_args.seed)
+    sample = duration_sampler(cmd_args.duration, rng)
+    max_duration = ((MAX_SIZE - SST_HEADER_SIZE) / SST_RECORD_SIZE /
+                    cmd_args.sample_rate)
+    durations = [[min(max(sample(), 1.0), max_duration)
+                  for _ in range(cmd_args.uploads)]
+                 for _ in range(cmd_args.boards)]
+
+    # Every file is a prefix of one recording, so generating the data does
+    # not slow down the uploads.
+    print("generating SST data...")
+    records = generate_sst(duration=max(max(d) for d in durations),
+                           sample_rate=cmd_args.sample_rate,
+                           seed=cmd_args.seed)
+
+    watcher = None
+    if cmd_args.no_ready:
+        pass
+    elif socketio is None:
+        print("[WARN] python-socketio is not installed, session_ready is "
+              "not measured")
+    else:
+        watcher = ReadyWatcher(cmd_args.server,
+                               asyncio.get_running_loop())
+
+    results, errors = [], Counter()
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*[
+            board(i, cmd_args, records, durations[i], watcher, results,
+                  errors)
+            for i in range(cmd_args.boards)])
+    finally:
+        if watcher is not None:
+            watcher.close()
+    _report(results, errors, start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Simulates DAQ units uploading synthetic SST files to "
+                    "gosst-tcp concurrently. The boards have to be assigned "
+                    "to a setup on the server (unknown boards are stored by "
+                    "the server at their first upload).")
+    parser.add_argument(
+        "-a", "--address",
+        default='localhost',
+        help="gosst-tcp server address")
+    parser.add_argument(
+        "-p", "--port",
+        type=int,
+        default=557,
+        help="gosst-tcp server port")
+    parser.add_argument(
+        "-s", "--server",
+        default='http://localhost:5000',
+        help="Dashboard URL, for the session_ready events")
+    parser.add_argument(
+        "-n", "--boards",
+        type=int,
+        default=10,
+        help="Number of simulated boards")
+    parser.add_argument(
+        "-b", "--board-base",
+        type=lambda s: int(s, 16),
+        default='0000000000000000',
+        help="Id of the first board (16 hex digits), the others follow it")
+    parser.add_argument(
+        "-u", "--uploads",
+        type=int,
+        default=1,
+        help="Number of files uploaded by each board")
+    parser.add_argument(
+        "-i", "--interval",
+        type=float,
+        default=0.0,
+        help="Pause between the uploads of a board in seconds")
+    parser.add_argument(
+        "-d", "--duration",
+        default='uniform:300:1800',
+        help="Distribution of recording durations in seconds: fixed:S, "
+             "uniform:LO:HI or lognormal:MEDIAN:SIGMA")
+    parser.add_argument(
+        "-r", "--sample-rate",
+        type=int,
+        default=1000,
+        help="Sample rate in Hz")
+    parser.add_argument(
+        "--ramp-up",
+        type=float,
+        default=0.0,
+        help="Boards start evenly spread over this many seconds")
+    parser.add_argument(
+        "-t", "--timeout",
+        type=float,
+        default=300.0,
+        help="Timeout of an upload, and of waiting for session_ready")
+    parser.add_argument(
+        "--no-ready",
+        action='store_true',
+        help="Do not wait for session_ready events")
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed")
+    cmd_args = parser.parse_args()
+    try:
+        duration_sampler(cmd_args.duration, None)
+    except ValueError as e:
+        parser.error(str(e))
+
+    asyncio.run(main(cmd_args))
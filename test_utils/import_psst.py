@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 
 import argparse
-import base64
 import os
 import requests
 
@@ -24,17 +23,16 @@ if __name__ == '__main__':
         help="Allow insecure server connections")
     cmd_args = parser.parse_args()
 
+    # The file is streamed as is, session metadata goes in the query string.
     with open(cmd_args.psst_file, 'br') as f:
-        psst_data = f.read()
-
-    session = dict(
-        name=os.path.basename(cmd_args.psst_file),
-        description=f'imported from {cmd_args.psst_file}',
-        data=base64.b64encode(psst_data).decode('ascii')
-    )
-
-    requests.put(
-        cmd_args.gosst_api + '/session/psst',
-        headers={'X-Token': cmd_args.token},
-        json=session,
-        verify=not cmd_args.insecure)
+        requests.put(
+            cmd_args.gosst_api + '/api/session/psst',
+            params=dict(
+                name=os.path.basename(cmd_args.psst_file),
+                description=f'imported from {cmd_args.psst_file}'),
+            headers={
+                'Authorization': f'Bearer {cmd_args.token}',
+                'Content-Type': 'application/msgpack',
+            },
+            data=f,
+            verify=not cmd_args.insecure)
@@ -1,5 +1,18 @@
+import os
+import sys
+
 from dataclasses import dataclass, fields as datafields
 
+# PSST headers are read by the dashboard's reader.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'dashboard'))
+
+from app.telemetry.psst import (  # noqa: F401
+    SuspensionHeader,
+    TelemetryHeader,
+    header_from_psst
+)
+
 
 @dataclass
 class Linkage:
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+
+import argparse
+import math
+import struct
+
+from datetime import datetime, timezone
+
+import msgpack
+import numpy as np
+
+
+# Same thresholds and histogram parameters as gosst/formats/psst
+STROKE_LENGTH_THRESHOLD = 5
+BOTTOMOUT_THRESHOLD = 3
+TRAVEL_HIST_BINS = 20
+VELOCITY_HIST_STEP = 100.0
+VELOCITY_HIST_STEP_FINE = 15.0
+
+HEAD_ANGLE = 64.0
+MAX_FRONT_STROKE = 170.0
+MAX_REAR_STROKE = 65.0
+LEVERAGE_RATIO = 2.8
+
+SST_VERSION = 3
+ENCODER_COUNTS = 4096  # AS5600, 12 bit
+
+
+def _digitize(data: np.ndarray, bins: np.ndarray) -> np.ndarray:
+    # Same as digitize in gosst/formats/psst/stroke.go
+    i = np.searchsorted(bins, data, side='left')
+    exact = bins[np.minimum(i, len(bins) - 1)] == data
+    return np.where(exact & (data < bins[-1]), i, i - 1)
+
+
+def _digitize_velocity(v: np.ndarray, step: float) -> (
+                       np.ndarray, np.ndarray):
+    mn = (math.floor(v.min() / step) - 0.5) * step
+    mx = (math.floor(v.max() / step) + 1.5) * step
+    bins = np.linspace(mn, mx, int((mx - mn) / step) + 1)
+    return bins, _digitize(v, bins)
+
+
+def _segments(rng: np.random.Generator, start: int, end: int, rate: int,
+              max_travel: float, density: float, first: float,
+              last: float) -> (list[int], list[float]):
+    # Random monotonic segments between start and end. Every segment is a
+    # stroke (or an idle period, if it is too short), density is the mean
+    # number of segments per second.
+    bounds, targets = [start], [first]
+    while True:
+        duration = max(0.03, rng.exponential(1.0 / density))
+        b = bounds[-1] + max(2, int(duration * rate))
+        if b >= end - 2:
+            break
+        bounds.append(b)
+        r = rng.random()
+        if r < 0.03:
+            targets.append(max_travel)  # bottom out
+        elif r < 0.13:
+            targets.append(targets[-1] + rng.uniform(-2, 2))  # idle
+        else:
+            targets.append(rng.beta(2, 4) * max_travel)
+    bounds.append(end)
+    targets.append(last)
+    return bounds, list(np.clip(targets, 0, max_travel))
+
+
+def _travel(rng: np.random.Generator, length: int, rate: int,
+            max_travel: float, density: float, airtimes: list[tuple]) -> (
+            np.ndarray, np.ndarray):
+    # Airtimes are single idle segments at zero travel, the strokes before
+    # them end, and the ones after them start at zero.
+    bounds, targets = [], []
+    position = 0
+    for air_start, air_end in airtimes + [(length, length)]:
+        if air_start > position:
+            b, t = _segments(rng, position, air_start, rate, max_travel,
+                             density, 0.0 if position else max_travel / 4,
+                             0.0 if air_start < length else max_travel / 4)
+            bounds.extend(b[:-1])
+            targets.extend(t[:-1])
+            last = t[-1]
+        if air_end > air_start:
+            bounds.append(air_start)
+            targets.append(0.0)
+            last = 0.0
+        position = air_end
+    bounds = np.array(bounds + [length - 1])
+    targets = np.array(targets + [last])
+
+    # Cosine easing between the segment targets
+    i = np.arange(length)
+    k = np.clip(np.searchsorted(bounds, i, side='right') - 1, 0,
+                len(bounds) - 2)
+    u = (i - bounds[k]) / np.maximum(bounds[k + 1] - bounds[k], 1)
+    travel = (targets[k] +
+              (targets[k + 1] - targets[k]) * (1 - np.cos(np.pi * u)) / 2)
+    travel += rng.normal(0, 0.05, length)
+    return np.clip(travel, 0, max_travel), bounds
+
+
+def _strokes(travel: np.ndarray, velocity: np.ndarray, bounds: np.ndarray,
+             max_travel: float, dt: np.ndarray, dv: np.ndarray,
+             dv_fine: np.ndarray) -> dict:
+    starts = bounds[:-1].copy()
+    starts[1:] += 1
+    ends = bounds[1:]
+    keep = ends > starts
+    starts, ends = starts[keep], ends[keep]
+
+    length = travel[ends] - travel[starts]
+    bo = travel > max_travel - BOTTOMOUT_THRESHOLD
+    bo_start = bo & ~np.concatenate([[False], bo[:-1]])
+    bottomouts = (np.add.reduceat(bo_start.astype(int), starts) -
+                  bo_start[starts] + bo[starts])
+    sum_travel = np.add.reduceat(travel, starts)
+    max_travel_ = np.maximum.reduceat(travel, starts)
+    sum_velocity = np.add.reduceat(velocity, starts)
+    max_velocity = np.where(length < 0,
+                            np.minimum.reduceat(velocity, starts),
+                            np.maximum.reduceat(velocity, starts))
+
+    compressions, rebounds = [], []
+    for i in np.flatnonzero(np.abs(length) >= STROKE_LENGTH_THRESHOLD):
+        s, e = int(starts[i]), int(ends[i])
+        stroke = dict(
+            Start=s,
+            End=e,
+            Stat=dict(
+                SumTravel=float(sum_travel[i]),
+                MaxTravel=float(max_travel_[i]),
+                SumVelocity=float(sum_velocity[i]),
+                MaxVelocity=float(max_velocity[i]),
+                Bottomouts=int(bottomouts[i]),
+                Count=e - s + 1,
+            ),
+            DigitizedTravel=dt[s:e+1].tolist(),
+            DigitizedVelocity=dv[s:e+1].tolist(),
+            FineDigitizedVelocity=dv_fine[s:e+1].tolist(),
+        )
+        (compressions if length[i] > 0 else rebounds).append(stroke)
+    return dict(Compressions=compressions, Rebounds=rebounds)
+
+
+def _suspension(rng: np.random.Generator, present: bool, length: int,
+                rate: int, max_travel: float, density: float,
+                airtimes: list[tuple]) -> dict:
+    suspension = dict(
+        Present=present,
+        Calibration=dict(Name="synthetic", MethodId=1, Inputs={}),
+        Travel=None,
+        Velocity=None,
+        Strokes=dict(Compressions=None, Rebounds=None),
+        TravelBins=None,
+        VelocityBins=None,
+        FineVelocityBins=None,
+    )
+    if not present:
+        return suspension
+
+    travel, bounds = _travel(rng, length, rate, max_travel, density,
+                             airtimes)
+    velocity = np.gradient(travel) * rate
+    travel_bins = np.linspace(0, max_travel, TRAVEL_HIST_BINS + 1)
+    velocity_bins, dv = _digitize_velocity(velocity, VELOCITY_HIST_STEP)
+    fine_velocity_bins, dv_fine = _digitize_velocity(
+        velocity, VELOCITY_HIST_STEP_FINE)
+    suspension.update(
+        Travel=travel.tolist(),
+        Velocity=velocity.tolist(),
+        Strokes=_strokes(travel, velocity, bounds, max_travel,
+                         _digitize(travel, travel_bins), dv, dv_fine),
+        TravelBins=travel_bins.tolist(),
+        VelocityBins=velocity_bins.tolist(),
+        FineVelocityBins=fine_velocity_bins.tolist(),
+    )
+    return suspension
+
+
+def _airtimes(rng: np.random.Generator, length: int, rate: int,
+              count: int) -> list[tuple]:
+    # Evenly spaced slots, a random jump in the middle half of each.
+    airtimes = []
+    if count:
+        slot = length // count
+        for i in range(count):
+            air = int(rng.uniform(0.3, 1.2) * rate)
+            start = i * slot + int(rng.uniform(0.25, 0.75) * slot)
+            if air < slot // 2:
+                airtimes.append((start, start + air))
+    return airtimes
+
+
+def _linkage() -> dict:
+    max_front_travel = math.sin(HEAD_ANGLE * math.pi / 180) * MAX_FRONT_STROKE
+    max_rear_travel = MAX_REAR_STROKE * LEVERAGE_RATIO
+    wheel = np.linspace(0, max_rear_travel, 100)
+    return dict(
+        Name="synthetic",
+        HeadAngle=HEAD_ANGLE,
+        MaxFrontStroke=MAX_FRONT_STROKE,
+        MaxRearStroke=MAX_REAR_STROKE,
+        MaxFrontTravel=max_front_travel,
+        MaxRearTravel=max_rear_travel,
+        LeverageRatio=[[float(w), LEVERAGE_RATIO - w / max_rear_travel / 2]
+                       for w in wheel],
+        ShockWheelCoeffs=[0.0, LEVERAGE_RATIO, 0.0, 0.0],
+    )
+
+
+def generate_psst(duration: float = 600, sample_rate: int = 1000,
+                  front: bool = True, rear: bool = True,
+                  stroke_density: float = 4.0, airtimes: int = 5,
+                  timestamp: int = 1680000000, seed: int = 0) -> bytes:
+    """ Generates a PSST blob that can be decoded into
+    app.telemetry.psst.Telemetry. Same parameters give the same output.
+    stroke_density is the mean number of strokes per second, airtimes is
+    the number of jumps (only when both suspensions are present).
+    """
+
+    rng = np.random.default_rng(seed)
+    length = int(duration * sample_rate)
+    airtime_samples = _airtimes(rng, length, sample_rate,
+                                airtimes if front and rear else 0)
+
+    linkage = _linkage()
+    telemetry = dict(
+        Name="synthetic",
+        Version=3,
+        SampleRate=sample_rate,
+        Timestamp=timestamp,
+        Front=_suspension(rng, front, length, sample_rate,
+                          linkage['MaxFrontTravel'], stroke_density,
+                          airtime_samples),
+        Rear=_suspension(rng, rear, length, sample_rate,
+                         linkage['MaxRearTravel'], stroke_density,
+                         airtime_samples),
+        Linkage=linkage,
+        Airtimes=[dict(Start=s / sample_rate, End=e / sample_rate)
+                  for s, e in airtime_samples],
+    )
+    return msgpack.packb(telemetry)
+
+
+def generate_sst(duration: float = 600, sample_rate: int = 1000,
+                 front: bool = True, rear: bool = True,
+                 stroke_density: float = 4.0, airtimes: int = 5,
+                 timestamp: int = 1680000000, seed: int = 0) -> bytes:
+    """ Generates a raw SST file as recorded by the DAQ unit: a header, and
+    the fork and shock encoder counts of every sample (0xffff if a sensor
+    is missing). Travel is converted to counts linearly, with full stroke
+    being a quarter turn of the encoder.
+    """
+
+    rng = np.random.default_rng(seed)
+    length = int(duration * sample_rate)
+    airtime_samples = _airtimes(rng, length, sample_rate,
+                                airtimes if front and rear else 0)
+
+    records = np.full((length, 2), 0xffff, dtype='<u2')
+    for column, present, max_stroke in ((0, front, MAX_FRONT_STROKE),
+                                        (1, rear, MAX_REAR_STROKE)):
+        if present:
+            travel, _ = _travel(rng, length, sample_rate, max_stroke,
+                                stroke_density, airtime_samples)
+            records[:, column] = np.round(
+                travel / max_stroke * ENCODER_COUNTS / 4)
+    header = struct.pack('<3sBHHq', b'SST', SST_VERSION, sample_rate, 0,
+                         timestamp)
+    return header + records.tobytes()
+
+
+def generate_gpx(duration: float = 600, timestamp: int = 1680000000,
+                 interval: float = 1.0, margin: float = 300,
+                 lat: float = 47.5, lon: float = 19.0,
+                 seed: int = 0) -> bytes:
+    """ Generates a GPX track that starts margin seconds before, and ends
+    margin seconds after a session of the given duration and timestamp.
+    """
+
+    rng = np.random.default_rng(seed)
+    count = int((duration + 2 * margin) / interval) + 1
+    t = timestamp - margin + np.arange(count) * interval
+    heading = np.cumsum(rng.normal(0, 0.2, count))
+    speed = rng.uniform(2, 8, count) * interval  # m per point
+    dlat = np.cumsum(speed * np.cos(heading)) / 111320
+    dlon = (np.cumsum(speed * np.sin(heading)) /
+            (111320 * math.cos(lat * math.pi / 180)))
+    ele = 800 - np.cumsum(rng.uniform(-0.5, 1.5, count))
+
+    points = []
+    for i in range(count):
+        time = datetime.fromtimestamp(t[i], timezone.utc)
+        points.append(
+            f'<trkpt lat="{lat + dlat[i]:.7f}" lon="{lon + dlon[i]:.7f}">'
+            f'<ele>{ele[i]:.1f}</ele>'
+            f'<time>{time.strftime("%Y-%m-%dT%H:%M:%SZ")}</time>'
+            '</trkpt>')
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<gpx version="1.1" creator="synthetic_psst" '
+        'xmlns="http://www.topografix.com/GPX/1/1">\n'
+        '<trk><name>synthetic</name><trkseg>\n' +
+        '\n'.join(points) +
+        '\n</trkseg></trk>\n</gpx>\n').encode('utf-8')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic PSST file and a matching GPX track")
+    parser.add_argument(
+        "output",
+        help="Output path without extension (.psst and .gpx are appended)")
+    parser.add_argument(
+        "-d", "--duration",
+        type=float, default=600,
+        help="Session duration in seconds")
+    parser.add_argument(
+        "-r", "--sample-rate",
+        type=int, default=1000,
+        help="Sample rate in Hz")
+    parser.add_argument(
+        "--no-front",
+        action='store_true',
+        help="Generate a session without front suspension data")
+    parser.add_argument(
+        "--no-rear",
+        action='store_true',
+        help="Generate a session without rear suspension data")
+    parser.add_argument(
+        "-s", "--stroke-density",
+        type=float, default=4.0,
+        help="Mean number of strokes per second")
+    parser.add_argument(
+        "-a", "--airtimes",
+        type=int, default=5,
+        help="Number of airtimes")
+    parser.add_argument(
+        "-t", "--timestamp",
+        type=int, default=1680000000,
+        help="Session start as UNIX timestamp")
+    parser.add_argument(
+        "--seed",
+        type=int, default=0,
+        help="Random seed")
+    cmd_args = parser.parse_args()
+
+    psst = generate_psst(
+        duration=cmd_args.duration,
+        sample_rate=cmd_args.sample_rate,
+        front=not cmd_args.no_front,
+        rear=not cmd_args.no_rear,
+        stroke_density=cmd_args.stroke_density,
+        airtimes=cmd_args.airtimes,
+        timestamp=cmd_args.timestamp,
+        seed=cmd_args.seed)
+    with open(cmd_args.output + '.psst', 'wb') as f:
+        f.write(psst)
+
+    gpx = generate_gpx(
+        duration=cmd_args.duration,
+        timestamp=cmd_args.timestamp,
+        seed=cmd_args.seed)
+    with open(cmd_args.output + '.gpx', 'wb') as f:
+        f.write(gpx)